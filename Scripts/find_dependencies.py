@@ -24,6 +24,14 @@ and optionally visualised graphically in a figure.
 - Since the "Couldn't get TTree" error message in O2 reports the lowercase name of the missing table,
   table names are treated as case-insensitive by default
   so that one can just copy-paste the name from the error message.
+- Inputs and outputs of workflow devices extracted from the JSON files are stored in a cache
+  and only files that changed since the last run are parsed again.
+- Many queries can be answered at once in the batch mode, which reads them from a file
+  and reports nodes and edges of the dependency graph of each query in JSON.
+- The solver finds a small set of workflows that is sufficient to produce given tables and run given workflows.
+- Impact of changes of C++ files on workflows is found by searching for consumers of tables declared in the files.
+- The shared-memory footprint of the dependency tree can be estimated from the numbers and types of columns
+  of tables declared in C++ files and from the expected numbers of rows per timeframe.
 
 @author Vít Kučera <vit.kucera@cern.ch>, Inha University
 @date   2022-12-10
@@ -32,10 +40,16 @@ and optionally visualised graphically in a figure.
 import argparse
 import glob
 import hashlib
+import html
 import json
 import os
+import re
+import shutil
 import subprocess as sp  # nosec B404
 import sys
+from concurrent.futures import ProcessPoolExecutor
+
+version_cache = 1  # version of the format of the workflow cache
 
 
 def eprint(*args, **kwargs):
@@ -59,26 +73,135 @@ def msg_warn(message: str):
     eprint("\x1b[1;36mWarning:\x1b[0m %s" % message)
 
 
-def load_workflows_from_json():
-    """Load all workflows from JSON files."""
+def get_dir_json():
+    """Get the directory with the JSON files of workflows."""
     try:
         dir_o2p = os.environ["O2PHYSICS_ROOT"]
     except KeyError:
         msg_fatal("O2Physics environment is not loaded.")
-    dir_json = f"{dir_o2p}/share/dpl"
-    db_wf = {}
-    for file_json in glob.glob(f"{dir_json}/*.json"):
-        # print(file_json)
-        # Get the workflow name from the JSON file name
-        workflow = os.path.basename(file_json).split(".")[0]
+    return f"{dir_o2p}/share/dpl"
+
+
+def get_cache_dir_default():
+    """Get the default directory of the workflow cache."""
+    dir_cache_user = os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(dir_cache_user, "find_dependencies")
+
+
+def simplify_workflow(specs_wf: list):
+    """Make the simplified dictionary of a workflow with AOD inputs and outputs of each device."""
+    dic_wf = {}
+    for dev in get_devices(specs_wf):
+        dic_wf[dev] = {"inputs": get_inputs(specs_wf, dev), "outputs": get_outputs(specs_wf, dev)}
+    return dic_wf
+
+
+binding_dropped = object()  # replacement of dropped inputs and outputs of devices in JSON files
+
+
+def project_spec(obj: dict):
+    """Keep only the parts of a JSON object needed for the simplified dictionary.
+
+    Used as the object hook of the JSON decoder so that device options, metadata, non-AOD inputs and outputs etc.
+    are dropped as soon as they are decoded.
+    """
+    if "origin" in obj and "description" in obj:  # input or output
+        if obj["origin"] != "AOD":
+            return binding_dropped
+        return {"origin": obj["origin"], "description": obj["description"], "subspec": obj.get("subspec", 0)}
+    if "name" in obj and "inputs" in obj and "outputs" in obj:  # device
+        return {
+            "name": obj["name"],
+            "inputs": [i for i in obj["inputs"] if i is not binding_dropped],
+            "outputs": [o for o in obj["outputs"] if o is not binding_dropped],
+        }
+    if "workflow" in obj:  # top level
+        return {"workflow": obj["workflow"]}
+    return None
+
+
+def load_workflow_from_json(file_json: str, hash_cached=""):
+    """Load the simplified dictionary of a workflow from a JSON file.
+
+    Returns the hash of the file content and the dictionary (None if the hash is equal to the cached hash).
+    """
+    try:
+        with open(file_json, "rb") as j:
+            content = j.read()
+    except FileNotFoundError:
+        msg_fatal("JSON file not found.")
+    hash_json = hashlib.sha256(content).hexdigest()
+    if hash_json == hash_cached:
+        return hash_json, None
+    specs_wf = json.loads(content.decode("utf8", errors="ignore"), object_hook=project_spec)
+    return hash_json, simplify_workflow(specs_wf["workflow"])
+
+
+def load_workflows_from_json(path_cache="", n_jobs=1):
+    """Load simplified dictionaries of all workflows from JSON files.
+
+    If a cache file is provided, dictionaries of unchanged files are taken from the cache
+    and the cache is updated with the changed files.
+    Files are considered unchanged if the modification time of the directory and the modification times
+    and sizes of files are the same as in the cache. Otherwise, only files with different content hashes are loaded.
+    Files are loaded in n_jobs parallel processes.
+    """
+    dir_json = get_dir_json()
+    files_json = sorted(glob.glob(f"{dir_json}/*.json"))
+    cache = {}
+    if path_cache:
+        try:
+            with open(path_cache, "r", encoding="utf-8") as file_cache:
+                cache = json.load(file_cache)
+        except (OSError, ValueError):
+            pass
+        if cache.get("version") != version_cache or cache.get("dir") != dir_json:
+            cache = {}
+    files_cached = cache.get("files", {})
+    try:
+        mtime_dir = os.stat(dir_json).st_mtime_ns
+    except FileNotFoundError:
+        msg_fatal(f"Directory {dir_json} not found.")
+    unchanged_dir = cache.get("mtime_dir") == mtime_dir and len(files_cached) == len(files_json)
+    files = {}
+    files_load = []  # files to be checked and loaded: (name, path, stat, cached entry)
+    for file_json in files_json:
+        name_file = os.path.basename(file_json)
+        stat = os.stat(file_json)
+        entry = files_cached.get(name_file)
+        if entry and entry["mtime"] == stat.st_mtime_ns and entry["size"] == stat.st_size and unchanged_dir:
+            files[name_file] = entry
+            continue
+        files[name_file] = None  # Keep the order of files.
+        files_load.append((name_file, file_json, stat, entry or {}))
+    paths_load = [f[1] for f in files_load]
+    hashes_cached = [f[3].get("hash", "") for f in files_load]
+    if n_jobs > 1 and len(files_load) > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            chunk_size = max(1, len(files_load) // (4 * n_jobs))
+            results = list(executor.map(load_workflow_from_json, paths_load, hashes_cached, chunksize=chunk_size))
+    else:
+        results = list(map(load_workflow_from_json, paths_load, hashes_cached))
+    n_loaded = 0
+    for (name_file, _, stat, entry), (hash_json, dic_wf) in zip(files_load, results):
+        if dic_wf is not None:
+            entry = {"hash": hash_json, "workflow": dic_wf}
+            n_loaded += 1
+        files[name_file] = {**entry, "mtime": stat.st_mtime_ns, "size": stat.st_size}
+    if path_cache and (files != files_cached or cache.get("mtime_dir") != mtime_dir):
+        cache = {"version": version_cache, "dir": dir_json, "mtime_dir": mtime_dir, "files": files}
+        path_tmp = f"{path_cache}.{os.getpid()}.tmp"
         try:
-            with open(file_json, "r", encoding="utf8", errors="ignore") as j:
-                specs_wf = json.load(j)
-                db_wf[workflow] = specs_wf["workflow"]
-        except FileNotFoundError:
-            msg_fatal("JSON file not found.")
-        # print(workflow)
-    return db_wf
+            os.makedirs(os.path.dirname(path_cache), exist_ok=True)
+            with open(path_tmp, "w", encoding="utf-8") as file_cache:
+                json.dump(cache, file_cache, separators=(",", ":"))
+            os.replace(path_tmp, path_cache)  # atomic replacement
+        except OSError:
+            msg_warn(f"Failed to write the workflow cache {path_cache}")
+        if n_loaded:
+            eprint(f"Loaded {n_loaded} new or changed JSON files of {len(files)}")
+    # Get the workflow name from the JSON file name
+    return {name_file.split(".")[0]: entry["workflow"] for name_file, entry in files.items()}
 
 
 def format_table_name(description: str, subspec: int):
@@ -142,19 +265,40 @@ def print_workflows(dic_wf_all: dict, list_wf=None):
             print_wf(dic_wf, wf)
 
 
+table_index_cache: list = [None, None]  # last indexed dictionary of workflows and its index
+
+
+def make_table_index(dic_wf_all: dict):
+    """Make inverted indexes of tables in the simplified dictionary.
+
+    Indexes map table names (case-sensitive and lowercase) to lists of workflows that produce (outputs)
+    or consume (inputs) them, in the order of workflows in the dictionary.
+    The index for a given direction and case sensitivity is accessed with the key (reverse, case_sensitive).
+    """
+    index: dict = {(reverse, case): {} for reverse in (False, True) for case in (False, True)}
+    for wf, dic_wf in dic_wf_all.items():
+        for dev in dic_wf.values():
+            for reverse, key in ((False, "outputs"), (True, "inputs")):
+                for table in dev[key]:
+                    for case, name in ((True, table), (False, table.lower())):
+                        workflows = index[(reverse, case)].setdefault(name, [])
+                        if not workflows or workflows[-1] != wf:
+                            workflows.append(wf)
+    return index
+
+
+def get_table_index(dic_wf_all: dict):
+    """Get inverted indexes of tables in the simplified dictionary, reusing the last made index."""
+    if table_index_cache[0] is not dic_wf_all:
+        table_index_cache[:] = [dic_wf_all, make_table_index(dic_wf_all)]
+    return table_index_cache[1]
+
+
 def get_table_producers(table: str, dic_wf_all: dict, case_sensitive=False, reverse=False):
-    """Find all workflows that have this table as output."""
-    list_producers = []
+    """Find all workflows that have this table as output (or as input if reverse)."""
     if not case_sensitive:
         table = table.lower()
-    # Loop over workflows
-    for wf, dic_wf in dic_wf_all.items():
-        # Loop over devices
-        for dev in dic_wf:
-            outputs = [o if case_sensitive else o.lower() for o in dic_wf[dev]["inputs" if reverse else "outputs"]]
-            if table in outputs:
-                list_producers.append(wf)
-    return list(dict.fromkeys(list_producers))  # Remove duplicities
+    return list(get_table_index(dic_wf_all)[(reverse, case_sensitive)].get(table, []))
 
 
 def get_workflow_outputs(wf: str, dic_wf_all: dict):
@@ -181,32 +325,41 @@ def get_workflow_inputs(wf: str, dic_wf_all: dict):
 def get_tree_for_workflow(
     wf: str, dic_wf_all: dict, dic_wf_tree=None, case_sensitive=False, level=0, levels_max=0, reverse=False
 ):
-    """Get the dependency tree of tables and workflows needed to run this workflow."""
+    """Get the dependency tree of tables and workflows needed to run this workflow.
+
+    The tree is traversed depth-first with an explicit stack so that deep topologies do not hit the recursion limit.
+    """
     # print(level, levels_max)
     if dic_wf_tree is None:
         dic_wf_tree = {}
-    if wf not in dic_wf_all:
-        msg_fatal(f"Workflow {wf} not found")
-    if wf not in dic_wf_tree:
-        dic_wf_tree[wf] = dic_wf_all[wf]
-    if reverse:
-        inputs = get_workflow_outputs(wf, dic_wf_all)
-        symbol_direction = "->"
-    else:
-        inputs = get_workflow_inputs(wf, dic_wf_all)
-        symbol_direction = "<-"
-    if inputs:
-        print(f"{level * '    '}{wf} {symbol_direction} {inputs}")
-        if levels_max < 0 or level < levels_max:
-            for tab in inputs:
-                producers = get_table_producers(tab, dic_wf_all, case_sensitive, reverse)
-                if producers:
-                    print(f"{level * '    ' + '  '}{tab} {symbol_direction} {producers}")
-                    for p in producers:
-                        if p not in dic_wf_tree:  # avoid infinite recursion
-                            get_tree_for_workflow(
-                                p, dic_wf_all, dic_wf_tree, case_sensitive, level + 1, levels_max, reverse
-                            )
+    symbol_direction = "->" if reverse else "<-"
+
+    def expand(wf: str, level: int):
+        """Print the inputs of the workflow and generate producers of the inputs to be expanded."""
+        if wf not in dic_wf_all:
+            msg_fatal(f"Workflow {wf} not found")
+        if wf not in dic_wf_tree:
+            dic_wf_tree[wf] = dic_wf_all[wf]
+        inputs = get_workflow_outputs(wf, dic_wf_all) if reverse else get_workflow_inputs(wf, dic_wf_all)
+        if inputs:
+            print(f"{level * '    '}{wf} {symbol_direction} {inputs}")
+            if levels_max < 0 or level < levels_max:
+                for tab in inputs:
+                    producers = get_table_producers(tab, dic_wf_all, case_sensitive, reverse)
+                    if producers:
+                        print(f"{level * '    ' + '  '}{tab} {symbol_direction} {producers}")
+                        for p in producers:
+                            yield p, level + 1
+
+    stack = [expand(wf, level)]
+    while stack:
+        try:
+            p, level_p = next(stack[-1])
+        except StopIteration:
+            stack.pop()
+            continue
+        if p not in dic_wf_tree:  # avoid infinite loops
+            stack.append(expand(p, level_p))
     return dic_wf_tree
 
 
@@ -233,6 +386,688 @@ def get_tree_for_table(tab: str, dic_wf_all: dict, dic_wf_tree=None, case_sensit
     return dic_wf_tree
 
 
+class DependencyGraph:
+    """Graph of dependencies between workflows and tables for answering many queries.
+
+    Adjacency of workflows (tables they need and workflows producing these tables) is built on first use
+    and shared by all queries. Results of queries are memoised.
+    Edges point in the direction of the data flow (input table -> workflow -> output table).
+    Tables produced and consumed within the same workflow (e.g. by spawners) do not make dependencies.
+    """
+
+    def __init__(self, dic_wf_all: dict, case_sensitive=False):
+        self.dic_wf_all = dic_wf_all
+        self.case_sensitive = case_sensitive
+        self.adjacency: dict = {}  # (workflow, reverse) -> list of (table, list of workflows)
+        self.successors: dict = {}  # workflow -> workflows producing its inputs
+        self.results: dict = {}  # query -> result
+        self.components: dict = {}  # workflow -> strongly connected component (tuple of workflows)
+
+    def get_adjacency(self, wf: str, reverse=False):
+        """Get the tables needed (or produced if reverse) by the workflow with their producers (or consumers).
+
+        Inputs produced by the workflow itself are not needed and the workflow is not its own consumer.
+        """
+        key = (wf, reverse)
+        if key not in self.adjacency:
+            outputs = get_workflow_outputs(wf, self.dic_wf_all)
+            if reverse:
+                tables = outputs
+            else:
+                outputs_internal = set(outputs if self.case_sensitive else (o.lower() for o in outputs))
+                tables = [
+                    i
+                    for i in get_workflow_inputs(wf, self.dic_wf_all)
+                    if (i if self.case_sensitive else i.lower()) not in outputs_internal
+                ]
+            self.adjacency[key] = [
+                (tab, [p for p in get_table_producers(tab, self.dic_wf_all, self.case_sensitive, reverse) if p != wf])
+                for tab in tables
+            ]
+        return self.adjacency[key]
+
+    def get_components(self):
+        """Get strongly connected components of workflows (iterative Tarjan algorithm), computed once."""
+        if self.components:
+            return self.components
+        index: dict = {}
+        lowlink: dict = {}
+        stack: list = []
+        on_stack: set = set()
+        for root in self.dic_wf_all:
+            if root in index:
+                continue
+            work = [(root, iter(self.get_successors(root)))]
+            index[root] = lowlink[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            while work:
+                wf, successors = work[-1]
+                for succ in successors:
+                    if succ not in index:
+                        index[succ] = lowlink[succ] = len(index)
+                        stack.append(succ)
+                        on_stack.add(succ)
+                        work.append((succ, iter(self.get_successors(succ))))
+                        break
+                    if succ in on_stack:
+                        lowlink[wf] = min(lowlink[wf], index[succ])
+                else:
+                    work.pop()
+                    if work:
+                        lowlink[work[-1][0]] = min(lowlink[work[-1][0]], lowlink[wf])
+                    if lowlink[wf] == index[wf]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component.append(member)
+                            if member == wf:
+                                break
+                        for member in component:
+                            self.components[member] = tuple(sorted(component))
+        return self.components
+
+    def get_successors(self, wf: str):
+        """Get workflows producing the inputs of the workflow."""
+        if wf not in self.successors:
+            self.successors[wf] = list(dict.fromkeys(p for _, producers in self.get_adjacency(wf) for p in producers))
+        return self.successors[wf]
+
+    def get_cycles(self, workflows):
+        """Get dependency cycles (strongly connected components) involving given workflows."""
+        components = self.get_components()
+        cycles = {}
+        for wf in workflows:
+            component = components[wf]
+            if len(component) > 1:
+                cycles[component] = None
+        return [list(c) for c in cycles]
+
+    def query(self, name: str, is_table: bool, reverse=False, levels_max=0):
+        """Get nodes and edges of the dependency tree of a table or a workflow (breadth-first search).
+
+        Depths of workflows are their levels in the workflow tree. Tables have the depth of the workflow
+        that needs (or produces if reverse) them. Cycles are reported as lists of workflows.
+        """
+        key = (name, is_table, reverse, levels_max)
+        if key in self.results:
+            return self.results[key]
+        nodes: dict = {}  # name -> node
+        edges: dict = {}  # (source, target) -> None
+
+        def add_node(node: str, kind: str, depth: int):
+            if node not in nodes:
+                nodes[node] = {"name": node, "type": kind, "depth": depth}
+
+        def add_edge(table: str, wf: str, producer=False):
+            """Add an edge between a table and a workflow that needs it (or produces it if producer)."""
+            edges[(wf, table) if reverse != producer else (table, wf)] = None
+
+        queue = []
+        if is_table:
+            add_node(name, "table", 0)
+            for p in get_table_producers(name, self.dic_wf_all, self.case_sensitive, reverse):
+                add_edge(name, p, True)
+                if p not in nodes:
+                    add_node(p, "workflow", 0)
+                    if levels_max != 0:
+                        queue.append(p)
+        else:
+            if name not in self.dic_wf_all:
+                msg_fatal(f"Workflow {name} not found")
+            add_node(name, "workflow", 0)
+            queue.append(name)
+        i_queue = 0
+        while i_queue < len(queue):
+            wf = queue[i_queue]
+            i_queue += 1
+            depth = nodes[wf]["depth"]
+            expand = levels_max < 0 or depth < levels_max
+            for tab, producers in self.get_adjacency(wf, reverse):
+                add_node(tab, "table", depth)
+                add_edge(tab, wf)
+                if not expand:
+                    continue
+                for p in producers:
+                    add_edge(tab, p, True)
+                    if p not in nodes:
+                        add_node(p, "workflow", depth + 1)
+                        queue.append(p)
+        workflows = [n for n, node in nodes.items() if node["type"] == "workflow"]
+        result = {
+            "query": {
+                "name": name,
+                "type": "table" if is_table else "workflow",
+                "reverse": reverse,
+                "levels": levels_max,
+            },
+            "nodes": list(nodes.values()),
+            "edges": [list(e) for e in edges],
+            "depth": max(node["depth"] for node in nodes.values()),
+            "cycles": self.get_cycles(workflows),
+        }
+        self.results[key] = result
+        return result
+
+
+def read_queries(path: str, levels_max=0):
+    """Read queries from a file (or from stdin if "-").
+
+    Each line contains an option (-t, -w, -T, -W) followed by a table or workflow name
+    and optionally by the maximum number of workflow tree levels. Empty lines and lines starting with # are ignored.
+    Returns a list of tuples (name, is_table, reverse, levels_max).
+    """
+    options = {"-t": (True, False), "-w": (False, False), "-T": (True, True), "-W": (False, True)}
+    try:
+        if path == "-":
+            lines = sys.stdin.readlines()
+        else:
+            with open(path, "r", encoding="utf-8") as file:
+                lines = file.readlines()
+    except OSError:
+        msg_fatal(f"Failed to read queries from {path}")
+    queries = []
+    for i_line, line in enumerate(lines, 1):
+        words = line.split()
+        if not words or words[0].startswith("#"):
+            continue
+        if words[0] not in options or len(words) not in (2, 3):
+            msg_fatal(f"Bad query on line {i_line}: {line.strip()}")
+        try:
+            levels = int(words[2]) if len(words) == 3 else levels_max
+        except ValueError:
+            msg_fatal(f"Bad number of levels on line {i_line}: {line.strip()}")
+        queries.append((words[1], *options[words[0]], levels))
+    return queries
+
+
+def make_dot(dic_deps: dict):
+    """Make lines of the dot file with the graph of workflows and tables."""
+    lines = ["digraph {\n"]
+    lines.append("  node [shape=box, fontname=Courier, fontsize=20]\n")
+    lines.append("  ranksep=2 // vertical node separation\n")
+    # lines.append("  edge [dir=back] // inverted arrow direction\n")
+    # lines.append("  rankdir=BT // bottom to top drawing\n")
+    # lines with dependencies
+    lines_deps = []
+    # subgraph for tables
+    lines_tables = ["  subgraph tables {\n", "    node [fillcolor=lightgrey,style=filled]\n"]
+    list_tables = []
+    # subgraph for workflows
+    lines_workflows = ["  subgraph workflows {\n", '    node [fillcolor=papayawhip,style="filled,rounded"]\n']
+    for wf in dic_deps:
+        # Hyphens are not allowed in node names.
+        node_wf = wf.replace("-", "_")
+        # Remove the workflow prefix.
+        # label_wf = wf.replace("o2-analysis-", "")
+        label_wf = wf
+        # Replace hyphens with line breaks to save horizontal space.
+        # label_wf = label_wf.replace("-", "\\n")
+        lines_workflows.append(f'    {node_wf} [label="{label_wf}"]\n')
+        inputs = get_workflow_inputs(wf, dic_deps)
+        outputs = get_workflow_outputs(wf, dic_deps)
+        list_tables += inputs + outputs
+        nodes_in = " ".join(inputs)
+        nodes_out = " ".join(outputs)
+        lines_deps.append(f"  {{{nodes_in}}} -> {node_wf} -> {{{nodes_out}}}\n")
+    list_tables = list(dict.fromkeys(list_tables))  # Remove duplicities
+    lines_tables += [f"    {table}\n" for table in list_tables]
+    lines_tables.append("  }\n")
+    lines_workflows.append("  }\n")
+    return lines + lines_workflows + lines_tables + lines_deps + ["}\n"]
+
+
+def layout_graph(dic_deps: dict, n_sweeps=4):
+    """Place nodes of the graph of workflows and tables in layers so that edges point downwards.
+
+    Edges closing cycles are ignored when assigning layers. Nodes in layers are ordered by the mean position
+    of their neighbours in the previous (or next) layers to reduce edge crossings.
+    Returns the dictionary of nodes with their type, layer and position in the layer and the list of edges.
+    """
+    nodes: dict = {}
+    edges: dict = {}
+    for wf in dic_deps:
+        nodes[wf] = {"type": "workflow"}
+        for tab in get_workflow_inputs(wf, dic_deps):
+            nodes.setdefault(tab, {"type": "table"})
+            edges[(tab, wf)] = None
+        for tab in get_workflow_outputs(wf, dic_deps):
+            nodes.setdefault(tab, {"type": "table"})
+            edges[(wf, tab)] = None
+    successors: dict = {n: [] for n in nodes}
+    predecessors: dict = {n: [] for n in nodes}
+    for src, dst in edges:
+        if src != dst:
+            successors[src].append(dst)
+            predecessors[dst].append(src)
+    # Find edges closing cycles with an iterative depth-first search.
+    edges_back = set()
+    state: dict = {}  # node -> 1 if on the stack, 2 if finished
+    for root in nodes:
+        if root in state:
+            continue
+        state[root] = 1
+        stack = [(root, iter(successors[root]))]
+        while stack:
+            node, it = stack[-1]
+            for succ in it:
+                if state.get(succ) == 1:
+                    edges_back.add((node, succ))
+                elif succ not in state:
+                    state[succ] = 1
+                    stack.append((succ, iter(successors[succ])))
+                    break
+            else:
+                state[node] = 2
+                stack.pop()
+    # Assign layers as the longest path from sources (topological order).
+    n_pred = {n: sum((p, n) not in edges_back for p in predecessors[n]) for n in nodes}
+    queue = [n for n in nodes if not n_pred[n]]
+    for node in nodes:
+        nodes[node]["layer"] = 0
+    i_queue = 0
+    while i_queue < len(queue):
+        node = queue[i_queue]
+        i_queue += 1
+        for succ in successors[node]:
+            if (node, succ) in edges_back:
+                continue
+            nodes[succ]["layer"] = max(nodes[succ]["layer"], nodes[node]["layer"] + 1)
+            n_pred[succ] -= 1
+            if not n_pred[succ]:
+                queue.append(succ)
+    layers: list = [[] for _ in range(max(node["layer"] for node in nodes.values()) + 1)]
+    for name, node in nodes.items():
+        layers[node["layer"]].append(name)
+    # Order nodes in layers by the barycentre of neighbours.
+    for i_sweep in range(2 * n_sweeps):
+        downwards = i_sweep % 2 == 0
+        for layer in layers if downwards else reversed(layers):
+            for i_node, name in enumerate(layer):
+                nodes[name]["position"] = i_node
+            positions = {}
+            for name in layer:
+                neighbours = predecessors[name] if downwards else successors[name]
+                positions_nb = [nodes[n]["position"] for n in neighbours if "position" in nodes[n]]
+                positions[name] = sum(positions_nb) / len(positions_nb) if positions_nb else nodes[name]["position"]
+            layer.sort(key=positions.__getitem__)
+            for i_node, name in enumerate(layer):
+                nodes[name]["position"] = i_node
+    return nodes, list(edges)
+
+
+def make_svg(dic_deps: dict):
+    """Make lines of the SVG figure with the graph of workflows and tables."""
+    font_size = 14
+    width_char = 0.6 * font_size  # monospace font
+    height_node = 2 * font_size
+    padding = font_size
+    gap_x = font_size
+    gap_y = 5 * font_size  # vertical node separation
+    nodes, edges = layout_graph(dic_deps)
+    layers: dict = {}
+    for name, node in nodes.items():
+        node["width"] = len(name) * width_char + 2 * padding
+        layers.setdefault(node["layer"], []).append(name)
+    widths_layers = {i: sum(nodes[n]["width"] for n in layer) + gap_x * (len(layer) - 1) for i, layer in layers.items()}
+    width = max(widths_layers.values()) + 2 * padding
+    height = len(layers) * (height_node + gap_y) - gap_y + 2 * padding
+    for i_layer, layer in layers.items():
+        x = (width - widths_layers[i_layer]) / 2
+        for name in sorted(layer, key=lambda n: nodes[n]["position"]):
+            nodes[name]["x"] = x
+            nodes[name]["y"] = padding + i_layer * (height_node + gap_y)
+            x += nodes[name]["width"] + gap_x
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8"?>\n',
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:.0f}" height="{height:.0f}" '
+        f'viewBox="0 0 {width:.0f} {height:.0f}" font-family="Courier, monospace" font-size="{font_size}">\n',
+        "  <defs>\n",
+        '    <marker id="arrow" viewBox="0 0 10 10" refX="10" refY="5" markerWidth="8" markerHeight="8" '
+        'orient="auto-start-reverse">\n',
+        '      <path d="M 0 0 L 10 5 L 0 10 z"/>\n',
+        "    </marker>\n",
+        "  </defs>\n",
+        '  <rect width="100%" height="100%" fill="white"/>\n',
+        '  <g fill="none" stroke="black">\n',
+    ]
+    for src, dst in edges:
+        x_src = nodes[src]["x"] + nodes[src]["width"] / 2
+        y_src = nodes[src]["y"] + height_node
+        x_dst = nodes[dst]["x"] + nodes[dst]["width"] / 2
+        y_dst = nodes[dst]["y"]
+        if nodes[dst]["layer"] <= nodes[src]["layer"]:  # edge closing a cycle points upwards
+            y_src -= height_node
+            y_dst += height_node
+        y_mid = (y_src + y_dst) / 2
+        lines.append(
+            f'    <path d="M {x_src:.1f} {y_src:.1f} C {x_src:.1f} {y_mid:.1f} {x_dst:.1f} {y_mid:.1f} '
+            f'{x_dst:.1f} {y_dst:.1f}" marker-end="url(#arrow)"/>\n'
+        )
+    lines.append("  </g>\n")
+    for name, node in nodes.items():
+        fill, radius = ("papayawhip", padding / 2) if node["type"] == "workflow" else ("lightgrey", 0)
+        lines.append(
+            f'  <rect x="{node["x"]:.1f}" y="{node["y"]:.1f}" width="{node["width"]:.1f}" height="{height_node}" '
+            f'rx="{radius}" fill="{fill}" stroke="black"/>\n'
+        )
+        lines.append(
+            f'  <text x="{node["x"] + node["width"] / 2:.1f}" y="{node["y"] + height_node / 2:.1f}" '
+            f'text-anchor="middle" dominant-baseline="central">{html.escape(name)}</text>\n'
+        )
+    lines.append("</svg>\n")
+    return lines
+
+
+pattern_declare = re.compile(r"^[ \t]*(DECLARE_SOA(_[A-Z]+)*_TABLES?(_[A-Z]+)*)[ \t]*\(", re.M)
+# project-specific macros generating tables (e.g. DECLARE_JET_TABLES_LEVELS)
+pattern_declare_other = re.compile(r"^[ \t]*(DECLARE(?!_SOA_)(_[A-Z0-9]+)*_TABLES?(_[A-Z0-9]+)*)[ \t]*\(", re.M)
+pattern_comment_or_string = re.compile(r'"(?:\\.|[^"\\\n])*"|//[^\n]*|/\*.*?\*/', re.S)
+pattern_origin = re.compile(r"AOD[0-9]*")
+pattern_scope_or_column = re.compile(
+    r"\bnamespace\s+([\w:]+)\s*\{|[{}]|^[ \t]*DECLARE_SOA_([A-Z_]*COLUMN[A-Z_]*)[ \t]*\(", re.M
+)
+pattern_template = re.compile(r"<.*>")
+# sizes of column types in bytes
+sizes_types = {
+    "bool": 1,
+    "char": 1,
+    "int8_t": 1,
+    "uint8_t": 1,
+    "short": 2,
+    "ushort": 2,
+    "int16_t": 2,
+    "uint16_t": 2,
+    "int": 4,
+    "Int_t": 4,
+    "int32_t": 4,
+    "uint32_t": 4,
+    "float": 4,
+    "Float_t": 4,
+    "double": 8,
+    "Double_t": 8,
+    "long": 8,
+    "int64_t": 8,
+    "uint64_t": 8,
+}
+size_default = 4  # size of columns of unknown types
+n_elements_vector = 4  # assumed mean number of elements of vector columns
+
+
+def read_source(path: str):
+    """Read a C++ file without comments."""
+    try:
+        with open(path, "r", encoding="utf-8", errors="ignore") as file:
+            content = file.read()
+    except OSError:
+        msg_warn(f"Failed to read file {path}")
+        return ""
+    return pattern_comment_or_string.sub(lambda m: m.group() if m.group().startswith('"') else " ", content)
+
+
+def split_arguments(content: str, start: int):
+    """Split arguments of a macro call starting after the opening parenthesis at commas outside brackets."""
+    args: list = []
+    arg = ""
+    depth = 1
+    char_previous = ""
+    for char in content[start:]:
+        if char in "(<[{":
+            depth += 1
+        elif char in ")]}" or (char == ">" and char_previous != "-"):
+            depth -= 1
+            if not depth:
+                break
+        if char == "," and depth == 1:
+            args.append(arg.strip())
+            arg = ""
+        else:
+            arg += char
+        char_previous = char
+    args.append(arg.strip())
+    return args
+
+
+def get_table_declarations(content: str):
+    """Get tables declared with DECLARE_SOA_*TABLE* macros in C++ code without comments.
+
+    Returns a list of tuples with the table name (description with version) and the list of the remaining
+    macro arguments (columns).
+    The description is the string argument following the origin or, if the origin is not given, the first one.
+    Declarations in macro definitions and macros without string arguments are ignored.
+    """
+    tables = []
+    for match in pattern_declare.finditer(content):
+        args = split_arguments(content, match.end())
+        if not args[0] or args[0][0] == "_" or "#" in args[0]:  # macro variable
+            continue
+        i_strings = [i for i, a in enumerate(args) if len(a) > 1 and a[0] == a[-1] == '"']
+        i_origins = [i for i in i_strings if pattern_origin.fullmatch(args[i][1:-1])]
+        i_descriptions = [i for i in i_strings if i not in i_origins and (not i_origins or i > i_origins[0])]
+        if not i_descriptions:
+            continue
+        i_desc = i_descriptions[0]
+        version = 0
+        if "VERSIONED" in match.group(1) and i_desc + 1 < len(args) and args[i_desc + 1].isdigit():
+            version = int(args[i_desc + 1])
+            i_desc += 1
+        tables.append((format_table_name(args[i_descriptions[0]][1:-1], version), args[i_desc + 1 :]))
+    return tables
+
+
+def get_declared_tables(path: str):
+    """Get names of tables (descriptions with versions) declared with DECLARE_SOA_*TABLE* macros in a C++ file.
+
+    Tables generated by other macros cannot be named without expanding the macros. A warning is printed instead.
+    """
+    content = read_source(path)
+    tables = [name for name, _ in get_table_declarations(content)]
+    macros = list(dict.fromkeys(m.group(1) for m in pattern_declare_other.finditer(content)))
+    if macros:
+        msg_warn(f"{path}: Tables generated by macros {macros} are not considered.")
+    return list(dict.fromkeys(tables))  # Remove duplicities
+
+
+def get_type_size(type_column: str):
+    """Get the size of a column type in bytes (with the assumed number of elements for vectors)."""
+    type_column = type_column.replace("std::", "").replace("const ", "").strip()
+    if type_column.startswith("vector<") and type_column.endswith(">"):
+        return 4 + n_elements_vector * get_type_size(type_column[len("vector<") : -1])  # offset and elements
+    if type_column.endswith("]") and "[" in type_column:
+        type_element, n_elements = type_column[:-1].split("[", 1)
+        if n_elements.strip().isdigit():
+            return int(n_elements) * get_type_size(type_element)
+    return sizes_types.get(type_column, size_default)
+
+
+def get_column_sizes(content: str, columns: dict):
+    """Add sizes of columns declared with DECLARE_SOA_*COLUMN* macros in C++ code without comments.
+
+    Columns are stored in the dictionary as bare names mapped to lists of (qualified name, size in bytes).
+    """
+    scopes: list = []  # namespaces (None for other scopes)
+    for match in pattern_scope_or_column.finditer(content):
+        if match.group(1):
+            scopes.append(match.group(1))
+            continue
+        if match.group() == "{":
+            scopes.append(None)
+            continue
+        if match.group() == "}":
+            if scopes:
+                scopes.pop()
+            continue
+        kind = match.group(2)
+        args = split_arguments(content, match.end())
+        if not args[0] or args[0][0] == "_" or "#" in args[0]:  # macro variable
+            continue
+        if "DYNAMIC" in kind:
+            size = 0  # not stored
+        elif "ARRAY_INDEX" in kind:
+            size = 4 + n_elements_vector * 4
+        elif "SLICE_INDEX" in kind:
+            size = 8
+        elif "INDEX" in kind:
+            size = 4
+        elif "BITMAP" in kind:
+            size = int(args[2]) // 8 if len(args) > 2 and args[2].isdigit() else size_default
+        else:
+            size = get_type_size(args[2]) if len(args) > 2 else size_default
+        name_qualified = "::".join([ns for ns in scopes if ns] + [args[0]])
+        columns.setdefault(args[0], []).append((name_qualified, size))
+
+
+def get_table_metadata(dirs_source: list):
+    """Get the numbers of columns and the row sizes of tables declared in C++ files in given directories.
+
+    Columns are matched by their (partially) qualified names. Columns that are not declared in the files
+    get the default size and are counted as unknown. The implicit row index and markers are not stored.
+    """
+    columns: dict = {}
+    declarations = []
+    for dir_source in dirs_source:
+        for suffix in ("h", "cxx"):
+            for path in glob.glob(f"{dir_source}/**/*.{suffix}", recursive=True):
+                with open(path, "rb") as file:
+                    content = file.read()
+                if b"DECLARE_SOA" not in content:
+                    continue
+                content = pattern_comment_or_string.sub(
+                    lambda m: m.group() if m.group().startswith('"') else " ",
+                    content.decode("utf-8", errors="ignore"),
+                )
+                get_column_sizes(content, columns)
+                declarations += get_table_declarations(content)
+    tables = {}
+    for name_table, args in declarations:
+        size = 0
+        n_columns = 0
+        n_unknown = 0
+        for arg in args:
+            name = pattern_template.sub("", arg).strip()
+            name_bare = name.split("::")[-1]
+            if not name or name[0] == '"' or name.isdigit() or name_bare in ("Index", "Marker"):
+                continue
+            n_columns += 1
+            candidates = columns.get(name_bare, [])
+            matches = [c for c in candidates if f"::{c[0]}".endswith(f"::{name}")] or candidates
+            if matches:
+                size += matches[0][1]
+            else:
+                size += size_default
+                n_unknown += 1
+        tables[name_table] = {"columns": n_columns, "unknown": n_unknown, "row_size": size}
+    return tables
+
+
+def estimate_memory(dic_deps: dict, tables_meta: dict, rows_default: int, rows_tables: dict, row_size_default: int):
+    """Estimate the memory footprint of all tables consumed and produced by the workflows per timeframe.
+
+    Returns the list of table estimates (name, number of rows, row size in bytes, size in bytes, known row size)
+    sorted by size and the total size in bytes.
+    """
+    tables = []
+    for wf in dic_deps:
+        tables += get_workflow_inputs(wf, dic_deps) + get_workflow_outputs(wf, dic_deps)
+    rows_tables = {t.lower(): n for t, n in rows_tables.items()}
+    estimates = []
+    for table in dict.fromkeys(tables):
+        rows = rows_tables.get(table.lower(), rows_default)
+        known = table in tables_meta
+        row_size = tables_meta[table]["row_size"] if known else row_size_default
+        estimates.append((table, rows, row_size, rows * row_size, known))
+    estimates.sort(key=lambda e: e[3], reverse=True)
+    return estimates, sum(e[3] for e in estimates)
+
+
+def get_minimal_workflows(tables: list, workflows: list, dic_wf_all: dict, case_sensitive=False):
+    """Find a small set of workflows that produces the given tables and runs the given workflows.
+
+    Tables without producers are considered available in the input data.
+    For each table, the smallest set of workflows needed to produce it without circular dependencies
+    is found iteratively until no set can be made smaller. These sets are then used to greedily choose
+    producers of the needed tables that add the fewest workflows to the selection.
+    Workflows that are not needed are finally removed.
+    Returns the list of selected workflows and the list of requested tables that no workflow produces.
+    """
+
+    def key(table: str):
+        return table if case_sensitive else table.lower()
+
+    # External inputs of workflows (inputs not produced by the same workflow)
+    inputs_ext = {}
+    for wf in dic_wf_all:
+        outputs = {key(o) for o in get_workflow_outputs(wf, dic_wf_all)}
+        inputs_ext[wf] = [i for i in dict.fromkeys(map(key, get_workflow_inputs(wf, dic_wf_all))) if i not in outputs]
+    index = get_table_index(dic_wf_all)[(False, case_sensitive)]
+    # Smallest set of workflows needed to produce each table (empty if available in the input data)
+    best: dict = {}
+    for wf in dic_wf_all:
+        for i in inputs_ext[wf]:
+            if i not in index:
+                best[i] = frozenset()
+
+    def get_set(wf: str):
+        """Get the set of workflows needed to run the workflow (None if some input cannot be produced)."""
+        if any(i not in best for i in inputs_ext[wf]):
+            return None
+        return frozenset([wf]).union(*(best[i] for i in inputs_ext[wf]))
+
+    changed = True
+    while changed:
+        changed = False
+        for wf in dic_wf_all:
+            if (set_wf := get_set(wf)) is None:
+                continue
+            for o in get_workflow_outputs(wf, dic_wf_all):
+                o = key(o)
+                if o not in best or len(set_wf) < len(best[o]):
+                    best[o] = set_wf
+                    changed = True
+
+    # Greedy selection of producers of the needed tables
+    for wf in workflows:
+        if wf not in dic_wf_all:
+            msg_fatal(f"Workflow {wf} not found")
+    missing = [t for t in tables if key(t) not in index]
+    selected = set(workflows)
+    produced = {key(o) for wf in selected for o in get_workflow_outputs(wf, dic_wf_all)}
+    needed = [key(t) for t in tables if key(t) in index] + [i for wf in workflows for i in inputs_ext[wf]]
+
+    def get_cost(wf: str):
+        """Get the number of workflows added to the selection by selecting the workflow.
+
+        Workflows involved in circular dependencies get the number of their missing inputs
+        on top of the number of all workflows.
+        """
+        if (set_wf := get_set(wf)) is not None:
+            return len(set_wf - selected)
+        return len(dic_wf_all) + sum(i not in produced and i in index for i in inputs_ext[wf])
+
+    while needed:
+        table = needed.pop()
+        if table in produced or table not in index:
+            continue
+        wf = min(index[table], key=get_cost)
+        selected.add(wf)
+        produced.update(key(o) for o in get_workflow_outputs(wf, dic_wf_all))
+        needed += inputs_ext[wf]
+
+    # Removal of workflows that are not needed
+    def is_valid(workflows_sel: set):
+        """Check that the workflows produce all requested tables and all their inputs."""
+        produced = {key(o) for wf in workflows_sel for o in get_workflow_outputs(wf, dic_wf_all)}
+        if any(key(t) not in produced and key(t) in index for t in tables):
+            return False
+        return all(i in produced or i not in index for wf in workflows_sel for i in inputs_ext[wf])
+
+    for wf in sorted(selected, reverse=True):
+        if wf not in workflows and is_valid(selected - {wf}):
+            selected.discard(wf)
+    return [wf for wf in dic_wf_all if wf in selected], list(dict.fromkeys(missing))
+
+
 def main():
     """Main function"""
     parser = argparse.ArgumentParser(
@@ -265,7 +1100,12 @@ def main():
         dest="suffix",
         type=str,
         choices=["pdf", "svg", "png"],
-        help="make a topology graph in a given format",
+        help="make a topology graph in a given format (SVG is made without Graphviz unless --graphviz)",
+    )
+    parser.add_argument(
+        "--graphviz",
+        action="store_true",
+        help="make SVG graphs with Graphviz (dot)",
     )
     parser.add_argument(
         "-x",
@@ -281,68 +1121,225 @@ def main():
         default=0,
         help="maximum number of workflow tree levels (default = 0, include all if < 0)",
     )
+    parser.add_argument(
+        "-j",
+        dest="jobs",
+        type=int,
+        default=0,
+        help="number of parallel processes loading JSON files (default = 0, use all CPUs if < 1)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        dest="no_cache",
+        action="store_true",
+        help="do not use the cache of workflows loaded from JSON files",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        dest="cache_dir",
+        type=str,
+        default=get_cache_dir_default(),
+        help="directory of the workflow cache (default = %(default)s)",
+    )
+    parser.add_argument(
+        "-b",
+        dest="batch",
+        type=str,
+        help="answer queries from a file (- for stdin) and print results in JSON "
+        "(one query per line: -t|-w|-T|-W name [levels])",
+    )
+    parser.add_argument(
+        "-s",
+        dest="solve",
+        action="store_true",
+        help="find a minimal set of workflows needed to produce the given tables and run the given workflows",
+    )
+    parser.add_argument(
+        "-f",
+        dest="files",
+        type=str,
+        nargs="+",
+        help="changed C++ file(s) for impact analysis (i.e. find consumers of tables declared in them, use -l -1 "
+        "to include all downstream workflows)",
+    )
+    parser.add_argument(
+        "-m",
+        dest="memory",
+        action="store_true",
+        help="estimate the shared-memory footprint of tables in the dependency tree",
+    )
+    parser.add_argument(
+        "--datamodel",
+        dest="dirs_datamodel",
+        type=str,
+        nargs="+",
+        default=[os.path.dirname(os.path.dirname(os.path.abspath(__file__)))],
+        help="directories with C++ files declaring tables and columns (default = %(default)s)",
+    )
+    parser.add_argument(
+        "--rows",
+        type=int,
+        default=100000,
+        help="number of rows of tables per timeframe (default = %(default)s)",
+    )
+    parser.add_argument(
+        "--rows-table",
+        dest="rows_tables",
+        type=str,
+        action="append",
+        default=[],
+        metavar="TABLE=ROWS",
+        help="number of rows of a given table per timeframe (can be repeated)",
+    )
+    parser.add_argument(
+        "--row-size",
+        dest="row_size",
+        type=int,
+        default=64,
+        help="row size in bytes of tables that are not declared in the C++ files (default = %(default)s)",
+    )
+    parser.add_argument(
+        "--timeframes",
+        type=int,
+        default=1,
+        help="number of timeframes in flight for the shared-memory size (default = %(default)s)",
+    )
     args = parser.parse_args()
-    if not (args.table or args.workflow or args.table_rev or args.workflow_rev):
+    if args.batch and (args.table or args.workflow or args.table_rev or args.workflow_rev or args.suffix or args.files):
+        parser.error("Batch mode cannot be combined with -t, -w, -T, -W, -g, -f")
+    if not (args.table or args.workflow or args.table_rev or args.workflow_rev or args.batch or args.files):
         parser.error("Provide table(s) and/or workflow(s)")
+    if args.solve and (args.table_rev or args.workflow_rev or args.batch or args.files):
+        parser.error("The solver cannot be combined with -T, -W, -b, -f")
+    rows_tables = {}
+    for item in args.rows_tables:
+        table, _, rows = item.partition("=")
+        if not table or not rows.isdigit():
+            parser.error(f"Bad number of rows of a table: {item}")
+        rows_tables[table] = int(rows)
     tables = args.table
     workflows = args.workflow
     tables_rev = args.table_rev
+    # Get tables declared in changed files for reverse search.
+    tables_changed = []
+    if args.files:
+        for path in args.files:
+            if tables_file := get_declared_tables(path):
+                print(f"{path}: {tables_file}")
+                tables_changed += tables_file
+        tables_changed = list(dict.fromkeys(tables_changed))  # Remove duplicities
+        if not tables_changed:
+            print("No tables declared in the changed files")
+            if not (args.table or args.workflow or args.table_rev or args.workflow_rev):
+                return
     workflows_rev = args.workflow_rev
     case_sensitive = args.case
     graph_suffix = args.suffix
     list_exclude = args.exclude
     n_levels = args.levels
 
-    # Load all workflows from JSON files
-    dic_wf_all_full = load_workflows_from_json()
-    # Extract only needed info and make a simplified dictionary
-    dic_wf_all_simple = {}
-    for wf, dic_wf in dic_wf_all_full.items():
-        # Skip excluded workflows
-        if list_exclude and wf in list_exclude:
-            continue
-        dic_wf_all_simple[wf] = {}
-        list_dev = get_devices(dic_wf)
-        for dev in list_dev:
-            dic_wf_all_simple[wf][dev] = {}
-            list_inputs = get_inputs(dic_wf, dev)
-            list_outputs = get_outputs(dic_wf, dev)
-            # Skip excluded tables
-            if list_exclude:
-                list_inputs = [i for i in list_inputs if i not in list_exclude]
-                list_outputs = [o for o in list_outputs if o not in list_exclude]
-            dic_wf_all_simple[wf][dev]["inputs"] = list_inputs
-            dic_wf_all_simple[wf][dev]["outputs"] = list_outputs
+    # Load simplified dictionaries of all workflows from JSON files (or from the cache)
+    path_cache = ""
+    if not args.no_cache:
+        path_cache = os.path.join(
+            args.cache_dir, f"workflows-{hashlib.sha256(get_dir_json().encode()).hexdigest()[:16]}.json"
+        )
+    n_jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    dic_wf_all_simple = load_workflows_from_json(path_cache, n_jobs)
+    if list_exclude:
+        # Skip excluded workflows and tables
+        dic_wf_all_simple = {
+            wf: {
+                dev: {
+                    "inputs": [i for i in dic_dev["inputs"] if i not in list_exclude],
+                    "outputs": [o for o in dic_dev["outputs"] if o not in list_exclude],
+                }
+                for dev, dic_dev in dic_wf.items()
+            }
+            for wf, dic_wf in dic_wf_all_simple.items()
+            if wf not in list_exclude
+        }
     # print_workflows(dic_wf_all_simple)
     # return
 
+    # Answer all queries with one graph.
+    if args.batch:
+        queries = read_queries(args.batch, n_levels)
+        graph = DependencyGraph(dic_wf_all_simple, case_sensitive)
+        print(json.dumps([graph.query(*q) for q in queries]))
+        return
+
     # Dictionary with dependencies
     dic_deps = {}
 
-    # Find table dependencies
-    for t, reverse in zip((tables, tables_rev), (False, True)):
-        if t:
-            for table in t:
-                print(f"\nTable: {table}\n")
-                if not table:
-                    msg_fatal("Bad table")
-                # producers = get_table_producers(table, dic_wf_all_simple, case_sensitive)
-                # if not producers:
-                #     print("No producers found")
-                #     return
-                # print(producers)
-                # print_workflows(dic_wf_all_simple, producers)
-                get_tree_for_table(table, dic_wf_all_simple, dic_deps, case_sensitive, n_levels, reverse)
-
-    # Find workflow dependencies
-    for w, reverse in zip((workflows, workflows_rev), (False, True)):
-        if w:
-            for workflow in w:
-                print(f"\nWorkflow: {workflow}\n")
-                if not workflow:
-                    msg_fatal("Bad workflow")
-                # print_workflows(dic_wf_all_simple, [workflow])
-                get_tree_for_workflow(workflow, dic_wf_all_simple, dic_deps, case_sensitive, 0, n_levels, reverse)
+    # Find a minimal set of workflows.
+    if args.solve:
+        solution, missing = get_minimal_workflows(tables or [], workflows or [], dic_wf_all_simple, case_sensitive)
+        if missing:
+            msg_warn(f"Tables not produced by any workflow: {missing}")
+        n_devices = sum(len(dic_wf_all_simple[wf]) for wf in solution)
+        print(f"\nMinimal set of {len(solution)} workflows with {n_devices} devices:\n")
+        for wf in solution:
+            print(wf)
+            dic_deps[wf] = dic_wf_all_simple[wf]
+    else:
+        # Find table dependencies
+        for t, reverse in zip((tables, tables_rev), (False, True)):
+            if t:
+                for table in t:
+                    print(f"\nTable: {table}\n")
+                    if not table:
+                        msg_fatal("Bad table")
+                    # producers = get_table_producers(table, dic_wf_all_simple, case_sensitive)
+                    # if not producers:
+                    #     print("No producers found")
+                    #     return
+                    # print(producers)
+                    # print_workflows(dic_wf_all_simple, producers)
+                    get_tree_for_table(table, dic_wf_all_simple, dic_deps, case_sensitive, n_levels, reverse)
+
+        # Find workflow dependencies
+        for w, reverse in zip((workflows, workflows_rev), (False, True)):
+            if w:
+                for workflow in w:
+                    print(f"\nWorkflow: {workflow}\n")
+                    if not workflow:
+                        msg_fatal("Bad workflow")
+                    # print_workflows(dic_wf_all_simple, [workflow])
+                    get_tree_for_workflow(workflow, dic_wf_all_simple, dic_deps, case_sensitive, 0, n_levels, reverse)
+
+    # Find workflows and tables affected by changes of tables.
+    if tables_changed:
+        dic_impact: dict = {}
+        for table in tables_changed:
+            print(f"\nChanged table: {table}\n")
+            get_tree_for_table(table, dic_wf_all_simple, dic_impact, case_sensitive, n_levels, True)
+        dic_deps.update(dic_impact)
+        workflows_affected = sorted(dic_impact)
+        tables_affected = sorted(
+            {o for wf in workflows_affected for o in get_workflow_outputs(wf, dic_impact)} - set(tables_changed)
+        )
+        print(f"\nAffected workflows ({len(workflows_affected)}):")
+        for wf in workflows_affected:
+            print(wf)
+        print(f"\nAffected downstream tables ({len(tables_affected)}):")
+        for table in tables_affected:
+            print(table)
+
+    # Estimate the shared-memory footprint.
+    if args.memory and dic_deps:
+        tables_meta = get_table_metadata(args.dirs_datamodel)
+        estimates, size_total = estimate_memory(dic_deps, tables_meta, args.rows, rows_tables, args.row_size)
+        len_max = max(len("table"), *(len(e[0]) for e in estimates))
+        print(f"\nEstimated shared-memory footprint of {len(estimates)} tables per timeframe:\n")
+        print(f"{'table':{len_max}}  {'rows':>10}  {'row size [B]':>12}  {'size [MB]':>10}")
+        for table, rows, row_size, size, known in estimates:
+            print(f"{table:{len_max}}  {rows:>10}  {row_size:>12}{' ' if known else '*'}  {size / 1e6:>9.1f}")
+        if not all(e[4] for e in estimates):
+            print("* not declared in the C++ files, default row size")
+        size_shm = size_total * args.timeframes
+        print(f"\nTotal per timeframe: {size_total / 1e6:.1f} MB")
+        print(f"Shared memory for {args.timeframes} timeframe(s): --shm-segment-size {size_shm}")
 
     # Print the tree dictionary with dependencies
     # print("\nTree\n")
@@ -351,7 +1348,7 @@ def main():
     # Produce topology graph.
     if graph_suffix and dic_deps:
         names_all = []
-        for names in (tables, tables_rev, workflows, workflows_rev):
+        for names in (tables, tables_rev, workflows, workflows_rev, tables_changed):
             if names:
                 names_all += names
         names_all = list(dict.fromkeys(names_all))  # Remove duplicities
@@ -363,53 +1360,26 @@ def main():
         path_file_dot = basename + ".gv"
         path_file_graph = basename + "." + ext_graph
         print(f"\nMaking dot file in: {path_file_dot}")
-        dot = "digraph {\n"
-        dot += "  node [shape=box, fontname=Courier, fontsize=20]\n"
-        dot += "  ranksep=2 // vertical node separation\n"
-        # dot += "  edge [dir=back] // inverted arrow direction\n"
-        # dot += "  rankdir=BT // bottom to top drawing\n"
-        # lines with dependencies
-        dot_deps = ""
-        # subgraph for tables
-        dot_tables = "  subgraph tables {\n"
-        dot_tables += "    node [fillcolor=lightgrey,style=filled]\n"
-        list_tables = []
-        # subgraph for workflows
-        dot_workflows = "  subgraph workflows {\n"
-        dot_workflows += '    node [fillcolor=papayawhip,style="filled,rounded"]\n'
-        for wf in dic_deps:
-            # Hyphens are not allowed in node names.
-            node_wf = wf.replace("-", "_")
-            # Remove the workflow prefix.
-            # label_wf = wf.replace("o2-analysis-", "")
-            label_wf = wf
-            # Replace hyphens with line breaks to save horizontal space.
-            # label_wf = label_wf.replace("-", "\\n")
-            dot_workflows += f'    {node_wf} [label="{label_wf}"]\n'
-            inputs = get_workflow_inputs(wf, dic_deps)
-            outputs = get_workflow_outputs(wf, dic_deps)
-            list_tables += inputs + outputs
-            nodes_in = " ".join(inputs)
-            nodes_out = " ".join(outputs)
-            dot_deps += f"  {{{nodes_in}}} -> {node_wf} -> {{{nodes_out}}}\n"
-        list_tables = list(dict.fromkeys(list_tables))  # Remove duplicities
-        for table in list_tables:
-            dot_tables += f"    {table}\n"
-        dot_tables += "  }\n"
-        dot_workflows += "  }\n"
-        dot += dot_workflows + dot_tables + dot_deps
-        dot += "}\n"
         try:
             with open(path_file_dot, "w", encoding="utf-8") as file_dot:
-                file_dot.write(dot)
+                file_dot.writelines(make_dot(dic_deps))
         except IOError:
             msg_fatal(f"Failed to open file {path_file_dot}")
-        cmd = f"dot -T{ext_graph} {path_file_dot} -o {path_file_graph}"
+        print(f"Making graph in: {path_file_graph}")
+        if ext_graph == "svg" and not args.graphviz:
+            try:
+                with open(path_file_graph, "w", encoding="utf-8") as file_graph:
+                    file_graph.writelines(make_svg(dic_deps))
+            except IOError:
+                msg_fatal(f"Failed to open file {path_file_graph}")
+            return
+        if not shutil.which("dot"):
+            msg_fatal("Graphviz (dot) is not available. Use -g svg to make the graph without it.")
+        cmd = ["dot", f"-T{ext_graph}", path_file_dot, "-o", path_file_graph]
         try:
-            print(f"Making graph in: {path_file_graph}")
-            sp.run(cmd, shell=True, check=True)  # nosec B602
+            sp.run(cmd, check=True)  # nosec B603 B607
         except sp.CalledProcessError:
-            msg_fatal(f"Failed to execute: {cmd}")
+            msg_fatal(f"Failed to execute: {' '.join(cmd)}")
 
 
 if __name__ == "__main__":
@@ -18,14 +18,36 @@
 """
 
 import argparse
+import ctypes
+import ctypes.util
+import difflib
+import hashlib
+import importlib.util
+import io
+import json
+import mmap
 import os
 import re
+import select
+import shutil
+import subprocess as sp  # nosec B404
 import sys
+import tempfile
+import time
+from array import array
+from bisect import bisect_right
+from collections.abc import Callable, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
 from enum import Enum
+from functools import lru_cache
+from importlib.metadata import entry_points
+from itertools import accumulate
 from pathlib import Path
-from typing import Union
+from typing import NamedTuple, Union
 
 github_mode = False  # GitHub mode
+output_format = "text"  # format of reported issues (text, json, sarif)
 prefix_disable = "o2-linter: disable="  # prefix for disabling tests
 file_config = "o2linter_config"  # name of the configuration file (applied per directory)
 # If this file exists in the path of the tested file,
@@ -163,6 +185,9 @@ def remove_comment_cpp(line: str) -> str:
     return line.strip()
 
 
+pattern_define = re.compile(r"((o2::)?framework::)?WorkflowSpec defineDataProcessing\(")  # workflow definition
+
+
 def block_ranges(line: str, char_open: str, char_close: str) -> "list[list[int]]":
     """Get list of index ranges of longest blocks opened with char_open and closed with char_close."""
     # print(f"Looking for {char_open}{char_close} blocks in \"{line}\".")
@@ -202,21 +227,273 @@ def block_ranges(line: str, char_open: str, char_close: str) -> "list[list[int]]
     return list_ranges
 
 
+def get_line_at_position(offsets: "tuple[tuple[int, int], ...]", position: int) -> int:
+    """Get the number of the line with a given position in a text joined from lines."""
+    return offsets[max(bisect_right(offsets, (position, sys.maxsize)) - 1, 0)][1]
+
+
+class CodeBlock(NamedTuple):
+    """Block of C++ code enclosed in braces"""
+
+    header: str  # code between the end of the previous statement and the opening brace
+    line_header: int  # number of the first line of the header
+    line_open: int  # number of the line with the opening brace
+    line_close: int  # number of the line with the closing brace
+    depth: int  # number of enclosing blocks
+    offsets: "tuple[tuple[int, int], ...]"  # positions in the header where lines start (position, line number)
+
+    def get_line(self, position: int) -> int:
+        """Get the number of the line with a given position in the header."""
+        return get_line_at_position(self.offsets, position)
+
+
+class CodeFunction(NamedTuple):
+    """Definition of a C++ function"""
+
+    name: str  # function name (without the class prefix)
+    line: int  # number of the line with the function name
+    arguments: str  # text between the parentheses of the argument list
+    line_arguments_end: int  # number of the line with the closing parenthesis of the argument list
+    block: CodeBlock  # function body
+
+
+class CodeIndex:
+    """Lightweight tokenizer and index of the brace structure of a C++ file.
+
+    Comments and preprocessor directives are replaced with spaces. Braces, parentheses and semicolons in strings,
+    character literals, comments and preprocessor directives are ignored.
+    Provides blocks, function definitions and struct definitions, including constructs spread over multiple lines.
+    """
+
+    # preprocessor directives, comments, raw strings, string and character literals (not digit separators), braces
+    pattern_token = re.compile(
+        r"(?=[#/R\"'{}])(?:#(?:.*\\\n)*.*|//.*|/\*[\s\S]*?(?:\*/|\Z)|R\"([^()\\\s]{0,16})\([\s\S]*?(?:\)\1\"|\Z)"
+        r"|\"[^\"\\\n]*(?:\\.[^\"\\\n]*)*\"|(?<!\w)'[^'\\\n]*(?:\\.[^'\\\n]*)*'|[{}])"
+    )
+    pattern_literal = re.compile(r"\"[^\"\\\n]*(?:\\.[^\"\\\n]*)*\"|(?<!\w)'[^'\\\n]*(?:\\.[^'\\\n]*)*'")
+    pattern_parenthesis = re.compile(r"\"[^\"\\]*(?:\\.[^\"\\]*)*\"|[()]")  # parentheses outside strings
+    pattern_function = re.compile(r"(\w+) ?\(")
+    pattern_struct = re.compile(r"(template ?<.*> )?(struct|class) (\w+)")
+    keywords_control = ("if", "for", "while", "switch", "catch", "return", "decltype", "sizeof", "alignof", "noexcept")
+
+    def __init__(self, content: "list[str]") -> None:
+        self.code: list[str] = []  # lines with comments and preprocessor directives replaced with spaces
+        self.depths: list[int] = []  # numbers of enclosing blocks at the beginning of each line
+        self.blocks: list[CodeBlock] = []  # blocks ordered by the position of the opening brace
+        self._functions: Union[list[CodeFunction], None] = None
+        self._tokenize(content)
+
+    def _tokenize(self, content: "list[str]"):
+        """Find comments, strings and blocks."""
+        content = [line.rstrip("\r\n") for line in content]
+        text = "\n".join(content)
+        parts: list[str] = []  # pieces of code with comments replaced
+        braces: list[tuple[int, int]] = []  # positions of braces (position, +1 opening/-1 closing)
+        pos_code = 0  # end of the code already copied to parts
+        for match in self.pattern_token.finditer(text):
+            token = match.group()
+            if token == "{":
+                braces.append((match.start(), 1))
+            elif token == "}":
+                braces.append((match.start(), -1))
+            elif token[0] in "#/":
+                if token[0] == "#" and text[text.rfind("\n", 0, match.start()) + 1 : match.start()].strip():
+                    continue  # not a directive
+                # Replace with spaces and keep line breaks.
+                parts.append(text[pos_code : match.start()])
+                parts.append("\n".join(" " * len(part) for part in token.split("\n")))
+                pos_code = match.end()
+        parts.append(text[pos_code:])
+        code = "".join(parts)
+        self.code = [line.rstrip() for line in code.split("\n")]
+        # Get line numbers and depths.
+        starts_line = [0]  # positions where lines start
+        for line in content[:-1]:
+            starts_line.append(starts_line[-1] + len(line) + 1)
+        changes_depth = [0] * (len(content) + 1)  # changes of depth after each line
+        stack: list[int] = []  # positions of opened braces
+        blocks: list[tuple[int, int, int]] = []  # (open, close, depth)
+        for pos, kind in braces:
+            if kind > 0:
+                stack.append(pos)
+            elif stack:
+                blocks.append((stack.pop(), pos, len(stack)))
+            else:
+                continue  # unmatched closing brace
+            changes_depth[bisect_right(starts_line, pos)] += kind
+        while stack:  # Close blocks left opened.
+            blocks.append((stack.pop(), len(text), len(stack)))
+        self.depths = list(accumulate(changes_depth[:-1]))
+        positions_braces = [pos for pos, _ in braces]
+        for pos_open, pos_close, depth in sorted(blocks):
+            line_open = bisect_right(starts_line, pos_open)
+            line_close = bisect_right(starts_line, pos_close)
+            pos_last = pos_open - 1  # last character before the brace
+            while pos_last > 0 and code[pos_last].isspace():
+                pos_last -= 1
+            if pos_last < 0 or code[pos_last] in "{}[(,=;":  # Skip headers of initializer lists and empty headers.
+                self.blocks.append(CodeBlock("", line_open, line_open, line_close, depth, ()))
+                continue
+            # The header starts after the end of the previous statement or block.
+            i_previous = bisect_right(positions_braces, pos_open - 1) - 1
+            pos_start = positions_braces[i_previous] + 1 if i_previous > -1 else 0
+            pos_start = self.get_start_statement(code, pos_start, pos_open)
+            line_start = bisect_right(starts_line, pos_start)
+            col_start, col_open = pos_start - starts_line[line_start - 1], pos_open - starts_line[line_open - 1]
+            header, offsets = self.get_text((line_start, col_start), (line_open, col_open))
+            line_header = offsets[0][1] if offsets else line_open
+            self.blocks.append(CodeBlock(header, line_header, line_open, line_close, depth, offsets))
+
+    def get_start_statement(self, code: str, start: int, end: int) -> int:
+        """Get the position after the last semicolon outside parentheses and strings in a given range of the code."""
+        if (segment := code[start:end]).find(";") == -1:
+            return start
+        if '"' in segment or "'" in segment:
+            segment = self.pattern_literal.sub(lambda m: "_" * len(m.group()), segment)
+        pos = len(segment)
+        while (pos := segment.rfind(";", 0, pos)) > -1:
+            rest = segment[pos:]
+            if rest.count("(") >= rest.count(")"):
+                return start + pos + 1
+        return start
+
+    def get_text(self, start: "tuple[int, int]", end: "tuple[int, int]") -> "tuple[str, tuple[tuple[int, int], ...]]":
+        """Get the code between two positions (line, column) with stripped lines joined by spaces.
+
+        Returns the text and the positions in the text where lines start (position, line number).
+        """
+        parts: list[str] = []
+        offsets: list[tuple[int, int]] = []
+        position = 0
+        for n_line in range(start[0], end[0] + 1):
+            line = self.code[n_line - 1] if n_line <= len(self.code) else ""
+            col_start = start[1] if n_line == start[0] else 0
+            col_end = end[1] if n_line == end[0] else len(line)
+            part = line[col_start:col_end].strip()
+            if not part:
+                continue
+            if parts:
+                position += 1  # joining space
+            offsets.append((position, n_line))
+            parts.append(part)
+            position += len(part)
+        return " ".join(parts), tuple(offsets)
+
+    def get_closing_parenthesis(self, start: "tuple[int, int]") -> "Union[tuple[int, int], None]":
+        """Get the position (line, column) of the parenthesis closing the one at a given position (line, column)."""
+        level = 0
+        for n_line in range(start[0], len(self.code) + 1):
+            col_start = start[1] if n_line == start[0] else 0
+            for match in self.pattern_parenthesis.finditer(self.code[n_line - 1], col_start):
+                if match.group() == "(":
+                    level += 1
+                elif match.group() == ")":
+                    level -= 1
+                    if not level:
+                        return n_line, match.start()
+        return None
+
+    def get_functions(self, name="") -> "list[CodeFunction]":
+        """Get definitions of functions, optionally only those with a given name."""
+        if self._functions is None:
+            self._functions = []
+            for block in self.blocks:
+                header = block.header
+                if not (match := self.pattern_function.search(header)) or match.group(1) in self.keywords_control:
+                    continue
+                # Find the closing parenthesis of the argument list.
+                level = 0
+                for pos in range(match.end() - 1, len(header)):
+                    if header[pos] == "(":
+                        level += 1
+                    elif header[pos] == ")":
+                        level -= 1
+                        if not level:
+                            arguments = " ".join(header[match.end() : pos].split())
+                            line, line_end = block.get_line(match.start()), block.get_line(pos)
+                            self._functions.append(CodeFunction(match.group(1), line, arguments, line_end, block))
+                            break
+        return [f for f in self._functions if not name or f.name == name]
+
+    def get_structs(self) -> "list[tuple[str, CodeBlock]]":
+        """Get definitions of structs and classes (name, body)."""
+        structs = []
+        for block in self.blocks:
+            if match := self.pattern_struct.match(block.header):
+                structs.append((match.group(3), block))
+        return structs
+
+
+code_index_cache: "list" = [None, None]  # last indexed content and its index
+
+
+def get_code_index(content: "list[str]") -> CodeIndex:
+    """Get the index of the code of a file. The index is built only once for the same content."""
+    if code_index_cache[0] is not content:
+        code_index_cache[:] = [content, CodeIndex(content)]
+    return code_index_cache[1]
+
+
+def get_blocks_define(content: "list[str]") -> "list[CodeBlock]":
+    """Get bodies of the workflow definition functions defineDataProcessing."""
+    index = get_code_index(content)
+    functions = index.get_functions("defineDataProcessing")
+    return [f.block for f in functions if pattern_define.match(index.code[f.line - 1])]
+
+
+@lru_cache(maxsize=None)
+def find_config(directory: Path) -> "tuple[Union[Path, None], tuple[str, ...]]":
+    """Find the configuration file applicable to a directory and get the list of tolerated tests from it.
+
+    Starts in the directory and iterates through parents.
+    Results are cached for each directory so that each configuration file is read only once.
+    """
+    path_tests = directory / file_config
+    if path_tests.is_file():
+        with path_tests.open() as content:
+            return path_tests, tuple(line.strip() for line in content.readlines() if line.strip())
+    if directory.parent == directory:
+        return None, ()
+    return find_config(directory.parent)
+
+
+@lru_cache(maxsize=None)
+def find_config_path(directory: str) -> "tuple[Union[Path, None], tuple[str, ...]]":
+    """Find the configuration file applicable to a (not resolved) directory path."""
+    return find_config(Path(directory).resolve())
+
+
 def get_tolerated_tests(path: str) -> "list[str]":
     """Get the list of tolerated tests.
 
     Looks for the configuration file.
     Starts in the test file directory and iterates through parents.
     """
-    tests: list[str] = []
-    for directory in Path(path).resolve().parents:
-        path_tests = directory / file_config
-        if path_tests.is_file():
-            with path_tests.open() as content:
-                tests = [line.strip() for line in content.readlines() if line.strip()]
-                print(f"{path}:1: info: Tolerating tests from {path_tests}. {tests}")
-            break
-    return tests
+    path_tests, tests = find_config_path(os.path.dirname(path))
+    if path_tests:
+        print(f"{path}:1: info: Tolerating tests from {path_tests}. {list(tests)}")
+    return list(tests)
+
+
+pattern_disable_reason = re.compile(r" \([\w\s]{3,}\)")  # comment with a reason for disabling
+
+
+def get_disable_comment(line: str, prefix_comment="//") -> "Union[str, None]":
+    """Get the part of a line following the prefix for disabling tests, or None if there is none."""
+    for prefix in [prefix_comment, prefix_disable]:
+        if prefix not in line:
+            return None
+        line = line[(line.index(prefix) + len(prefix)) :]  # Strip away part before prefix.
+    return line
+
+
+class Fix(NamedTuple):
+    """Replacement of a part of a line fixing an issue"""
+
+    start: int  # index of the first replaced character
+    end: int  # index after the last replaced character (same as start for insertions)
+    text: str  # replacement
+    include: str = ""  # header needed by the replacement (with delimiters)
 
 
 class TestSpec:
@@ -229,82 +506,236 @@ class TestSpec:
     severity_default: Severity = Severity.DEFAULT
     severity_current: Severity = Severity.DEFAULT
     suffixes: "list[str]" = []  # suffixes of files to test
+    paths_required: "list[str]" = []  # Test only files in directories with paths containing all of these strings.
+    paths_excluded: "list[str]" = []  # Do not test files in directories with paths containing any of these strings.
     per_line: bool = True  # Test lines separately one by one.
+    keep_indentation: bool = False  # Test lines without stripping the leading whitespace. (per-line tests)
+    strip_comments: bool = False  # Test lines with comments removed. (per-line tests)
+    literals: "tuple[str, ...]" = ()  # Test only lines containing any of these strings. (per-line tests)
+    fixable: bool = False  # Issues can be fixed automatically with get_fixes. (per-line tests)
+    cross_file: bool = False  # Test uses entities declared in other files from the repository symbol index.
+    entities: str = ""  # Test only lines declaring these entities in the symbol index, if indexed. (per-line tests)
+    opt_in: bool = False  # Test is enabled only if selected by its name or with "all".
     tolerated: bool = False  # flag for tolerating issues
     n_issues: int = 0  # issue counter
     n_disabled: int = 0  # counter of disabled issues
     n_tolerated: int = 0  # counter of tolerated issues
+    n_baseline: int = 0  # counter of known issues from the baseline
+    n_printed: int = 0  # counter of printed messages
+    content: "Sequence[str]" = ()  # content of the tested file (for fingerprints of issues)
+    occurrences: "dict[str, int]" = {}  # numbers of occurrences of issue keys in the tested file
+    time_wall: float = 0.0  # profiling: wall time spent in the test [s]
+    time_cpu: float = 0.0  # profiling: CPU time spent in the test [s]
+    n_lines_inspected: int = 0  # profiling: number of inspected lines
 
     def file_matches(self, path: str) -> bool:
-        """Test whether the path matches the pattern for files to test."""
-        return path.endswith(tuple(self.suffixes)) if self.suffixes else True
+        """Test whether the path matches the pattern for files to test.
+
+        Tests overriding this method are selected by calling it for each file (see PathMatcher).
+        """
+        if self.suffixes and not path.endswith(tuple(self.suffixes)):
+            return False
+        return all(part in path for part in self.paths_required) and not any(
+            part in path for part in self.paths_excluded
+        )
+
+    def get_directory_pattern(self) -> str:
+        """Get the regular expression matching directory paths (ending with "/") of files to test."""
+        required = "".join(f"(?=.*{re.escape(part)})" for part in self.paths_required)
+        excluded = "".join(f"(?!.*{re.escape(part)})" for part in self.paths_excluded)
+        return f"^{required}{excluded}"
 
     def is_disabled(self, line: str, prefix_comment="//") -> bool:
         """Detect whether the test is explicitly disabled."""
-        for prefix in [prefix_comment, prefix_disable]:
-            if prefix not in line:
-                return False
-            line = line[(line.index(prefix) + len(prefix)) :]  # Strip away part before prefix.
+        if (line := get_disable_comment(line, prefix_comment)) is None:
+            return False
         if self.name in line:
             self.n_disabled += 1
             # Look for a comment with a reason for disabling.
-            if re.search(r" \([\w\s]{3,}\)", line):
+            if pattern_disable_reason.search(line):
                 return True
         return False
 
-    def print_error(self, path: str, line: Union[int, None], message: str):
-        """Format and print error message."""
+    def get_fingerprint(self, path: str, line: Union[int, None], message: str) -> str:
+        """Get the fingerprint of an issue, independent of the line number.
+
+        The fingerprint is made of the test name, the path, the content of the line (with normalised whitespace),
+        the message (without line numbers of references) and the occurrence of these in the file.
+        Issues of file-level tests are not tied to the content of a line (e.g. reported at a fixed line number),
+        so the content of the line is used only for per-line tests.
+        """
+        text = ""
+        if self.per_line and line and line <= len(self.content):
+            text = " ".join(self.content[line - 1].split())
+        key = "\0".join((self.name, os.path.normpath(path), text, re.sub(r":\d+\b", ":", message)))
+        self.occurrences[key] = self.occurrences.get(key, 0) + 1
+        return hashlib.sha256(f"{key}\0{self.occurrences[key]}".encode()).hexdigest()[:16]
+
+    def print_error(self, path: str, line: Union[int, None], message: str) -> bool:
+        """Format and print error message. Return False for known issues from the baseline."""
         # return # Use to suppress error messages.
+        if baseline is not None or record_baseline:
+            fingerprint = self.get_fingerprint(path, line, message)
+            if record_baseline:
+                fingerprints.append(fingerprint)
+            elif baseline is not None and fingerprint in baseline:
+                return False
+        self.n_printed += 1
         line = line or 1
+        if output_format != "text":
+            # machine-readable record, reported by the main process
+            issue_records.append(
+                {
+                    "type": "issue",
+                    "test": self.name,
+                    "severity": message_levels[self.severity_current],
+                    "path": path,
+                    "line": line,
+                    "message": message,
+                    "tolerated": self.tolerated,
+                }
+            )
+            return True
         # terminal format
         print(f"{path}:{line}: {message_levels[self.severity_current]}: {message} [{self.name}]")
         if github_mode and not self.tolerated:  # Annotate only not tolerated issues.
             # GitHub annotation format
             print(f"::{message_levels[self.severity_current]} file={path},line={line},title=[{self.name}]::{message}")
+        return True
+
+    def report_issue(self, path: str, line: Union[int, None]) -> bool:
+        """Count an issue and print the error message. Return False for known issues from the baseline."""
+        if not self.print_error(path, line, self.message):
+            self.n_baseline += 1
+            return False
+        self.count_issue()
+        return True
+
+    def count_issue(self):
+        """Count an issue."""
+        if self.tolerated:
+            self.n_tolerated += 1
+        else:
+            self.n_issues += 1
 
     def test_line(self, line: str) -> bool:
-        """Test a line."""
+        """Test a line. (Empty lines and comment lines are not tested.)"""
         raise NotImplementedError()
 
     def test_file(self, path: str, content) -> bool:
         """Test a file in a way that cannot be done line by line."""
         raise NotImplementedError()
 
+    def get_fixes(self, line: str) -> "list[Fix]":
+        """Get replacements fixing issues in a line with an issue. (The line is passed without the comment.)"""
+        return []
+
     def run(self, path: str, content: "list[str]") -> bool:
         """Run the test."""
         # print(content)
         passed = True
         self.severity_current = Severity.WARNING if self.tolerated else self.severity_default
-        if not self.file_matches(path):
-            return passed
         # print(f"Running test {self.name} for {path} with {len(content)} lines")
         if self.per_line:
-            for i, line in enumerate(content):
-                if not isinstance(self, TestUsingDirective):  # Keep the indentation if needed.
-                    line = line.strip()
-                if not line:
-                    continue
-                # print(i + 1, line)
-                if self.is_disabled(line):
-                    continue
-                if not self.test_line(line):
+            for line in test_lines(content, [self])[0]:
+                if self.report_issue(path, line):
                     passed = False
-                    if self.tolerated:
-                        self.n_tolerated += 1
-                    else:
-                        self.n_issues += 1
-                    self.print_error(path, i + 1, self.message)
         else:
+            n_printed = self.n_printed
             passed = self.test_file(path, content)
             if not passed:
-                if self.tolerated:
-                    self.n_tolerated += 1
+                # The issue is known from the baseline only if all messages of the test are known.
+                if not self.print_error(path, None, self.message) and self.n_printed == n_printed:
+                    self.n_baseline += 1
+                    passed = True
                 else:
-                    self.n_issues += 1
-                self.print_error(path, None, self.message)
+                    self.count_issue()
         return passed or self.tolerated
 
 
+def test_lines(
+    content: "list[str]", tests: "list[TestSpec]", lines_selected: "Union[set[int], None]" = None
+) -> "list[list[int]]":
+    """Run per-line tests in a single pass over the lines.
+
+    Each line is preprocessed only once (stripping, detection of comments and of disabled tests,
+    removal of comments) and dispatched to all tests.
+    If a set of line numbers is provided, only these lines are tested.
+    Returns the numbers of lines with issues for each test.
+    """
+    lines_bad: list[list[int]] = [[] for _ in tests]
+    tests_lines_bad = list(zip(tests, lines_bad))
+    strip_comments = any(test.strip_comments for test in tests)
+    if lines_selected is None:
+        indices: "Union[range, list[int]]" = range(len(content))
+    else:
+        indices = sorted(n - 1 for n in lines_selected if 0 < n <= len(content))
+    for i in indices:
+        line = content[i]
+        line_stripped = line.strip()
+        if not line_stripped:
+            continue
+        is_comment = line_stripped.startswith(("//", "/*"))
+        disabled = get_disable_comment(line_stripped)
+        if disabled is not None:
+            has_reason = pattern_disable_reason.search(disabled) is not None
+            tests_line = []
+            for test, lines_bad_test in tests_lines_bad:
+                if test.name in disabled:
+                    test.n_disabled += 1
+                    if has_reason:
+                        continue
+                tests_line.append((test, lines_bad_test))
+        else:
+            tests_line = tests_lines_bad
+        if is_comment:
+            continue
+        line_code = remove_comment_cpp(line_stripped) if strip_comments else ""
+        for test, lines_bad_test in tests_line:
+            if test.strip_comments:
+                line_test = line_code
+            elif test.keep_indentation:
+                line_test = line
+            else:
+                line_test = line_stripped
+            # Skip the test if the line does not contain any of the required strings.
+            if test.literals:
+                for literal in test.literals:
+                    if literal in line_test:
+                        break
+                else:
+                    continue
+            if not test.test_line(line_test):
+                lines_bad_test.append(i + 1)
+    return lines_bad
+
+
+def profile_test(test: TestSpec):
+    """Measure the time spent in the test and count inspected lines."""
+    test_line, test_file = test.test_line, test.test_file
+
+    def test_line_profiled(line: str) -> bool:
+        time_wall, time_cpu = time.perf_counter(), time.process_time()
+        result = test_line(line)
+        test.time_wall += time.perf_counter() - time_wall
+        test.time_cpu += time.process_time() - time_cpu
+        test.n_lines_inspected += 1
+        return result
+
+    def test_file_profiled(path: str, content) -> bool:
+        time_wall, time_cpu = time.perf_counter(), time.process_time()
+        result = test_file(path, content)
+        test.time_wall += time.perf_counter() - time_wall
+        test.time_cpu += time.process_time() - time_cpu
+        test.n_lines_inspected += len(content)
+        return result
+
+    if test.per_line:
+        test.test_line = test_line_profiled  # type: ignore[method-assign]
+    else:
+        test.test_file = test_file_profiled  # type: ignore[method-assign]
+
+
 ##########################
 # Implementations of tests
 ##########################
@@ -321,9 +752,9 @@ class TestIoStream(TestSpec):
     references = [Reference.LLVM, Reference.LINTER_1]
     suffixes = [".h", ".cxx"]
 
+    literals = ("#include <iostream>",)
+
     def test_line(self, line: str) -> bool:
-        if is_comment_cpp(line):
-            return True
         return not line.startswith("#include <iostream>")
 
 
@@ -335,10 +766,9 @@ class TestUsingStd(TestSpec):
     rationale = "Code safety. Avoid namespace pollution with common names."
     references = [Reference.LINTER_1]
     suffixes = [".h"]
+    literals = ("using std::",)
 
     def test_line(self, line: str) -> bool:
-        if is_comment_cpp(line):
-            return True
         return not line.startswith("using std::")
 
 
@@ -350,10 +780,10 @@ class TestUsingDirective(TestSpec):
     rationale = "Code safety. Avoid namespace pollution."
     references = [Reference.O2, Reference.ISO_CPP, Reference.LLVM, Reference.GOOGLE, Reference.LINTER_1]
     suffixes = [".h"]
+    keep_indentation = True
+    literals = ("using namespace",)
 
     def test_line(self, line: str) -> bool:
-        if is_comment_cpp(line):
-            return True
         return not line.startswith("using namespace")
 
 
@@ -365,6 +795,9 @@ class TestStdPrefix(TestSpec):
     rationale = "Code clarity, safety and portability. Avoid ambiguity (e.g. abs)."
     references = [Reference.LLVM, Reference.LINTER_1]
     suffixes = [".h", ".cxx", ".C"]
+    strip_comments = True
+    literals = ("(", "<", "{")
+    fixable = True
     prefix_bad = r"[^\w:\.\"]"
     patterns = [
         r"vector<",
@@ -381,13 +814,18 @@ class TestStdPrefix(TestSpec):
         r"erfc?\(",
         r"hypot\(",
     ]
+    includes = {"vector": "<vector>", "array": "<array>", "min": "<algorithm>", "max": "<algorithm>"}  # default: cmath
+    keywords = ("return", "else", "case", "throw")  # keywords which can precede a function call
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.patterns_bad = [re.compile(rf"{self.prefix_bad}{pattern}") for pattern in self.patterns]
+        # Matches of names not consuming the preceding character, so that nested names (vector<vector<) are found.
+        self.patterns_fix = [re.compile(rf"(?<={self.prefix_bad}){pattern}") for pattern in self.patterns]
 
     def test_line(self, line: str) -> bool:
-        if is_comment_cpp(line):
-            return True
-        line = remove_comment_cpp(line)
-        for pattern in self.patterns:
-            iterators = re.finditer(rf"{self.prefix_bad}{pattern}", line)
+        for pattern in self.patterns_bad:
+            iterators = pattern.finditer(line)
             matches = [(it.start(), it.group()) for it in iterators]
             if not matches:
                 continue
@@ -400,6 +838,26 @@ class TestStdPrefix(TestSpec):
                     return False
         return True
 
+    def get_fixes(self, line: str) -> "list[Fix]":
+        fixes = []
+        for pattern in self.patterns_fix:
+            for match in pattern.finditer(line):
+                start = match.start()
+                before = line[:start].rstrip()
+                if before.endswith("->"):  # member access
+                    continue
+                # Skip declarations of functions with the same name (preceded by a type).
+                if (
+                    match.group().endswith("(")
+                    and before
+                    and (before[-1].isalnum() or before[-1] in "_*&>")
+                    and not before.endswith(self.keywords)
+                ):
+                    continue
+                name = match.group().rstrip("<{(")
+                fixes.append(Fix(start, start, "std::", self.includes.get(name, "<cmath>")))
+        return fixes
+
 
 class TestRootEntity(TestSpec):
     """Detect unnecessary use of ROOT entities."""
@@ -409,19 +867,48 @@ class TestRootEntity(TestSpec):
     rationale = "Code simplicity and maintainability. O2 is not a ROOT code."
     references = [Reference.ISO_CPP, Reference.LINTER_1, Reference.PY_ZEN]
     suffixes = [".h", ".cxx"]
-
-    def file_matches(self, path: str) -> bool:
-        return super().file_matches(path) and "Macros/" not in path
+    paths_excluded = ["Macros/"]
+    strip_comments = True
+    literals = ("TMath::", "_t")
+    fixable = True
+    pattern = re.compile(
+        r"TMath::(Abs|Sqrt|Power|Min|Max|Log(2|10)?|Exp|A?(Sin|Cos|Tan)H?|ATan2|Erfc?|Hypot)\(|"
+        r"(U?(Int|Char|Short)|Double(32)?|Float(16)?|U?Long(64)?|Bool)_t"
+    )
+    # Min and Max accept mixed argument types, Double32_t and Float16_t have a special meaning in ROOT I/O.
+    pattern_fix = re.compile(
+        r"TMath::(?P<function>Abs|Sqrt|Power|Log(2|10)?|Exp|A?(Sin|Cos|Tan)H?|ATan2|Erfc?|Hypot)\(|"
+        r"\b(?P<type>U?(Int|Char|Short)|Double|Float|U?Long(64)?|Bool)_t\b"
+    )
+    types = {
+        "Int": "int",
+        "UInt": "unsigned int",
+        "Char": "char",
+        "UChar": "unsigned char",
+        "Short": "short",
+        "UShort": "unsigned short",
+        "Double": "double",
+        "Float": "float",
+        "Long": "long",
+        "ULong": "unsigned long",
+        "Long64": "int64_t",
+        "ULong64": "uint64_t",
+        "Bool": "bool",
+    }
 
     def test_line(self, line: str) -> bool:
-        pattern = (
-            r"TMath::(Abs|Sqrt|Power|Min|Max|Log(2|10)?|Exp|A?(Sin|Cos|Tan)H?|ATan2|Erfc?|Hypot)\(|"
-            r"(U?(Int|Char|Short)|Double(32)?|Float(16)?|U?Long(64)?|Bool)_t"
-        )
-        if is_comment_cpp(line):
-            return True
-        line = remove_comment_cpp(line)
-        return re.search(pattern, line) is None
+        return self.pattern.search(line) is None
+
+    def get_fixes(self, line: str) -> "list[Fix]":
+        fixes = []
+        for match in self.pattern_fix.finditer(line):
+            if function := match.group("function"):
+                name = "pow" if function == "Power" else function.lower()
+                fixes.append(Fix(match.start(), match.end() - 1, f"std::{name}", "<cmath>"))
+            else:
+                name = self.types[match.group("type")]
+                fixes.append(Fix(match.start(), match.end(), name, "<cstdint>" if "int64" in name else ""))
+        return fixes
 
 
 class TestRootLorentzVector(TestSpec):
@@ -435,11 +922,9 @@ class TestRootLorentzVector(TestSpec):
     rationale = "Performance. Use up-to-date tools."
     references = [Reference.LINTER_2]
     suffixes = [".h", ".cxx"]
+    strip_comments = True
 
     def test_line(self, line: str) -> bool:
-        if is_comment_cpp(line):
-            return True
-        line = remove_comment_cpp(line)
         return "TLorentzVector" not in line
 
 
@@ -451,16 +936,26 @@ class TestPi(TestSpec):
     rationale = "Code maintainability."
     references = [Reference.LINTER_1, Reference.PY_ZEN]
     suffixes = [".h", ".cxx"]
-
-    def file_matches(self, path: str) -> bool:
-        return super().file_matches(path) and "Macros/" not in path
+    paths_excluded = ["Macros/"]
+    strip_comments = True
+    literals = ("M_PI", "TMath::")
+    fixable = True
+    pattern = re.compile(r"[^\w]M_PI|TMath::(Two)?Pi")
+    pattern_fix = re.compile(r"(?<!\w)M_PI\b|TMath::(Two)?Pi\(\)")
 
     def test_line(self, line: str) -> bool:
-        pattern = r"[^\w]M_PI|TMath::(Two)?Pi"
-        if is_comment_cpp(line):
-            return True
-        line = remove_comment_cpp(line)
-        return re.search(pattern, line) is None
+        return self.pattern.search(line) is None
+
+    def get_fixes(self, line: str) -> "list[Fix]":
+        return [
+            Fix(
+                match.start(),
+                match.end(),
+                f"o2::constants::math::{'TwoPI' if match.group(1) else 'PI'}",
+                "<CommonConstants/MathConstants.h>",
+            )
+            for match in self.pattern_fix.finditer(line)
+        ]
 
 
 class TestTwoPiAddSubtract(TestSpec):
@@ -471,17 +966,31 @@ class TestTwoPiAddSubtract(TestSpec):
     rationale = "Code maintainability and safety. Use existing tools."
     references = [Reference.ISO_CPP, Reference.LINTER_1, Reference.PY_ZEN]
     suffixes = [".h", ".cxx"]
+    strip_comments = True
+    literals = ("PI", "Pi")
+    pattern_two_pi = (
+        r"(2(\.0*f?)? \* (M_PI|TMath::Pi\(\)|(((o2::)?constants::)?math::)?PI)|"
+        r"(((o2::)?constants::)?math::)?TwoPI|TMath::TwoPi\(\))"
+    )
+    pattern = re.compile(rf"[\+-]=? {pattern_two_pi}")
+    fixable = True  # Only the 2 pi constant is fixed. Using RecoDecay::constrainAngle needs a manual change.
 
     def test_line(self, line: str) -> bool:
-        pattern_two_pi = (
-            r"(2(\.0*f?)? \* (M_PI|TMath::Pi\(\)|(((o2::)?constants::)?math::)?PI)|"
-            r"(((o2::)?constants::)?math::)?TwoPI|TMath::TwoPi\(\))"
-        )
-        pattern = rf"[\+-]=? {pattern_two_pi}"
-        if is_comment_cpp(line):
-            return True
-        line = remove_comment_cpp(line)
-        return re.search(pattern, line) is None
+        return self.pattern.search(line) is None
+
+    def get_fixes(self, line: str) -> "list[Fix]":
+        fixes = []
+        for match in self.pattern.finditer(line):
+            two_pi = match.group(1)
+            if two_pi.endswith("TwoPI") or line[match.end() : match.end() + 1].isidentifier():
+                continue
+            if two_pi.endswith("PI") and not two_pi.endswith("M_PI"):  # O2 constant: Keep the namespace qualification.
+                fixes.append(Fix(match.start(1), match.end(1), f"{two_pi[two_pi.index('* ') + 2 : -2]}TwoPI"))
+            else:
+                fixes.append(
+                    Fix(match.start(1), match.end(1), "o2::constants::math::TwoPI", "<CommonConstants/MathConstants.h>")
+                )
+        return fixes
 
 
 class TestPiMultipleFraction(TestSpec):
@@ -492,16 +1001,15 @@ class TestPiMultipleFraction(TestSpec):
     rationale = "Code maintainability."
     references = [Reference.LINTER_1, Reference.PY_ZEN]
     suffixes = [".h", ".cxx"]
+    strip_comments = True
+    literals = ("PI", "Pi")
+    pattern_pi = r"(M_PI|TMath::(Two)?Pi\(\)|(((o2::)?constants::)?math::)?(Two)?PI)"
+    pattern_multiple = r"(2(\.0*f?)?|0\.2?5f?) \* "  # * 2, 0.25, 0.5
+    pattern_fraction = r" / ((2|3|4)([ ,;\)]|\.0*f?))"  # / 2, 3, 4
+    pattern = re.compile(rf"{pattern_multiple}{pattern_pi}[^\w]|{pattern_pi}{pattern_fraction}")
 
     def test_line(self, line: str) -> bool:
-        pattern_pi = r"(M_PI|TMath::(Two)?Pi\(\)|(((o2::)?constants::)?math::)?(Two)?PI)"
-        pattern_multiple = r"(2(\.0*f?)?|0\.2?5f?) \* "  # * 2, 0.25, 0.5
-        pattern_fraction = r" / ((2|3|4)([ ,;\)]|\.0*f?))"  # / 2, 3, 4
-        pattern = rf"{pattern_multiple}{pattern_pi}[^\w]|{pattern_pi}{pattern_fraction}"
-        if is_comment_cpp(line):
-            return True
-        line = remove_comment_cpp(line)
-        return re.search(pattern, line) is None
+        return self.pattern.search(line) is None
 
 
 class TestPdgDatabase(TestSpec):
@@ -515,14 +1023,10 @@ class TestPdgDatabase(TestSpec):
     rationale = "Performance."
     references = [Reference.LINTER_1]
     suffixes = [".h", ".cxx"]
-
-    def file_matches(self, path: str) -> bool:
-        return super().file_matches(path) and "Macros/" not in path
+    paths_excluded = ["Macros/"]
+    strip_comments = True
 
     def test_line(self, line: str) -> bool:
-        if is_comment_cpp(line):
-            return True
-        line = remove_comment_cpp(line)
         return "TDatabasePDG" not in line
 
 
@@ -534,14 +1038,15 @@ class TestPdgExplicitCode(TestSpec):
     rationale = "Code comprehensibility, readability, maintainability and safety."
     references = [Reference.O2, Reference.ISO_CPP, Reference.LINTER_1]
     suffixes = [".h", ".cxx", ".C"]
+    strip_comments = True
+    literals = ("->", "=")
+    pattern_call = re.compile(r"->(GetParticle|Mass)\([+-]?[0-9]+\)")
+    pattern_comparison = re.compile(r"[Pp][Dd][Gg].* !?={1,2} [+-]?([0-9]+)")
 
     def test_line(self, line: str) -> bool:
-        if is_comment_cpp(line):
-            return True
-        line = remove_comment_cpp(line)
-        if re.search(r"->(GetParticle|Mass)\([+-]?[0-9]+\)", line):
+        if self.pattern_call.search(line):
             return False
-        match = re.search(r"[Pp][Dd][Gg].* !?={1,2} [+-]?([0-9]+)", line)
+        match = self.pattern_comparison.search(line)
         if match:
             code = match.group(1)
             if code not in ("0", "1", "999"):
@@ -557,12 +1062,15 @@ class TestPdgExplicitMass(TestSpec):
     rationale = "Code comprehensibility, readability, maintainability and safety."
     references = [Reference.O2, Reference.ISO_CPP, Reference.LINTER_2]
     suffixes = [".h", ".cxx"]
+    strip_comments = True
+    literals = ("0.", "1.", "2.", "3.")
     masses: "list[str]" = []  # list of mass values to detect
 
     def __init__(self) -> None:
         super().__init__()
 
         # List of masses of commonly used particles
+        self.masses = []  # Do not extend the class attribute shared by all instances.
         self.masses.append(r"0\.000511")  # e
         self.masses.append(r"0\.105")  # μ
         self.masses.append(r"0\.139")  # π+
@@ -574,12 +1082,10 @@ class TestPdgExplicitMass(TestSpec):
         self.masses.append(r"1\.864")  # D0
         self.masses.append(r"2\.286")  # Λc
         self.masses.append(r"3\.096")  # J/ψ
+        self.pattern = re.compile(rf"(^|\D)({'|'.join(self.masses)})")
 
     def test_line(self, line: str) -> bool:
-        if is_comment_cpp(line):
-            return True
-        line = remove_comment_cpp(line)
-        iterators = re.finditer(rf"(^|\D)({'|'.join(self.masses)})", line)
+        iterators = self.pattern.finditer(line)
         matches = [(it.start(), it.group(2)) for it in iterators]
         if not matches:
             return True
@@ -601,15 +1107,16 @@ class TestPdgKnownMass(TestSpec):
     rationale = "Performance."
     references = [Reference.LINTER_1]
     suffixes = [".h", ".cxx", ".C"]
+    strip_comments = True
+    literals = ("->Mass(",)
+    pattern_pdg_code = r"[+-]?(k[A-Z][a-zA-Z0-9]*|[0-9]+)"
+    pattern_particle = re.compile(rf"->GetParticle\({pattern_pdg_code}\)->Mass\(\)")
+    pattern_mass = re.compile(rf"->Mass\({pattern_pdg_code}\)")
 
     def test_line(self, line: str) -> bool:
-        if is_comment_cpp(line):
-            return True
-        line = remove_comment_cpp(line)
-        pattern_pdg_code = r"[+-]?(k[A-Z][a-zA-Z0-9]*|[0-9]+)"
-        if re.search(rf"->GetParticle\({pattern_pdg_code}\)->Mass\(\)", line):
+        if self.pattern_particle.search(line):
             return False
-        return not re.search(rf"->Mass\({pattern_pdg_code}\)", line)
+        return not self.pattern_mass.search(line)
 
 
 class TestLogging(TestSpec):
@@ -620,16 +1127,30 @@ class TestLogging(TestSpec):
     rationale = "Logs easy to read and process."
     references = [Reference.LINTER_1]
     suffixes = [".h", ".cxx"]
-
-    def file_matches(self, path: str) -> bool:
-        return super().file_matches(path) and "Macros/" not in path
+    paths_excluded = ["Macros/"]
+    strip_comments = True
+    literals = ("rintf(", "cout <")
+    fixable = True
+    pattern = re.compile(r"^([Pp]rintf\(|(std::)?cout <)")
+    # Only complete statements on a single line are fixed.
+    pattern_fix_cout = re.compile(r"(std::)?cout << (?P<message>[^;]*?)( << ((std::)?endl|\"\\n\"|'\\n'))?;")
+    pattern_fix_printf = re.compile(r"[Pp]rintf\((?P<arguments>.*)\);")
+    pattern_newline = re.compile(r'^("([^"\\]|\\.)*?)\\n"')  # line break at the end of the format string
 
     def test_line(self, line: str) -> bool:
-        pattern = r"^([Pp]rintf\(|(std::)?cout <)"
-        if is_comment_cpp(line):
-            return True
-        line = remove_comment_cpp(line)
-        return re.search(pattern, line) is None
+        return self.pattern.search(line) is None
+
+    def get_fixes(self, line: str) -> "list[Fix]":
+        statement = line.strip()
+        if match := self.pattern_fix_cout.fullmatch(statement):
+            statement_fixed = f"LOG(info) << {match.group('message')};"
+        elif match := self.pattern_fix_printf.fullmatch(statement):
+            arguments = self.pattern_newline.sub(r'\1"', match.group("arguments"), count=1)
+            statement_fixed = f"LOGF(info, {arguments});"
+        else:
+            return []
+        start = line.index(statement)
+        return [Fix(start, start + len(statement), statement_fixed, "<Framework/Logger.h>")]
 
 
 class TestConstRefInForLoop(TestSpec):
@@ -640,15 +1161,16 @@ class TestConstRefInForLoop(TestSpec):
     rationale = "Performance, code comprehensibility and safety."
     references = [Reference.O2, Reference.ISO_CPP, Reference.LLVM]
     suffixes = [".h", ".cxx", ".C"]
+    strip_comments = True
+    literals = ("for (",)
+    pattern_loop = re.compile(r"for \(.* :")
+    pattern_const_ref = re.compile(r"(\w const|const \w+)& ")
 
     def test_line(self, line: str) -> bool:
-        if is_comment_cpp(line):
-            return True
-        line = remove_comment_cpp(line)
-        if not re.match(r"for \(.* :", line):
+        if not self.pattern_loop.match(line):
             return True
         line = line[: line.index(" :")]  # keep only the iterator part
-        return re.search(r"(\w const|const \w+)& ", line) is not None
+        return self.pattern_const_ref.search(line) is not None
 
 
 class TestConstRefInSubscription(TestSpec):
@@ -662,12 +1184,11 @@ class TestConstRefInSubscription(TestSpec):
     references = [Reference.O2, Reference.ISO_CPP, Reference.LINTER_1]
     suffixes = [".cxx"]
     per_line = False
+    pattern_process = re.compile(r"void (process[\w]*)\(")
+    pattern_const_ref = re.compile(r"([\w>] const|const [\w<>:]+)&")
 
     def test_file(self, path: str, content) -> bool:
         passed = True
-        n_parens_opened = 0  # number of opened parentheses
-        arguments = ""  # process function arguments
-        line_process = 0  # line number of the process function
         # Find names of all top-level process functions.
         names_functions = ["process"]  # names of allowed process functions to test
         for i, line in enumerate(content):
@@ -688,43 +1209,27 @@ class TestConstRefInSubscription(TestSpec):
             names_functions.append(words[1][:-1])  # Remove the trailing comma.
             # self.print_error(path, i + 1, f"Got process function name {words[1][:-1]}.")
         # Test process functions.
-        for i, line in enumerate(content):
-            line = line.strip()
-            if is_comment_cpp(line):
+        index = get_code_index(content)
+        for function in index.get_functions():
+            if function.name not in names_functions:
                 continue
-            if self.is_disabled(line):
+            if not (line := index.code[function.line - 1].strip()).startswith("void process"):
                 continue
-            if "//" in line:  # Remove comment. (Ignore /* to avoid truncating at /*parameter*/.)
-                line = line[: line.index("//")]
-            if (match := re.match(r"void (process[\w]*)\(", line)) and match.group(1) in names_functions:
-                line_process = i + 1
-                i_closing = line.rfind(")")
-                i_start = line.index("(") + 1
-                i_end = i_closing if i_closing != -1 else len(line)
-                arguments = line[i_start:i_end]  # get arguments between parentheses
-                n_parens_opened = line.count("(") - line.count(")")
-            elif n_parens_opened > 0:
-                i_closing = line.rfind(")")
-                i_start = 0
-                i_end = i_closing if i_closing != -1 else len(line)
-                arguments += " " + line[i_start:i_end]  # get arguments between parentheses
-                n_parens_opened += line.count("(") - line.count(")")
-            if line_process > 0 and n_parens_opened == 0:
-                # Process arguments.
-                # Sanitise arguments with spaces between <>.
-                for start, end in block_ranges(arguments, "<", ">"):
-                    arg = arguments[start : (end + 1)]
-                    # print(f"Found argument \"{arg}\" in [{start}, {end}]")
-                    if ", " in arg:
-                        arguments = arguments.replace(arg, arg.replace(", ", "__"))
-                # Extract arguments.
-                words = arguments.split(", ")
-                # Test each argument.
-                for arg in words:
-                    if not re.search(r"([\w>] const|const [\w<>:]+)&", arg):
-                        passed = False
-                        self.print_error(path, i + 1, f"Argument {arg} is not const&.")
-                line_process = 0
+            if not self.pattern_process.match(line):
+                continue
+            if any(self.is_disabled(content[i]) for i in range(function.line - 1, function.line_arguments_end)):
+                continue
+            arguments = function.arguments
+            # Sanitise arguments with spaces between <>.
+            for start, end in block_ranges(arguments, "<", ">"):
+                arg = arguments[start : (end + 1)]
+                if ", " in arg:
+                    arguments = arguments.replace(arg, arg.replace(", ", "__"))
+            # Test each argument.
+            for arg in map(str.strip, arguments.split(", ")):
+                if not self.pattern_const_ref.search(arg):
+                    passed = False
+                    self.print_error(path, function.line_arguments_end, f"Argument {arg} is not const&.")
         return passed
 
 
@@ -742,28 +1247,11 @@ class TestWorkflowOptions(TestSpec):
     per_line = False
 
     def test_file(self, path: str, content) -> bool:
-        is_inside_define = False  # Are we inside defineDataProcessing?
-        for _i, line in enumerate(content):  # pylint: disable=unused-variable
-            if not line.strip():
-                continue
-            if self.is_disabled(line):
-                continue
-            if is_comment_cpp(line):
-                continue
-            line = remove_comment_cpp(line)
-            # Wait for defineDataProcessing.
-            if not is_inside_define:
-                if not re.match(r"((o2::)?framework::)?WorkflowSpec defineDataProcessing\(", line):
-                    continue
-                # print(f"{i + 1}: Entering define.")
-                is_inside_define = True
-            # Return at the end of defineDataProcessing.
-            if is_inside_define and line[0] == "}":
-                # print(f"{i + 1}: Exiting define.")
-                break
-            # Detect options.
-            if ".options()" in line:
-                return False
+        index = get_code_index(content)
+        for block in get_blocks_define(content):
+            for i in range(block.line_header - 1, block.line_close):
+                if ".options()" in index.code[i] and not self.is_disabled(content[i]):
+                    return False
         return True
 
 
@@ -775,16 +1263,15 @@ class TestMagicNumber(TestSpec):
     rationale = "Code comprehensibility, maintainability and safety."
     references = [Reference.O2, Reference.ISO_CPP, Reference.LINTER_2]
     suffixes = [".h", ".cxx", ".C"]
+    strip_comments = True
+    literals = ("<", ">", "=")
     pattern_compare = r"([<>]=?|[!=]=)"
     pattern_number = r"[\+-]?([\d\.]+(e[\+-]?\d+)?)f?"
+    pattern = re.compile(rf" {pattern_compare} {pattern_number}|\W{pattern_number} {pattern_compare} ")
+    pattern_allowed = re.compile(r"[01](\.0?)?$")
 
     def test_line(self, line: str) -> bool:
-        if is_comment_cpp(line):
-            return True
-        line = remove_comment_cpp(line)
-        iterators = re.finditer(
-            rf" {self.pattern_compare} {self.pattern_number}|\W{self.pattern_number} {self.pattern_compare} ", line
-        )
+        iterators = self.pattern.finditer(line)
         matches = [(it.start(), it.group(2), it.group(4)) for it in iterators]
         if not matches:
             return True
@@ -796,7 +1283,7 @@ class TestMagicNumber(TestSpec):
             # We are not inside a string and this match is valid.
             for match_n in (match[1], match[2]):
                 # Accept only 0 or 1 (int or float).
-                if (match_n is not None) and (re.match(r"[01](\.0?)?$", match_n) is None):
+                if (match_n is not None) and (self.pattern_allowed.match(match_n) is None):
                     return False
         return True
 
@@ -824,6 +1311,8 @@ class TestDocumentationFile(TestSpec):
         doc_prefix = "///"
         n_lines_copyright = 11
         last_doc_line = n_lines_copyright
+        for item in doc_items:
+            item["regex"] = re.compile(rf"^{doc_prefix} [\\@]{item['keyword']} +{item['pattern']}")
 
         for i, line in enumerate(content):
             if i < n_lines_copyright:  # Skip copyright lines.
@@ -833,7 +1322,7 @@ class TestDocumentationFile(TestSpec):
             if line.startswith(doc_prefix):
                 last_doc_line = i + 1
             for item in doc_items:
-                if re.search(rf"^{doc_prefix} [\\@]{item['keyword']} +{item['pattern']}", line):
+                if item["regex"].search(line):
                     item["found"] = True
                     # self.print_error(path, i + 1, f"Found \{item['keyword']}.")
                     break
@@ -874,8 +1363,6 @@ class TestNameFunctionVariable(TestSpec):
     suffixes = [".h", ".cxx", ".C"]
 
     def test_line(self, line: str) -> bool:
-        if is_comment_cpp(line):
-            return True
         # Look for declarations of functions and variables.
 
         # Strip away irrelevant remainders of the line after the object name.
@@ -966,10 +1453,9 @@ class TestNameMacro(TestSpec):
     rationale = rationale_names
     references = references_names
     suffixes = [".h", ".cxx", ".C"]
+    literals = ("#define ",)
 
     def test_line(self, line: str) -> bool:
-        if is_comment_cpp(line):
-            return True
         if not line.startswith("#define "):
             return True
         # Extract macro name.
@@ -994,6 +1480,8 @@ class TestNameConstant(TestSpec):
     rationale = rationale_names
     references = references_names
     suffixes = [".h", ".cxx", ".C"]
+    strip_comments = True
+    literals = ("constexpr ",)
 
     def __init__(self) -> None:
         super().__init__()
@@ -1006,9 +1494,6 @@ class TestNameConstant(TestSpec):
         self.pattern = re.compile(rf"{keyword}?constexpr {type_val}?{prefix}*{name_val}{array}?{assignment}")
 
     def test_line(self, line: str) -> bool:
-        if is_comment_cpp(line):
-            return True
-        line = remove_comment_cpp(line)
         if not (match := self.pattern.match(line)):
             return True
         constant_name = match.group(4)
@@ -1026,16 +1511,18 @@ class TestNameColumn(TestSpec):
     rationale = rationale_names
     references = references_names
     suffixes = [".h", ".cxx"]
+    literals = ("DECLARE",)
+    entities = "columns"
+    pattern_declare = re.compile(r"DECLARE(_[A-Z]+)*_COLUMN(_[A-Z]+)*\(")
+    pattern_names = re.compile(r"([^,]+), ([^,\) ]+)")
 
     def test_line(self, line: str) -> bool:
-        if is_comment_cpp(line):
-            return True
-        if not (match := re.match(r"DECLARE(_[A-Z]+)*_COLUMN(_[A-Z]+)*\(", line)):
+        if not (match := self.pattern_declare.match(line)):
             return True
         # Extract names of the column type and getter.
         line = remove_comment_cpp(line)
         line = line[len(match.group()) :].strip()  # Extract part after "(".
-        if not (match := re.match(r"([^,]+), ([^,\) ]+)", line)):
+        if not (match := self.pattern_names.match(line)):
             print(f'Failed to extract column type and getter from "{line}".')
             return False
         column_type_name = match.group(1)
@@ -1064,23 +1551,26 @@ class TestNameTable(TestSpec):
     rationale = rationale_names
     references = references_names
     suffixes = [".h", ".cxx"]
+    literals = ("DECLARE",)
+    entities = "tables"
+    pattern_declare = re.compile(r"DECLARE(_[A-Z]+)*_TABLES?(_[A-Z]+)*\(")
+    pattern_name = re.compile(r"([^,\) ]+)")
+    pattern_version = re.compile(r"(.*)_([0-9]{3})")
 
     def test_line(self, line: str) -> bool:
-        if is_comment_cpp(line):
-            return True
-        if not (match := re.match(r"DECLARE(_[A-Z]+)*_TABLES?(_[A-Z]+)*\(", line)):
+        if not (match := self.pattern_declare.match(line)):
             return True
         # Extract names of the table type.
         line = remove_comment_cpp(line)
         line = line[len(match.group()) :].strip()  # Extract part after "(".
-        if not (match := re.match(r"([^,\) ]+)", line)):
+        if not (match := self.pattern_name.match(line)):
             print(f'Failed to extract table type from "{line}".')
             return False
         table_type_name = match.group(1)
         # print(f"Got \"{table_type_name}\"")
         # return True
         # Check for a version suffix.
-        if match := re.match(r"(.*)_([0-9]{3})", line):
+        if match := self.pattern_version.match(line):
             table_type_name = match.group(1)
             # table_version = match.group(2)
             # print(f"Got versioned table \"{table_type_name}\", version {table_version}")
@@ -1100,10 +1590,9 @@ class TestNameNamespace(TestSpec):
     rationale = rationale_names
     references = references_names
     suffixes = [".h", ".cxx", ".C"]
+    literals = ("namespace ",)
 
     def test_line(self, line: str) -> bool:
-        if is_comment_cpp(line):
-            return True
         if not line.startswith("namespace "):
             return True
         # Extract namespace name.
@@ -1124,11 +1613,11 @@ class TestNameType(TestSpec):
     rationale = rationale_names
     references = references_names
     suffixes = [".h", ".cxx", ".C"]
+    literals = ("using ", "concept ")
+    pattern = re.compile(r"(using|concept) (\w+) = ")
 
     def test_line(self, line: str) -> bool:
-        if is_comment_cpp(line):
-            return True
-        if not (match := re.match(r"(using|concept) (\w+) = ", line)):
+        if not (match := self.pattern.match(line)):
             return True
         # Extract type name.
         type_name = match.group(2)
@@ -1145,11 +1634,17 @@ class TestNameUpperCamelCase(TestSpec):
     rationale = rationale_names
     references = references_names
     suffixes = [".h", ".cxx", ".C"]
+    literals = (keyword,)
+    pattern = re.compile(rf"{keyword}( (class|struct))? (\w+)")
+
+    def __init_subclass__(cls, **kwargs):
+        """Compile the pattern for the keyword of the derived class."""
+        super().__init_subclass__(**kwargs)
+        cls.literals = (cls.keyword,)
+        cls.pattern = re.compile(rf"{cls.keyword}( (class|struct))? (\w+)")
 
     def test_line(self, line: str) -> bool:
-        if is_comment_cpp(line):
-            return True
-        if not (match := re.match(rf"{self.keyword}( (class|struct))? (\w+)", line)):
+        if not (match := self.pattern.match(line)):
             return True
         # Extract object name.
         object_name = match.group(3)
@@ -1277,135 +1772,137 @@ class TestNameTask(TestSpec):
     suffixes = [".cxx"]
     per_line = False
 
+    pattern_task_name = re.compile(r"TaskName\{\"([^\}]+)\"\}")
+
     def test_file(self, path: str, content) -> bool:
-        is_inside_define = False  # Are we inside defineDataProcessing?
-        is_inside_adapt = False  # Are we inside adaptAnalysisTask?
-        struct_name = ""
-        struct_templated = False  # Is the struct templated?
-        n_parens_opened = 0  # number of opened parentheses
+        index = get_code_index(content)
         passed = True
-        for i, line in enumerate(content):
-            if not line.strip():
-                continue
-            if self.is_disabled(line):
-                continue
-            if is_comment_cpp(line):
-                continue
-            line = remove_comment_cpp(line)
-            # Wait for defineDataProcessing.
-            if not is_inside_define:
-                if not re.match(r"((o2::)?framework::)?WorkflowSpec defineDataProcessing\(", line):
-                    continue
-                # print(f"{i + 1}: Entering define.")
-                is_inside_define = True
-            # Return at the end of defineDataProcessing.
-            if is_inside_define and line[0] == "}":
-                # print(f"{i + 1}: Exiting define.")
-                break
-            # Wait for adaptAnalysisTask.
-            if not is_inside_adapt:
-                if (index := line.find("adaptAnalysisTask<")) == -1:
-                    continue
-                # print(f"{i + 1}: Entering adapt.")
-                is_inside_adapt = True
-                line = line[(index + len("adaptAnalysisTask<")) :]
-                # Extract struct name.
-                if not (match := re.match(r"([^>]+)", line)):
-                    self.print_error(path, i + 1, f'Failed to extract struct name from "{line}".')
-                    return False
-                struct_name = match.group(1)
-                if (index := struct_name.find("<")) > -1:
-                    struct_templated = True
-                    # print(f"{i + 1}: Got templated struct name {struct_name}")
-                    struct_name = struct_name[:index]
-                # print(f"{i + 1}: Got struct name {struct_name}")
-                line = line[(line.index(struct_name) + len(struct_name)) :]
-            if is_inside_adapt:
-                n_parens_opened += line.count("(") - line.count(")")
-                # print(f"{i + 1}: {n_parens_opened} opened parens")
-                if n_parens_opened <= 0:
-                    # print(f"{i + 1}: Exiting adapt.")
-                    is_inside_adapt = False
-                # Find explicit task name.
-                if "TaskName{" not in line:
+        for block in get_blocks_define(content):
+            for i in range(block.line_header - 1, block.line_close):
+                line = index.code[i]
+                if self.is_disabled(content[i]):
                     continue
-                passed = False
-                # Extract explicit task name.
-                if not (match := re.search(r"TaskName\{\"([^\}]+)\"\}", line)):
-                    self.print_error(path, i + 1, f'Failed to extract explicit task name from "{line}".')
-                    return False
-                task_name = match.group(1)
-                # print(f"{i + 1}: Got struct \"{struct_name}\" with task name \"{task_name}\".")
-                # Test explicit task name.
-                device_name_from_struct_name = camel_case_to_kebab_case(
-                    struct_name
-                )  # default device name, in absence of TaskName
-                device_name_from_task_name = camel_case_to_kebab_case(
-                    task_name
-                )  # actual device name, generated from TaskName
-                struct_name_from_device_name = kebab_case_to_camel_case_u(
-                    device_name_from_task_name
-                )  # struct name matching the TaskName
-                if not is_kebab_case(device_name_from_task_name):
-                    self.print_error(
-                        path,
-                        i + 1,
-                        f"Specified task name {task_name} produces an invalid device name "
-                        f"{device_name_from_task_name}.",
-                    )
-                    passed = False
-                elif device_name_from_struct_name == device_name_from_task_name:
-                    # If the task name results in the same device name as the struct name would,
-                    # TaskName is redundant and should be removed.
-                    self.print_error(
-                        path,
-                        i + 1,
-                        f"Specified task name {task_name} and the struct name {struct_name} produce "
-                        f"the same device name {device_name_from_struct_name}. TaskName is redundant.",
-                    )
-                    passed = False
-                elif device_name_from_struct_name.replace("-", "") == device_name_from_task_name.replace("-", ""):
-                    # If the device names generated from the task name and from the struct name differ in hyphenation,
-                    # capitalisation of the struct name should be fixed and TaskName should be removed.
-                    # (special cases: alice3-, -2prong)
-                    self.print_error(
-                        path,
-                        i + 1,
-                        f"Device names {device_name_from_task_name} and {device_name_from_struct_name} generated "
-                        f"from the specified task name {task_name} and from the struct name {struct_name}, "
-                        f"respectively, differ in hyphenation. Consider fixing capitalisation of the struct name "
-                        f"to {struct_name_from_device_name} and removing TaskName.",
-                    )
-                    passed = False
-                elif device_name_from_task_name.startswith(device_name_from_struct_name):
-                    # If the device name generated from the task name is an extension of the device name generated
-                    # from the struct name, accept it if the struct is templated. If the struct is not templated,
-                    # extension is acceptable if adaptAnalysisTask is called multiple times for the same struct.
-                    if not struct_templated:
-                        self.print_error(
-                            path,
-                            i + 1,
-                            f"Device name {device_name_from_task_name} from the specified task name "
-                            f"{task_name} is an extension of the device name {device_name_from_struct_name} "
-                            f"from the struct name {struct_name} but the struct is not templated. "
-                            "Is it adapted multiple times?",
-                        )
+                start = 0
+                while (col := line.find("adaptAnalysisTask<", start)) > -1:
+                    start = col + len("adaptAnalysisTask<")
+                    # Extract struct name.
+                    if not (match := re.match(r"([^>]+)", line[start:])):
+                        self.print_error(path, i + 1, f'Failed to extract struct name from "{line[start:]}".')
+                        return False
+                    struct_name = match.group(1)
+                    struct_templated = "<" in struct_name  # Is the struct templated?
+                    if struct_templated:
+                        struct_name = struct_name[: struct_name.index("<")]
+                    # Get the arguments of adaptAnalysisTask.
+                    if (col_open := line.find("(", start)) == -1:
+                        continue
+                    if not (end := index.get_closing_parenthesis((i + 1, col_open))):
+                        continue
+                    arguments, offsets = index.get_text((i + 1, col_open + 1), end)
+                    # Find explicit task name.
+                    start_args = 0
+                    while (pos := arguments.find("TaskName{", start_args)) > -1:
+                        start_args = pos + len("TaskName{")
+                        line_task = get_line_at_position(offsets, pos)
+                        if self.is_disabled(content[line_task - 1]):
+                            continue
                         passed = False
-                    # else:
-                    #     self.print_error(path, i + 1, f"Device name {device_name_from_task_name} from
-                    # the specified task name {task_name} is an extension of the device name
-                    # {device_name_from_struct_name} from the struct name {struct_name} and the struct is templated.
-                    # All good")
-                else:
-                    # Other cases should be rejected.
-                    self.print_error(
-                        path,
-                        i + 1,
-                        f"Specified task name {task_name} produces device name {device_name_from_task_name} "
-                        f"which does not match the device name {device_name_from_struct_name} from "
-                        f"the struct name {struct_name}. (Matching struct name {struct_name_from_device_name})",
-                    )
-                    passed = False
+                        # Extract explicit task name.
+                        if not (match := self.pattern_task_name.match(arguments, pos)):
+                            self.print_error(
+                                path, line_task, f'Failed to extract explicit task name from "{arguments[pos:]}".'
+                            )
+                            return False
+                        self.test_task_name(path, line_task, match.group(1), struct_name, struct_templated)
+        return passed
+
+    def test_task_name(self, path: str, i_line: int, task_name: str, struct_name: str, struct_templated: bool):
+        """Test the explicit task name of a struct and report the problem."""
+        device_name_from_struct_name = camel_case_to_kebab_case(
+            struct_name
+        )  # default device name, in absence of TaskName
+        device_name_from_task_name = camel_case_to_kebab_case(task_name)  # actual device name, generated from TaskName
+        struct_name_from_device_name = kebab_case_to_camel_case_u(
+            device_name_from_task_name
+        )  # struct name matching the TaskName
+        if not is_kebab_case(device_name_from_task_name):
+            self.print_error(
+                path,
+                i_line,
+                f"Specified task name {task_name} produces an invalid device name {device_name_from_task_name}.",
+            )
+        elif device_name_from_struct_name == device_name_from_task_name:
+            # If the task name results in the same device name as the struct name would,
+            # TaskName is redundant and should be removed.
+            self.print_error(
+                path,
+                i_line,
+                f"Specified task name {task_name} and the struct name {struct_name} produce "
+                f"the same device name {device_name_from_struct_name}. TaskName is redundant.",
+            )
+        elif device_name_from_struct_name.replace("-", "") == device_name_from_task_name.replace("-", ""):
+            # If the device names generated from the task name and from the struct name differ in hyphenation,
+            # capitalisation of the struct name should be fixed and TaskName should be removed.
+            # (special cases: alice3-, -2prong)
+            self.print_error(
+                path,
+                i_line,
+                f"Device names {device_name_from_task_name} and {device_name_from_struct_name} generated "
+                f"from the specified task name {task_name} and from the struct name {struct_name}, "
+                f"respectively, differ in hyphenation. Consider fixing capitalisation of the struct name "
+                f"to {struct_name_from_device_name} and removing TaskName.",
+            )
+        elif device_name_from_task_name.startswith(device_name_from_struct_name):
+            # If the device name generated from the task name is an extension of the device name generated
+            # from the struct name, accept it if the struct is templated. If the struct is not templated,
+            # extension is acceptable if adaptAnalysisTask is called multiple times for the same struct.
+            if not struct_templated:
+                self.print_error(
+                    path,
+                    i_line,
+                    f"Device name {device_name_from_task_name} from the specified task name "
+                    f"{task_name} is an extension of the device name {device_name_from_struct_name} "
+                    f"from the struct name {struct_name} but the struct is not templated. "
+                    "Is it adapted multiple times?",
+                )
+        else:
+            # Other cases should be rejected.
+            self.print_error(
+                path,
+                i_line,
+                f"Specified task name {task_name} produces device name {device_name_from_task_name} "
+                f"which does not match the device name {device_name_from_struct_name} from "
+                f"the struct name {struct_name}. (Matching struct name {struct_name_from_device_name})",
+            )
+
+
+class TestNameDevice(TestSpec):
+    """Test uniqueness of device names of tasks in the repository.
+    Uses the repository symbol index to find tasks adapted in other files.
+    Tasks adapted with an explicit task name are not considered.
+    Enabled only on request because existing duplicates are not tolerated yet."""
+
+    name = "name/o2-device"
+    message = "Device names generated from struct names of tasks must be unique in the repository."
+    rationale = f"{rationale_names} Workflows with the same device names cannot run in one topology."
+    references = [Reference.LINTER_1]
+    suffixes = [".cxx"]
+    per_line = False
+    cross_file = True
+    opt_in = True
+
+    def test_file(self, path: str, content) -> bool:
+        if symbol_index is None:
+            return True
+        passed = True
+        for line, struct_name, device_name, others in symbol_index.get_tasks_same_device(path):
+            if line > len(content) or self.is_disabled(content[line - 1]):
+                continue
+            passed = False
+            locations = ", ".join(f"{path_other}:{line_other}" for path_other, line_other, _ in others)
+            self.print_error(
+                path, line, f"Device name {device_name} of struct {struct_name} is also generated in {locations}."
+            )
         return passed
 
 
@@ -1420,11 +1917,9 @@ class TestNameFileWorkflow(TestSpec):
     rationale = f"{rationale_names} Correspondence file ↔ struct."
     references = [Reference.LINTER_1]
     suffixes = [".cxx"]
+    paths_excluded = ["/Core/"]
     per_line = False
 
-    def file_matches(self, path: str) -> bool:
-        return super().file_matches(path) and "/Core/" not in path
-
     def test_file(self, path: str, content) -> bool:
         file_name = os.path.basename(path)[:-4]  # file name without suffix
         base_struct_name = f"{file_name[0].upper()}{file_name[1:]}"  # expected base of struct names
@@ -1463,15 +1958,14 @@ class TestNameConfigurable(TestSpec):
     rationale = f"{rationale_names} Correspondence C++ code ↔ JSON."
     references = [Reference.O2, Reference.LINTER_1]
     suffixes = [".h", ".cxx"]
-
-    def file_matches(self, path: str) -> bool:
-        return super().file_matches(path) and "Macros/" not in path
+    paths_excluded = ["Macros/"]
+    literals = ("Configurable",)
+    pattern = re.compile(r"((o2::)?framework::)?Configurable(\w+|<.+>) (\w+)( = )?{([^,{]+),")
+    pattern_configurable = re.compile(r"((o2::)?framework::)?Configurable")
 
     def test_line(self, line: str) -> bool:
-        if is_comment_cpp(line):
-            return True
-        if not (match := re.match(r"((o2::)?framework::)?Configurable(\w+|<.+>) (\w+)( = )?{([^,{]+),", line)):
-            return not re.match(r"((o2::)?framework::)?Configurable", line)
+        if not (match := self.pattern.match(line)):
+            return not self.pattern_configurable.match(line)
         # Extract Configurable name.
         name_cpp = match.group(4)  # nameCpp
         name_json = match.group(6)  # expecting "nameJson"
@@ -1495,13 +1989,11 @@ class TestHfNameStructClass(TestSpec):
     rationale = f"{rationale_names} Correspondence device ↔ workflow."
     references = references_hf
     suffixes = [".h", ".cxx"]
-
-    def file_matches(self, path: str) -> bool:
-        return super().file_matches(path) and "PWGHF/" in path and "Macros/" not in path
+    paths_required = ["PWGHF/"]
+    paths_excluded = ["Macros/"]
+    literals = ("struct ", "class ")
 
     def test_line(self, line: str) -> bool:
-        if is_comment_cpp(line):
-            return True
         if not line.startswith(("struct ", "class ")):
             return True
         line = remove_comment_cpp(line)
@@ -1522,11 +2014,10 @@ class TestHfNameFileTask(TestSpec):
     rationale = rationale_names
     references = references_hf
     suffixes = [".cxx"]
+    paths_required = ["PWGHF/"]
+    paths_excluded = ["Macros/"]
     per_line = False
 
-    def file_matches(self, path: str) -> bool:
-        return super().file_matches(path) and "PWGHF/" in path and "Macros/" not in path
-
     def test_file(self, path: str, content) -> bool:
         file_name = os.path.basename(path)
         return not ("/Tasks/" in path and not file_name.startswith("task"))
@@ -1541,6 +2032,7 @@ class TestHfStructMembers(TestSpec):
     rationale = rationale_names
     references = references_hf
     suffixes = [".cxx"]
+    paths_required = ["PWGHF/"]
     per_line = False
     member_order = [
         "Spawns<",
@@ -1563,35 +2055,31 @@ class TestHfStructMembers(TestSpec):
         "void process",
     ]
 
-    def file_matches(self, path: str) -> bool:
-        return super().file_matches(path) and "PWGHF/" in path
-
     def test_file(self, path: str, content) -> bool:
         passed = True
-        dic_structs: dict[str, dict] = {}
-        struct_name = ""
-        for i, line in enumerate(content):
-            if is_comment_cpp(line):
+        index = get_code_index(content)
+        for struct_name, block in index.get_structs():
+            line_struct = block.get_line(block.header.find("struct "))
+            if not content[line_struct - 1].startswith("struct "):  # expecting no indentation
                 continue
-            if line.startswith("struct "):  # expecting no indentation
-                line = remove_comment_cpp(line)
-                struct_name = line.strip().split()[1]
-                dic_structs[struct_name] = {}
-                continue
-            if not struct_name:
-                continue
-            # Save line numbers of members of the current struct for each category.
-            for member in self.member_order:
-                if line.startswith(f"  {member}"):  # expecting single-level indentation for direct members
-                    if member not in dic_structs[struct_name]:
-                        dic_structs[struct_name][member] = []
-                    dic_structs[struct_name][member].append(i + 1)  # save line number
-                    break
-        # print(dic_struct)
-        # Detect members declared in a wrong order.
-        last_line_last_member = 0  # line number of the last member of the previous member category
-        index_last_member = 0  # index of the previous member category in the member_order list
-        for struct_name, dic_struct in dic_structs.items():
+            # Save line numbers of direct members of the struct for each category.
+            dic_struct: dict[str, list[int]] = {}
+            line_previous = "{"  # previous non-empty line of code
+            for i in range(block.line_open, block.line_close - 1):
+                if not (line := index.code[i].strip()):
+                    continue
+                # Skip continued statements.
+                is_statement = line_previous[-1] in ";{}:" or line_previous.startswith("template")
+                line_previous = line
+                if not is_statement or index.depths[i] != block.depth + 1:
+                    continue
+                for member in self.member_order:
+                    if line.startswith(member):
+                        dic_struct.setdefault(member, []).append(i + 1)  # save line number
+                        break
+            # Detect members declared in a wrong order.
+            last_line_last_member = 0  # line number of the last member of the previous member category
+            index_last_member = 0  # index of the previous member category in the member_order list
             for i_m, member in enumerate(self.member_order):
                 if member not in dic_struct:
                     continue
@@ -1615,114 +2103,1401 @@ class TestHfStructMembers(TestSpec):
 # End of test implementations
 
 
+entry_point_group = "o2_linter.rules"  # group of entry points of rule packs
+
+
+def get_builtin_tests() -> "dict[str, list[type[TestSpec]]]":
+    """Get classes of built-in tests in groups (in the order of running)."""
+    return {
+        "bad-practice": [
+            TestIoStream,
+            TestUsingStd,
+            TestUsingDirective,
+            TestStdPrefix,
+            TestRootEntity,
+            TestRootLorentzVector,
+            TestPi,
+            TestTwoPiAddSubtract,
+            TestPiMultipleFraction,
+            TestPdgDatabase,
+            TestPdgExplicitCode,
+            TestPdgExplicitMass,
+            TestPdgKnownMass,
+            TestLogging,
+            TestConstRefInForLoop,
+            TestConstRefInSubscription,
+            TestWorkflowOptions,
+            TestMagicNumber,
+        ],
+        "documentation": [
+            TestDocumentationFile,
+        ],
+        "naming": [
+            TestNameFunctionVariable,
+            TestNameMacro,
+            TestNameConstant,
+            TestNameColumn,
+            TestNameTable,
+            TestNameNamespace,
+            TestNameType,
+            TestNameEnum,
+            TestNameClass,
+            TestNameStruct,
+            TestNameFileCpp,
+            TestNameFilePython,
+            TestNameWorkflow,
+            TestNameTask,
+            TestNameDevice,
+            TestNameFileWorkflow,
+            TestNameConfigurable,
+        ],
+        "pwghf": [
+            TestHfNameStructClass,
+            TestHfNameFileTask,
+            TestHfStructMembers,
+        ],
+    }
+
+
+def load_rule_pack_file(path: str) -> "list[type[TestSpec]]":
+    """Import a rule pack from a file and get its test classes."""
+    name = os.path.basename(path)[:-3]
+    spec = importlib.util.spec_from_file_location(f"o2_linter_rules_{name}", path)
+    if spec is None or spec.loader is None:
+        print(f'Failed to load rule pack "{path}".')
+        sys.exit(1)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.get_tests()
+
+
+def find_rule_packs(dirs_rules: "list[str]") -> "dict[str, Callable[[], list[type[TestSpec]]]]":
+    """Find rule packs without importing them.
+
+    Rule packs are Python files in the given directories (named by the file name) and entry points
+    of installed packages in the group o2_linter.rules. A pack provides a function get_tests returning
+    test classes (referred to directly by the entry point). Returns the functions loading the packs.
+    """
+    packs: dict[str, Callable[[], list[type[TestSpec]]]] = {}
+    try:
+        points = entry_points(group=entry_point_group)
+    except TypeError:  # Python < 3.10
+        points = entry_points().get(entry_point_group, [])  # type: ignore[attr-defined]
+    for point in points:
+        packs[point.name] = lambda point=point: point.load()()
+    for directory in dirs_rules:
+        try:
+            names = sorted(name for name in os.listdir(directory) if name.endswith(".py"))
+        except OSError as error:
+            print(f'Failed to read the rule directory "{directory}". {error}')
+            sys.exit(1)
+        for name in names:
+            packs[name[:-3]] = lambda path=os.path.join(directory, name): load_rule_pack_file(path)
+    return packs
+
+
+def create_tests(
+    rules: "Union[list[str], None]" = None, dirs_rules: "Union[list[str], None]" = None
+) -> "list[TestSpec]":
+    """Create the list of activated tests.
+
+    Tests are selected by names of groups, rule packs, tests or test name prefixes (e.g. "pdg").
+    All built-in tests are selected by default, all built-in tests and rule packs with "all".
+    Rule packs in the given directories are selected by default too.
+    Opt-in tests are selected only by their names or with "all".
+    Rule packs are imported only if selected and tests are instantiated only if selected.
+    """
+    groups = get_builtin_tests()
+    classes_builtin = [cls for classes in groups.values() for cls in classes]
+    if not rules and not dirs_rules:
+        return [cls() for cls in classes_builtin if not cls.opt_in]
+    packs = find_rule_packs(dirs_rules or [])
+    if not rules:
+        packs_installed = find_rule_packs([])
+        rules = list(groups) + [name for name in packs if name not in packs_installed]
+    # Rule packs can import this module also when it is run as a script.
+    sys.modules.setdefault("o2_linter", sys.modules[__name__])
+    selected: set[type[TestSpec]] = set()
+    classes_packs: dict[str, list[type[TestSpec]]] = {}  # test classes of loaded rule packs
+    for rule in rules:
+        if rule == "all":
+            selected.update(classes_builtin)
+            for name, load in packs.items():
+                classes_packs[name] = classes_packs.get(name) or load()
+        elif rule in groups:
+            selected.update(cls for cls in groups[rule] if not cls.opt_in)
+        elif rule in packs:
+            classes_packs[rule] = classes_packs.get(rule) or packs[rule]()
+        elif classes := [
+            cls for cls in classes_builtin if rule == cls.name or (rule == cls.name.split("/")[0] and not cls.opt_in)
+        ]:
+            selected.update(classes)
+        else:
+            print(f'Unknown rule "{rule}". Use names of tests, groups {list(groups)} or rule packs {list(packs)}.')
+            sys.exit(1)
+    tests = [cls() for cls in classes_builtin if cls in selected]
+    tests += [cls() for classes in classes_packs.values() for cls in classes]
+    return tests
+
+
+class PathMatcher:
+    """Selection of tests applicable to file paths
+
+    Conditions of tests on paths are compiled in regular expressions matching directory paths.
+    Applicable tests are determined once for each directory and file suffix, so that files without
+    applicable tests can be skipped before being opened and each test gets only the files it needs.
+    Tests with a custom file_matches are selected by calling it for each file.
+    """
+
+    def __init__(self, tests: "list[TestSpec]") -> None:
+        self.tests = tests
+        # tests with custom conditions on paths
+        self.tests_custom = {test for test in tests if type(test).file_matches is not TestSpec.file_matches}
+        self.patterns = [re.compile(test.get_directory_pattern()) for test in tests]
+        # all suffixes, longest first to get the most specific one
+        self.suffixes = tuple(sorted({s for test in tests for s in test.suffixes}, key=len, reverse=True))
+        self.selections: dict[tuple[str, str], list[TestSpec]] = {}  # tests for directories and suffixes
+
+    def get_tests(self, path: str) -> "list[TestSpec]":
+        """Get tests applicable to a file path."""
+        directory = os.path.dirname(path)
+        suffix = next((s for s in self.suffixes if path.endswith(s)), "")
+        key = (directory, suffix)
+        if (tests := self.selections.get(key)) is None:
+            directory = f"{directory}/" if directory else ""
+            tests = [
+                test
+                for test, pattern in zip(self.tests, self.patterns)
+                if test in self.tests_custom
+                or (
+                    (not test.suffixes or (suffix and suffix.endswith(tuple(test.suffixes))))
+                    and pattern.match(directory)
+                )
+            ]
+            self.selections[key] = tests
+        if self.tests_custom:
+            return [test for test in tests if test not in self.tests_custom or test.file_matches(path)]
+        return tests
+
+
+def run_tests(
+    path: str,
+    content: "list[str]",
+    tests: "list[TestSpec]",
+    tolerated_tests: "list[str]",
+    lines_selected: "Union[set[int], None]" = None,
+) -> "list[str]":
+    """Run tests on a file content and return names of failed tests.
+
+    All tests must be applicable to the file (see PathMatcher).
+    If a set of line numbers is provided, per-line tests test only these lines.
+    Per-line tests of declarations test only the lines of declarations if the file is in the symbol index.
+    """
+    names_failed: list[str] = []
+    for test in tests:
+        test.tolerated = test.name in tolerated_tests
+        test.severity_current = Severity.WARNING if test.tolerated else test.severity_default
+        test.content, test.occurrences = content, {}
+    # Separate per-line tests of indexed declarations.
+    tests_line: list[TestSpec] = []  # per-line tests of all lines
+    tests_indexed: dict[str, list[TestSpec]] = {}  # per-line tests of indexed lines by kind of entities
+    lines_indexed: dict[str, Union[set[int], None]] = {}  # indexed lines by kind of entities
+    for test in tests:
+        if not test.per_line:
+            continue
+        if test.entities and symbol_index is not None:
+            if test.entities not in lines_indexed:
+                lines_indexed[test.entities] = symbol_index.get_lines(path, test.entities)
+            if lines_indexed[test.entities] is not None:
+                tests_indexed.setdefault(test.entities, []).append(test)
+                continue
+        tests_line.append(test)
+    # Test all lines in one pass with all matching per-line tests.
+    lines_bad = dict(zip(tests_line, test_lines(content, tests_line, lines_selected)))
+    for kind, tests_kind in tests_indexed.items():
+        lines_kind = lines_indexed[kind] or set()
+        if lines_selected is not None:
+            lines_kind &= lines_selected
+        lines_bad.update(zip(tests_kind, test_lines(content, tests_kind, lines_kind)))
+    # Report results in the order of tests.
+    for test in tests:
+        if test.per_line:
+            passed = True
+            for line in lines_bad.get(test, []):
+                if test.report_issue(path, line):
+                    passed = False
+        else:
+            passed = test.run(path, content)
+        if not (passed or test.tolerated):
+            names_failed.append(test.name)
+    return names_failed
+
+
+def add_includes(lines: "list[str]", includes: "list[str]"):
+    """Add missing includes after the last include (or after the leading comments)."""
+    headers = set()
+    i_insert = 0  # index of the line before which includes are inserted
+    in_header = True  # in the leading comments and preprocessor directives
+    for i, line in enumerate(lines):
+        line_stripped = line.strip()
+        if match := re.match(r"#\s*include\s*[<\"]([^>\"]+)[>\"]", line_stripped):
+            headers.add(match.group(1))
+            i_insert = i + 1
+        elif in_header and line_stripped.startswith(("//", "/*", "*")):
+            i_insert = i + 1
+        elif line_stripped and not line_stripped.startswith("#"):
+            in_header = False
+    includes_missing = sorted({include for include in includes if include[1:-1] not in headers})
+    newline = "\r\n" if lines and lines[0].endswith("\r\n") else "\n"
+    lines[i_insert:i_insert] = [f"#include {include}{newline}" for include in includes_missing]
+
+
+def get_fixed_content(
+    content: "list[str]", tests: "list[TestSpec]", lines_selected: "Union[set[int], None]" = None
+) -> "tuple[list[str], int]":
+    """Fix issues found by fixable per-line tests.
+
+    Replacements for all lines and tests are collected first and then applied in one pass.
+    Replacements inside strings and replacements overlapping a preceding one are skipped.
+    Returns the fixed lines and the number of applied replacements.
+    """
+    fixes_lines: dict[int, list[Fix]] = {}
+    for test, lines_bad in zip(tests, test_lines(content, tests, lines_selected)):
+        for n in lines_bad:
+            line = content[n - 1].rstrip("\r\n")
+            for marker in ("//", "/*"):
+                if marker in line:
+                    line = line[: line.index(marker)]
+            for fix in test.get_fixes(line):
+                if not line.count('"', 0, fix.start) % 2:  # Skip replacements inside strings.
+                    fixes_lines.setdefault(n - 1, []).append(fix)
+    lines = list(content)
+    includes = []
+    n_fixes = 0
+    for i, fixes in fixes_lines.items():
+        fixes_applied: list[Fix] = []
+        for fix in sorted(fixes, key=lambda fix: (fix.start, fix.end)):
+            if fixes_applied and fix.start < fixes_applied[-1].end or fix in fixes_applied:
+                continue
+            fixes_applied.append(fix)
+        line = lines[i]
+        for fix in reversed(fixes_applied):  # Apply from the end to keep the positions valid.
+            line = f"{line[: fix.start]}{fix.text}{line[fix.end :]}"
+        if line != lines[i]:
+            lines[i] = line
+            n_fixes += len(fixes_applied)
+            includes += [fix.include for fix in fixes_applied if fix.include]
+    if includes:
+        add_includes(lines, includes)
+    return lines, n_fixes
+
+
+def write_file_atomic(path: str, lines: "list[str]"):
+    """Write a file by replacing it with a temporary file with the same permissions."""
+    fd, path_tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".o2_linter_")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as file:
+            file.writelines(lines)
+        shutil.copymode(path, path_tmp)
+        os.replace(path_tmp, path)
+    except OSError:
+        os.remove(path_tmp)
+        raise
+
+
+def fix_files(paths: "list[str]", tests: "list[TestSpec]", dry_run=False, file_info=sys.stdout):
+    """Fix issues in files. In the dry-run mode, print the changes as a unified diff instead of writing them."""
+    n_fixes, n_files = 0, 0
+    matcher = PathMatcher([test for test in tests if test.fixable])  # the same selection as for linting
+    for path in paths:
+        tolerated_tests = find_config_path(os.path.dirname(path))[1]  # Tolerated issues are not fixed.
+        tests = [test for test in matcher.get_tests(path) if test.name not in tolerated_tests]
+        try:
+            with open(path, encoding="utf-8", newline="") as file:
+                content = file.readlines()
+            lines, n_fixes_file = get_fixed_content(content, tests)
+            if not n_fixes_file:
+                continue
+            if dry_run:
+                print("".join(difflib.unified_diff(content, lines, path, path)), end="", file=file_info)
+            else:
+                write_file_atomic(path, lines)
+        except (OSError, UnicodeDecodeError) as error:
+            print(f'Failed to fix file "{path}". {error}', file=file_info)
+            sys.exit(1)
+        n_fixes += n_fixes_file
+        n_files += 1
+    print(f"{'Fixable' if dry_run else 'Fixed'} issues: {n_fixes} in {n_files} files", file=file_info)
+
+
+def parse_diff(diff: str) -> "dict[str, set[int]]":
+    """Get numbers of added and modified lines of each file from a unified diff."""
+    lines_changed: dict[str, set[int]] = {}
+    lines_file: Union[set[int], None] = None  # changed lines of the current file
+    n_old, n_new = 0, 0  # numbers of remaining old and new lines in the current hunk
+    n_line = 0  # number of the current line in the new file
+    for line in diff.splitlines():
+        if n_old > 0 or n_new > 0:  # inside a hunk
+            if line.startswith("+"):
+                if lines_file is not None:
+                    lines_file.add(n_line)
+                n_line += 1
+                n_new -= 1
+            elif line.startswith("-"):
+                n_old -= 1
+            elif line.startswith(" ") or not line:
+                n_line += 1
+                n_old -= 1
+                n_new -= 1
+            continue
+        if line.startswith("+++ "):
+            path = line[4:].split("\t")[0]
+            if path == "/dev/null":  # deleted file
+                lines_file = None
+                continue
+            if path.startswith("b/"):
+                path = path[2:]
+            lines_file = lines_changed.setdefault(os.path.normpath(path), set())
+        elif match := re.match(r"@@ -\d+(,(\d+))? \+(\d+)(,(\d+))? @@", line):
+            n_old = int(match.group(2)) if match.group(2) is not None else 1
+            n_line = int(match.group(3))
+            n_new = int(match.group(5)) if match.group(5) is not None else 1
+    return lines_changed
+
+
+def get_diff(base: str) -> str:
+    """Get a unified diff from a file, from the standard input ("-") or from git for a given base revision."""
+    if base == "-":
+        return sys.stdin.read()
+    if os.path.isfile(base):
+        with open(base, encoding="utf-8") as file:
+            return file.read()
+    cmd = ["git", "diff", "--relative", "--no-color", "--no-ext-diff", "-U0", base, "--"]
+    try:
+        return sp.run(cmd, check=True, capture_output=True, text=True).stdout  # nosec B603 B607
+    except (OSError, sp.CalledProcessError) as error:
+        print(f'Failed to get the diff with "{" ".join(cmd)}". {error}')
+        sys.exit(1)
+
+
+class FileContent(Sequence):
+    """Lines of a file read lazily from a memory map.
+
+    Large files are mapped in memory, small files are read at once. (Mapped files must not be truncated while mapped.)
+    The data are indexed by offsets of line starts.
+    Lines are decoded only when accessed, so the content is never held as a list of lines.
+    Lines keep the line break like with readlines (with "\\r\\n" translated to "\\n").
+    """
+
+    size_mmap_min = 1 << 20  # minimum size of mapped files [B]
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as file:
+            if os.fstat(file.fileno()).st_size >= self.size_mmap_min:
+                self.data: "Union[mmap.mmap, bytes]" = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self.data = file.read()
+        # Index the offsets of line starts (and of the end of the data).
+        self.offsets = array("Q", [0])
+        find = self.data.find
+        pos = find(b"\n")
+        while pos != -1:
+            self.offsets.append(pos + 1)
+            pos = find(b"\n", pos + 1)
+        if self.offsets[-1] != len(self.data):
+            self.offsets.append(len(self.data))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("line index out of range")
+        line = self.data[self.offsets[index] : self.offsets[index + 1]].decode("utf-8")
+        return line[:-2] + "\n" if line.endswith("\r\n") else line
+
+    def __iter__(self):
+        data, offsets = self.data, self.offsets
+        for i in range(len(offsets) - 1):
+            line = data[offsets[i] : offsets[i + 1]].decode("utf-8")
+            yield line[:-2] + "\n" if line.endswith("\r\n") else line
+
+    def __enter__(self) -> "FileContent":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Unmap the file."""
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+
+# Profile of linting a file: wall time, CPU time, number of lines, (wall time, CPU time, inspected lines) of all tests
+FileProfile = "tuple[float, float, int, list[tuple[float, float, int]]]"
+# Result of linting a file: output, names of failed tests (None if the file could not be opened),
+# counters (issues, disabled, tolerated, known from the baseline) of all tests, profile (None if not profiling),
+# fingerprints of issues (if recording the baseline), records of issues (if not reporting in the text format)
+FileResult = (
+    "tuple[str, Union[list[str], None], list[tuple[int, int, int, int]], Union[FileProfile, None], list[str], "
+    "list[dict]]"
+)
+
+
+def get_cache_dir_default() -> str:
+    """Get the default directory of the result cache."""
+    dir_cache_user = os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(dir_cache_user, "o2_linter")
+
+
+def get_linter_hash(tests: "Union[list[TestSpec], None]" = None) -> str:
+    """Get the hash of the linter source code and of rule packs of tests, used as the linter version in caches."""
+    hash_code = hashlib.sha256(Path(__file__).read_bytes())
+    paths = {getattr(sys.modules[type(test).__module__], "__file__", None) for test in tests or []}
+    for path in sorted(path for path in paths if path and os.path.abspath(path) != os.path.abspath(__file__)):
+        hash_code.update(Path(path).read_bytes())
+    return hash_code.hexdigest()
+
+
+def load_cached_result(path_cache: str) -> "Union[FileResult, None]":
+    """Load a stored result from the cache. Return None if not found."""
+    try:
+        with open(path_cache, encoding="utf-8") as file:
+            result = json.load(file)
+        os.utime(path_cache)  # Mark as recently used.
+    except (OSError, ValueError):
+        return None
+    if "records" not in result:  # stored by an older version
+        return None
+    counters = [tuple(c) for c in result["counters"]]
+    return result["output"], result["names_failed"], counters, None, result["fingerprints"], result["records"]
+
+
+def save_cached_result(path_cache: str, result: FileResult):
+    """Store a result in the cache."""
+    output, names_failed, counters, _, fingerprints_file, records_file = result
+    data = {
+        "output": output,
+        "names_failed": names_failed,
+        "counters": counters,
+        "fingerprints": fingerprints_file,
+        "records": records_file,
+    }
+    path_tmp = f"{path_cache}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path_cache), exist_ok=True)
+        with open(path_tmp, "w", encoding="utf-8") as file:
+            json.dump(data, file)
+        os.replace(path_tmp, path_cache)  # atomic replacement
+    except OSError:
+        print(f'Failed to write in the cache "{path_cache}".', file=sys.stderr)
+
+
+def prune_cache(dir_cache: str, size_max: int):
+    """Delete the least recently used results to keep the cache size within the limit (in bytes)."""
+    entries = []
+    with os.scandir(dir_cache) as it:
+        for entry in it:
+            if entry.name.endswith(".json"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+    size = sum(e[1] for e in entries)
+    for _mtime, size_entry, path_entry in sorted(entries):
+        if size <= size_max:
+            break
+        try:
+            os.remove(path_entry)
+            size -= size_entry
+        except OSError:
+            pass
+
+
+def load_baseline(path: str) -> "set[str]":
+    """Load fingerprints of known issues from a baseline file."""
+    try:
+        with open(path, encoding="utf-8") as file:
+            return {line.strip() for line in file if line.strip() and not line.startswith("#")}
+    except OSError as error:
+        print(f'Failed to read the baseline "{path}". {error}')
+        sys.exit(1)
+
+
+def save_baseline(path: str, fingerprints_all: "list[str]"):
+    """Save fingerprints of issues in a baseline file."""
+    try:
+        with open(path, "w", encoding="utf-8") as file:
+            file.write("# O2 linter baseline: fingerprints of known issues\n")
+            file.writelines(f"{fingerprint}\n" for fingerprint in sorted(set(fingerprints_all)))
+    except OSError as error:
+        print(f'Failed to write the baseline "{path}". {error}')
+        sys.exit(1)
+
+
+def get_repository_root(path: str) -> "Union[str, None]":
+    """Get the root directory of the git repository containing a path."""
+    directory = os.path.abspath(path if os.path.isdir(path) else os.path.dirname(path) or ".")
+    while not os.path.exists(os.path.join(directory, ".git")):
+        if os.path.dirname(directory) == directory:
+            return None
+        directory = os.path.dirname(directory)
+    return directory
+
+
+class SymbolIndex:
+    """Index of O2 entities declared in a repository
+
+    Names and lines of declared tables, columns, structs, adapted tasks and workflows are extracted
+    from all C++ headers and sources and CMakeLists.txt files of the repository.
+    The index is stored in a file and updated only for files whose modification time or size changed,
+    so that tests can query entities declared in other files without reading them
+    and per-line tests of declarations can test only the indexed lines of declarations.
+    """
+
+    suffixes = (".h", ".cxx", "CMakeLists.txt")  # suffixes of indexed files
+    pattern_comment = re.compile(r"//[^\n]*|/\*.*?\*/", re.S)
+    pattern_table = re.compile(r"^[ \t]*DECLARE(_[A-Z]+)*_TABLES?(_[A-Z]+)*\(\s*(?P<name>\w+)", re.M)
+    pattern_column = re.compile(
+        r"^[ \t]*DECLARE(_[A-Z]+)*_COLUMN(_[A-Z]+)*\(\s*(?P<name>[\w#]+),\s*(?P<getter>[\w#]+)", re.M
+    )
+    pattern_struct = re.compile(r"^struct (?P<name>\w+)", re.M)
+    pattern_task = re.compile(r"adaptAnalysisTask<(?P<name>\w+)>\(")
+    pattern_workflow = re.compile(r"^o2physics_add_dpl_workflow\((?P<name>[\w-]+)\s+SOURCES\s+(?P<source>\S+)", re.M)
+
+    def __init__(self, dir_root: str, path_store: str = "") -> None:
+        self.dir_root = dir_root
+        self.path_store = path_store  # file with the stored index (not stored if empty)
+        self.version = ""  # version of the extraction (the stored index is discarded if it differs)
+        self.files: dict[str, dict] = {}  # entities declared in files (relative paths), with the file state
+        self.devices: dict[str, list[tuple[str, int, str]]] = {}  # (path, line, struct) of tasks for device names
+
+    def load(self, version: str):
+        """Load the stored index."""
+        self.version = version
+        if not self.path_store:
+            return
+        try:
+            with open(self.path_store, encoding="utf-8") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == version and data.get("root") == self.dir_root:
+            self.files = data["files"]
+
+    def save(self):
+        """Store the index atomically."""
+        if not self.path_store:
+            return
+        data = {"version": self.version, "root": self.dir_root, "files": self.files}
+        try:
+            os.makedirs(os.path.dirname(self.path_store), exist_ok=True)
+            path_tmp = f"{self.path_store}.{os.getpid()}.tmp"
+            with open(path_tmp, "w", encoding="utf-8") as file:
+                json.dump(data, file, separators=(",", ":"))
+            os.replace(path_tmp, self.path_store)
+        except OSError:
+            pass
+
+    def extract(self, text: str, path: str) -> dict:
+        """Extract names and lines of entities declared in a file content."""
+        # Blank comments, keeping the line breaks.
+        text = self.pattern_comment.sub(lambda match: "\n" * match.group().count("\n"), text)
+
+        def get_line(pos: int) -> int:
+            return text.count("\n", 0, pos) + 1
+
+        entities: dict[str, list] = {}
+        if path.endswith("CMakeLists.txt"):
+            entities["workflows"] = [
+                [m.group("name"), get_line(m.start()), m.group("source")] for m in self.pattern_workflow.finditer(text)
+            ]
+            return entities
+        entities["tables"] = [[m.group("name"), get_line(m.start())] for m in self.pattern_table.finditer(text)]
+        entities["columns"] = [
+            [m.group("name"), get_line(m.start()), m.group("getter")] for m in self.pattern_column.finditer(text)
+        ]
+        entities["structs"] = [[m.group("name"), get_line(m.start())] for m in self.pattern_struct.finditer(text)]
+        # Tasks adapted without an explicit task name (arguments end before the next task or statement)
+        tasks = []
+        for m in self.pattern_task.finditer(text):
+            end = min(pos for pos in (text.find(";", m.end()), text.find("adaptAnalysisTask<", m.end())) if pos > -1)
+            if "TaskName" not in text[m.end() : end]:
+                tasks.append([m.group("name"), get_line(m.start())])
+        entities["tasks"] = tasks
+        return entities
+
+    def update(self, paths: "Union[list[str], None]" = None) -> int:
+        """Index new and changed files and forget deleted files. Return the number of indexed files.
+
+        If paths are given, only files in these paths are indexed (without forgetting other files).
+        """
+        states = get_file_states(paths or [self.dir_root], self.suffixes)
+        files = {} if paths is None else dict(self.files)
+        n_indexed = 0
+        for path_file, state in states.items():
+            path = self.get_path(path_file)
+            if path.startswith(os.pardir):  # outside the repository
+                continue
+            if (entry := self.files.get(path)) and entry["state"] == list(state):
+                files[path] = entry
+                continue
+            try:
+                with open(path_file, encoding="utf-8", errors="replace") as file:
+                    entry = self.extract(file.read(), path)
+            except OSError:
+                continue
+            entry["state"] = list(state)
+            files[path] = entry
+            n_indexed += 1
+        changed = n_indexed > 0 or len(files) != len(self.files)
+        self.files = files
+        if changed:
+            self.save()
+        # Map device names generated from struct names to the tasks.
+        self.devices = {}
+        for path, entry in self.files.items():
+            for struct_name, line in entry.get("tasks", []):
+                self.devices.setdefault(camel_case_to_kebab_case(struct_name), []).append((path, line, struct_name))
+        return n_indexed
+
+    def get_path(self, path: str) -> str:
+        """Get the path relative to the repository root."""
+        return os.path.relpath(os.path.abspath(path), self.dir_root)
+
+    def get_lines(self, path: str, kind: str) -> "Union[set[int], None]":
+        """Get lines of entities declared in a file. Return None if the file is not indexed or changed since."""
+        if not (entry := self.files.get(self.get_path(path))):
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if entry["state"] != [stat.st_mtime_ns, stat.st_size]:
+            return None
+        return {line for _, line, *_ in entry.get(kind, [])}
+
+    def get_tasks_same_device(self, path: str) -> "list[tuple[int, str, str, list[tuple[str, int, str]]]]":
+        """Get tasks in a file with device names generated also by tasks in other files.
+
+        Returns the line, struct name, device name and (path, line, struct) of tasks in other files.
+        """
+        path = self.get_path(path)
+        tasks = []
+        for struct_name, line in self.files.get(path, {}).get("tasks", []):
+            device_name = camel_case_to_kebab_case(struct_name)
+            if others := [task for task in self.devices.get(device_name, []) if task[0] != path]:
+                tasks.append((line, struct_name, device_name, others))
+        return tasks
+
+
+symbol_index: "Union[SymbolIndex, None]" = None  # repository index (cross-file tests are skipped if None)
+tests_worker: "list[TestSpec]" = []  # tests instantiated in a worker process
+matcher_worker: "Union[PathMatcher, None]" = None  # selection of tests applicable to files in a worker process
+dir_cache_worker = ""  # directory of the result cache (caching disabled if empty)
+hash_linter = ""  # hash of the linter source code
+lines_changed_worker: "Union[dict[str, set[int]], None]" = None  # changed lines of files (test all lines if None)
+profile_worker = False  # Measure time spent in tests.
+baseline: "Union[set[str], None]" = None  # fingerprints of known issues (all issues are reported if None)
+hash_baseline = ""  # hash of the baseline
+record_baseline = False  # Collect fingerprints of all issues.
+fingerprints: "list[str]" = []  # fingerprints of issues in the current file (if recording the baseline)
+issue_records: "list[dict]" = []  # records of issues in the current file (if not reporting in the text format)
+
+
+def init_worker(
+    github: bool,
+    dir_cache: str,
+    lines_changed: "Union[dict[str, set[int]], None]" = None,
+    format_output="text",
+    profile=False,
+    index: "Union[SymbolIndex, None]" = None,
+    rules: "Union[list[str], None]" = None,
+    dirs_rules: "Union[list[str], None]" = None,
+    baseline_known: "Union[set[str], None]" = None,
+    record=False,
+):
+    """Initialise a worker process for linting."""
+    global github_mode, output_format, tests_worker  # pylint: disable=global-statement  # noqa: PLW0603
+    global dir_cache_worker, hash_linter, matcher_worker  # pylint: disable=global-statement  # noqa: PLW0603
+    global lines_changed_worker, profile_worker  # pylint: disable=global-statement  # noqa: PLW0603
+    global symbol_index, baseline, hash_baseline, record_baseline  # pylint: disable=global-statement  # noqa: PLW0603
+    github_mode = github
+    baseline, record_baseline = baseline_known, record
+    if baseline is not None:
+        hash_baseline = hashlib.sha256("\n".join(sorted(baseline)).encode()).hexdigest()
+    symbol_index = index
+    output_format = format_output
+    tests_worker = create_tests(rules, dirs_rules)
+    matcher_worker = PathMatcher(tests_worker)
+    profile_worker = profile
+    if profile:
+        for test in tests_worker:
+            profile_test(test)
+    dir_cache_worker = dir_cache
+    lines_changed_worker = lines_changed
+    if dir_cache:
+        hash_linter = get_linter_hash(tests_worker)
+
+
+def lint_file_worker(path: str) -> FileResult:
+    """Lint a file in a worker process.
+
+    Returns the captured output, names of failed tests (None if the file could not be opened),
+    the counters (issues, disabled, tolerated) of all tests for this file and the profile if profiling.
+    If the cache is enabled, results are replayed for files with the same content, path and tolerated tests
+    (and the same entities in other files used by cross-file tests).
+    """
+    global fingerprints, issue_records  # pylint: disable=global-statement  # noqa: PLW0603
+    for test in tests_worker:
+        test.n_issues, test.n_disabled, test.n_tolerated, test.n_baseline = 0, 0, 0, 0
+        test.time_wall, test.time_cpu, test.n_lines_inspected = 0.0, 0.0, 0
+    fingerprints, issue_records = [], []
+    tests = matcher_worker.get_tests(path) if matcher_worker else tests_worker
+    if not tests:  # Skip the file before reading it.
+        return "", [], [(0, 0, 0, 0)] * len(tests_worker), None, [], []
+    time_wall, time_cpu = time.perf_counter(), time.process_time()
+    output = io.StringIO()
+    path_cache = ""
+    with redirect_stdout(output):
+        try:
+            content = FileContent(path)
+            tolerated_tests = get_tolerated_tests(path)
+        except OSError:
+            return output.getvalue(), None, [], None, [], []
+        lines_selected = None
+        if lines_changed_worker is not None:
+            lines_selected = lines_changed_worker.get(os.path.normpath(path), set())
+        if dir_cache_worker:
+            key = json.dumps(
+                [
+                    hash_linter,
+                    github_mode,
+                    output_format,
+                    [t.name for t in tests_worker],
+                    tolerated_tests,
+                    path,
+                    sorted(lines_selected) if lines_selected is not None else None,
+                    symbol_index.get_tasks_same_device(path) if symbol_index else None,  # cross-file facts
+                    hash_baseline if baseline is not None else None,
+                    record_baseline,
+                ]
+            )
+            hash_file = hashlib.sha256(key.encode())
+            hash_file.update(content.data)
+            path_cache = os.path.join(dir_cache_worker, f"{hash_file.hexdigest()}.json")
+            if (result := load_cached_result(path_cache)) is not None:
+                content.close()
+                return result
+        with content:
+            names_failed = run_tests(path, content, tests, tolerated_tests, lines_selected)
+    counters = [(test.n_issues, test.n_disabled, test.n_tolerated, test.n_baseline) for test in tests_worker]
+    profile = None
+    if profile_worker:
+        time_wall, time_cpu = time.perf_counter() - time_wall, time.process_time() - time_cpu
+        profile = (
+            time_wall,
+            time_cpu,
+            len(content),
+            [(test.time_wall, test.time_cpu, test.n_lines_inspected) for test in tests_worker],
+        )
+    result = (output.getvalue(), names_failed, counters, profile, fingerprints, issue_records)
+    if path_cache:
+        save_cached_result(path_cache, result)
+    return result
+
+
+def get_file_states(
+    paths: "list[str]", suffixes: "tuple[str, ...]", states_dirs: "Union[dict[str, int], None]" = None
+) -> "dict[str, tuple[int, int]]":
+    """Get modification times and sizes of files. Directories are searched recursively for files with given suffixes.
+
+    Modification times of searched directories are stored in states_dirs if provided.
+    """
+    states: dict[str, tuple[int, int]] = {}
+    for path in paths:
+        if os.path.isdir(path):
+            for dir_path, dir_names, file_names in os.walk(path):
+                dir_names[:] = [d for d in dir_names if not d.startswith(".")]  # Skip hidden directories.
+                if states_dirs is not None:
+                    try:
+                        states_dirs[dir_path] = os.stat(dir_path).st_mtime_ns
+                    except OSError:
+                        continue
+                for name in file_names:
+                    if name.endswith(suffixes):
+                        path_file = os.path.join(dir_path, name)
+                        try:
+                            stat = os.stat(path_file)
+                        except OSError:
+                            continue
+                        states[path_file] = (stat.st_mtime_ns, stat.st_size)
+        elif path.endswith(suffixes):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            states[path] = (stat.st_mtime_ns, stat.st_size)
+    return states
+
+
+def update_file_states(
+    states: "dict[str, tuple[int, int]]", states_dirs: "dict[str, int]", paths: "list[str]", suffixes: "tuple[str, ...]"
+) -> "dict[str, tuple[int, int]]":
+    """Get modification times and sizes of known files.
+
+    Directories are searched again only if some of them changed (i.e. files were added, removed or renamed).
+    """
+    for dir_path, mtime in states_dirs.items():
+        try:
+            changed = os.stat(dir_path).st_mtime_ns != mtime
+        except OSError:
+            changed = True
+        if changed:
+            states_dirs.clear()
+            return get_file_states(paths, suffixes, states_dirs)
+    paths_files = [path for path in paths if not os.path.isdir(path) and path.endswith(suffixes)]
+    states_new: dict[str, tuple[int, int]] = {}
+    for path in dict.fromkeys([*states, *paths_files]):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        states_new[path] = (stat.st_mtime_ns, stat.st_size)
+    return states_new
+
+
+class Inotify:
+    """Notification of changes in directories with inotify (Linux)"""
+
+    flags_init = os.O_NONBLOCK | os.O_CLOEXEC
+    # modification, attributes, closing after writing, moving from and to, creation, deletion
+    mask = 0x2 | 0x4 | 0x8 | 0x40 | 0x80 | 0x100 | 0x200
+
+    def __init__(self) -> None:
+        """Initialise inotify. Raise OSError if not available."""
+        if not sys.platform.startswith("linux") or not (name_libc := ctypes.util.find_library("c")):
+            raise OSError("inotify is not available")
+        self.libc = ctypes.CDLL(name_libc, use_errno=True)
+        self.fd = self.libc.inotify_init1(self.flags_init)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "Failed to initialise inotify")
+        self.directories: set[str] = set()  # watched directories
+
+    def add(self, directories: "list[str]"):
+        """Watch directories. Raise OSError if a directory cannot be watched (e.g. too many watches)."""
+        for directory in directories:
+            if directory in self.directories:
+                continue
+            if self.libc.inotify_add_watch(self.fd, os.fsencode(directory), self.mask) < 0:
+                errno = ctypes.get_errno()
+                if os.path.isdir(directory):
+                    raise OSError(errno, f'Failed to watch directory "{directory}"')
+                continue  # removed meanwhile
+            self.directories.add(directory)
+
+    def wait(self, timeout: "Union[float, None]" = None):
+        """Wait for changes in watched directories (or for the timeout) and consume all notifications."""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return
+        while True:
+            try:
+                if not os.read(self.fd, 65536):
+                    break
+            except BlockingIOError:
+                break
+
+    def close(self):
+        """Stop watching."""
+        os.close(self.fd)
+
+
+def watch(paths: "list[str]", suffixes: "tuple[str, ...]", interval: float, file_info=sys.stdout):
+    """Lint files whenever they change until interrupted.
+
+    Tests are instantiated only once. Changes are detected by comparing modification times and sizes
+    of the found files and of the searched directories, whenever inotify reports a change in the directories
+    or, if inotify is not available, by polling at the given interval.
+    """
+    states: dict[str, tuple[int, int]] = {}  # states of linted files
+    states_dirs: dict[str, int] = {}  # modification times of searched directories
+    dirs_files = [os.path.dirname(path) or "." for path in paths if not os.path.isdir(path)]  # directories of files
+    try:
+        notifier: "Union[Inotify, None]" = Inotify()
+    except OSError:
+        notifier = None
+    if notifier:
+        print("Watching for changes with inotify. Press Ctrl+C to stop.", file=file_info)
+    else:
+        print(f"Watching for changes every {interval} s. Press Ctrl+C to stop.", file=file_info)
+    try:
+        while True:
+            retry = False  # Some files failed to be read.
+            if states_dirs or states:
+                states_new = update_file_states(states, states_dirs, paths, suffixes)
+            else:
+                states_new = get_file_states(paths, suffixes, states_dirs)
+            paths_changed = [
+                path
+                for path, state in states_new.items()
+                if states.get(path) != state and (matcher_worker is None or matcher_worker.get_tests(path))
+            ]
+            if paths_changed:
+                time_start = time.perf_counter()
+                find_config.cache_clear()  # Apply changes of configuration files.
+                find_config_path.cache_clear()
+                if symbol_index is not None:
+                    symbol_index.update(None if any(test.cross_file for test in tests_worker) else paths_changed)
+                n_failed = 0
+                for path in paths_changed:
+                    try:
+                        output, names_failed, _, _, _, records = lint_file_worker(path)
+                    except (OSError, UnicodeDecodeError):  # file being written
+                        output, names_failed, records = "", None, []
+                    if names_failed is None:
+                        del states_new[path]  # Retry in the next iteration.
+                        retry = True
+                        continue
+                    n_failed += bool(names_failed)
+                    print(output, end="", file=sys.stdout if output_format == "text" else file_info)
+                    for record in records:
+                        print(json.dumps(record))
+                time_lint = 1e3 * (time.perf_counter() - time_start)
+                print(
+                    f"Linted {len(paths_changed)} files in {time_lint:.0f} ms. Files with issues: {n_failed}.",
+                    file=file_info,
+                )
+                sys.stdout.flush()
+            states = states_new
+            if notifier:
+                try:
+                    notifier.add(list(states_dirs) + dirs_files)
+                except OSError as error:
+                    print(f"{error}. Polling every {interval} s.", file=file_info)
+                    notifier.close()
+                    notifier = None
+            if notifier:
+                notifier.wait(interval if retry else None)
+            else:
+                time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if notifier:
+            notifier.close()
+
+
+def get_sarif(tests: "list[TestSpec]", records: "list[dict]", summary: dict) -> dict:
+    """Get a SARIF log of reported issues."""
+    rules = []
+    for test in tests:
+        rule = {
+            "id": test.name,
+            "shortDescription": {"text": test.message},
+            "fullDescription": {"text": test.rationale},
+            "defaultConfiguration": {"level": message_levels[test.severity_default]},
+        }
+        if test.references:
+            rule["helpUri"] = references[test.references[0]]["url"]
+        rules.append(rule)
+    indices_rules = {test.name: i for i, test in enumerate(tests)}
+    results = []
+    for record in records:
+        result = {
+            "ruleId": record["test"],
+            "ruleIndex": indices_rules[record["test"]],
+            "level": record["severity"],
+            "message": {"text": record["message"]},
+            "locations": [
+                {
+                    "physicalLocation": {
+                        "artifactLocation": {"uri": Path(record["path"]).as_posix()},
+                        "region": {"startLine": record["line"]},
+                    }
+                }
+            ],
+        }
+        if record["tolerated"]:
+            result["suppressions"] = [{"kind": "external", "justification": f"Tolerated in {file_config}"}]
+        results.append(result)
+    return {
+        "$schema": "https://json.schemastore.org/sarif-2.1.0.json",
+        "version": "2.1.0",
+        "runs": [
+            {
+                "tool": {"driver": {"name": "O2 linter", "rules": rules}},
+                "results": results,
+                "invocations": [{"executionSuccessful": True}],
+                "properties": {"summary": summary},
+            }
+        ],
+    }
+
+
+def get_profile_report(tests: "list[TestSpec]", profiles: "dict[str, FileProfile]") -> dict:
+    """Get the profile of tests and files ordered by the wall time."""
+    report_tests = []
+    for i, test in enumerate(tests):
+        report_tests.append(
+            {
+                "test": test.name,
+                "class": type(test).__name__,
+                "time_wall": sum(p[3][i][0] for p in profiles.values()),
+                "time_cpu": sum(p[3][i][1] for p in profiles.values()),
+                "lines_inspected": sum(p[3][i][2] for p in profiles.values()),
+                "matches": test.n_issues + test.n_tolerated,
+            }
+        )
+    report_files = [{"path": path, "time_wall": p[0], "time_cpu": p[1], "lines": p[2]} for path, p in profiles.items()]
+    return {
+        "time_wall": sum(p[0] for p in profiles.values()),
+        "time_cpu": sum(p[1] for p in profiles.values()),
+        "tests": sorted(report_tests, key=lambda r: r["time_wall"], reverse=True),
+        "files": sorted(report_files, key=lambda r: r["time_wall"], reverse=True),
+    }
+
+
+def print_profile(report: dict, n_files=10, file=sys.stdout):
+    """Print tables of tests and of the slowest files ranked by the wall time."""
+    print("\nProfile of tests (ranked by wall time)", file=file)
+    len_max = max(len(r["test"]) for r in report["tests"])
+    columns = "wall [ms]\tCPU [ms]\tshare [%]\tlines\tmatches\tper line [µs]"
+    print(f"test{' ' * (len_max - len('test'))}\t{columns}", file=file)
+    print("-" * len_max, file=file)
+    for r in report["tests"]:
+        share = 100 * r["time_wall"] / report["time_wall"] if report["time_wall"] else 0.0
+        per_line = 1e6 * r["time_wall"] / r["lines_inspected"] if r["lines_inspected"] else 0.0
+        print(
+            f"{r['test']}{' ' * (len_max - len(r['test']))}\t{1e3 * r['time_wall']:.1f}\t\t{1e3 * r['time_cpu']:.1f}"
+            f"\t\t{share:.1f}\t\t{r['lines_inspected']}\t{r['matches']}\t{per_line:.2f}",
+            file=file,
+        )
+    print("-" * len_max, file=file)
+    name_total = "total (files)"
+    print(
+        f"{name_total}{' ' * (len_max - len(name_total))}\t{1e3 * report['time_wall']:.1f}"
+        f"\t\t{1e3 * report['time_cpu']:.1f}",
+        file=file,
+    )
+    print("\nSlowest files\nwall [ms]\tCPU [ms]\tlines\tpath", file=file)
+    for r in report["files"][:n_files]:
+        print(f"{1e3 * r['time_wall']:.1f}\t\t{1e3 * r['time_cpu']:.1f}\t\t{r['lines']}\t{r['path']}", file=file)
+
+
 def main():
     """Main function"""
     parser = argparse.ArgumentParser(description="O2 linter (Find O2-specific issues in O2 code)")
-    parser.add_argument("paths", type=str, nargs="+", help="File path(s)")
+    parser.add_argument("paths", type=str, nargs="*", help="File path(s) (default with --diff: changed files)")
     parser.add_argument(
         "-g",
         dest="github",
         action="store_true",
         help="Print messages also as GitHub annotations",
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        dest="jobs",
+        type=int,
+        default=1,
+        help="Number of parallel processes (default = 1, use all CPUs if < 1)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        dest="no_cache",
+        action="store_true",
+        help="Do not use the cache of results of unchanged files",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        dest="cache_dir",
+        type=str,
+        default=get_cache_dir_default(),
+        help="Directory of the result cache (default = %(default)s)",
+    )
+    parser.add_argument(
+        "--cache-size",
+        dest="cache_size",
+        type=int,
+        default=100,
+        help="Maximum size of the result cache in MB (default = %(default)s)",
+    )
+    parser.add_argument(
+        "--diff",
+        dest="diff",
+        type=str,
+        help=(
+            "Report only issues on changed lines of changed files. "
+            'Changes are read from a unified diff file, from the standard input ("-") '
+            "or obtained with git diff against a given base revision."
+        ),
+    )
+    parser.add_argument(
+        "--format",
+        dest="format",
+        choices=["text", "json", "sarif"],
+        default="text",
+        help=(
+            "Output format of results (default = %(default)s). "
+            "json: JSON Lines with a record per issue followed by a summary record, sarif: SARIF 2.1.0 log. "
+            "Other messages are printed in the standard error output."
+        ),
+    )
+    parser.add_argument(
+        "--profile",
+        dest="profile",
+        action="store_true",
+        help="Measure time spent in tests and files and print the ranked profile (disables the cache)",
+    )
+    parser.add_argument(
+        "--profile-output",
+        dest="profile_output",
+        type=str,
+        help="Save the profile in a JSON file (implies --profile)",
+    )
+    parser.add_argument(
+        "--rules",
+        dest="rules",
+        type=str,
+        help=(
+            "Comma-separated names of tests, test name prefixes (e.g. pdg), groups (bad-practice, documentation, "
+            'naming, pwghf) or rule packs to enable, "all" for all tests and rule packs '
+            "(default: all built-in tests and rule packs from --rules-dir). "
+            "Opt-in tests (name/o2-device) are enabled only by their names or with all."
+        ),
+    )
+    parser.add_argument(
+        "--rules-dir",
+        dest="dirs_rules",
+        type=str,
+        action="append",
+        default=[],
+        help="Directory with rule packs (Python files providing get_tests()), can be repeated",
+    )
+    parser.add_argument(
+        "--no-index",
+        dest="no_index",
+        action="store_true",
+        help=(
+            "Do not index the repository (disables tests using entities declared in other files "
+            "and tests all lines with tests of declarations)"
+        ),
+    )
+    parser.add_argument(
+        "--baseline",
+        dest="baseline",
+        type=str,
+        help="Report only issues which are not in the baseline file with fingerprints of known issues",
+    )
+    parser.add_argument(
+        "--update-baseline",
+        dest="update_baseline",
+        action="store_true",
+        help="Report all issues and save their fingerprints in the baseline file",
+    )
+    parser.add_argument(
+        "--fix",
+        dest="fix",
+        action="store_true",
+        help="Fix issues which can be fixed automatically before testing",
+    )
+    parser.add_argument(
+        "--fix-dry-run",
+        dest="fix_dry_run",
+        action="store_true",
+        help="Print fixes of issues which can be fixed automatically as a unified diff without applying them",
+    )
+    parser.add_argument(
+        "--watch",
+        dest="watch",
+        action="store_true",
+        help="Keep running and lint files and files in directories whenever they change",
+    )
+    parser.add_argument(
+        "--watch-interval",
+        dest="watch_interval",
+        type=float,
+        default=0.05,
+        help=(
+            "Interval of polling for changes in the watch mode in seconds if inotify is not available "
+            "(default = %(default)s, for results within about 100 ms after saving a file)"
+        ),
+    )
     args = parser.parse_args()
+    if not (args.paths or args.diff):
+        parser.error("Provide file path(s)")
+    if args.watch and (args.diff or args.format == "sarif"):
+        parser.error("--watch cannot be combined with --diff or --format sarif")
+    if (args.fix or args.fix_dry_run) and (args.diff or args.watch):
+        parser.error("--fix and --fix-dry-run cannot be combined with --diff or --watch")
+    if args.update_baseline and (not args.baseline or args.watch):
+        parser.error("--update-baseline requires --baseline and cannot be combined with --watch")
+    global github_mode, output_format  # pylint: disable=global-statement  # noqa: PLW0603
     if args.github:
-        global github_mode  # pylint: disable=global-statement  # noqa: PLW0603
         github_mode = True
+    output_format = args.format
+    file_info = sys.stdout if output_format == "text" else sys.stderr  # output of messages other than results
 
-    tests: list[TestSpec] = []  # list of activated tests
-
-    # Bad practice
-    enable_bad_practice = True
-    if enable_bad_practice:
-        tests.append(TestIoStream())
-        tests.append(TestUsingStd())
-        tests.append(TestUsingDirective())
-        tests.append(TestStdPrefix())
-        tests.append(TestRootEntity())
-        tests.append(TestRootLorentzVector())
-        tests.append(TestPi())
-        tests.append(TestTwoPiAddSubtract())
-        tests.append(TestPiMultipleFraction())
-        tests.append(TestPdgDatabase())
-        tests.append(TestPdgExplicitCode())
-        tests.append(TestPdgExplicitMass())
-        tests.append(TestPdgKnownMass())
-        tests.append(TestLogging())
-        tests.append(TestConstRefInForLoop())
-        tests.append(TestConstRefInSubscription())
-        tests.append(TestWorkflowOptions())
-        tests.append(TestMagicNumber())
-
-    # Documentation
-    enable_documentation = True
-    if enable_documentation:
-        tests.append(TestDocumentationFile())
-
-    # Naming conventions
-    enable_naming = True
-    if enable_naming:
-        tests.append(TestNameFunctionVariable())
-        tests.append(TestNameMacro())
-        tests.append(TestNameConstant())
-        tests.append(TestNameColumn())
-        tests.append(TestNameTable())
-        tests.append(TestNameNamespace())
-        tests.append(TestNameType())
-        tests.append(TestNameEnum())
-        tests.append(TestNameClass())
-        tests.append(TestNameStruct())
-        tests.append(TestNameFileCpp())
-        tests.append(TestNameFilePython())
-        tests.append(TestNameWorkflow())
-        tests.append(TestNameTask())
-        tests.append(TestNameFileWorkflow())
-        tests.append(TestNameConfigurable())
-
-    # PWG-HF
-    enable_pwghf = True
-    if enable_pwghf:
-        tests.append(TestHfNameStructClass())
-        tests.append(TestHfNameFileTask())
-        tests.append(TestHfStructMembers())
+    rules = [rule.strip() for rule in args.rules.split(",") if rule.strip()] if args.rules else None
+    tests = create_tests(rules, args.dirs_rules)
 
     test_names = [t.name for t in tests]  # short names of activated tests
     suffixes = tuple({s for test in tests for s in test.suffixes})  # all suffixes from all enabled tests
     passed = True  # global result of all tests
     n_files_bad = dict.fromkeys(test_names, 0)  # counter of files with issues
 
+    # Get changed lines.
+    paths = args.paths
+    lines_changed = None
+    if args.diff:
+        lines_changed = parse_diff(get_diff(args.diff))
+        paths = [path for path in (paths or list(lines_changed)) if os.path.normpath(path) in lines_changed]
+        n_lines_changed = sum(len(lines) for lines in lines_changed.values())
+        print(f"Testing only changed lines ({n_lines_changed}).", file=file_info)
+
     # Report overview before running.
-    print(f"Testing {len(args.paths)} files.")
+    print(f"Testing {len(paths)} files.", file=file_info)
     # print(args.paths)
-    print("Enabled tests:", test_names)
-    print("Suffixes of tested files:", sorted(suffixes))
+    print("Enabled tests:", test_names, file=file_info)
+    print("Suffixes of tested files:", sorted(suffixes), file=file_info)
     # print(f"Github annotations: {github_mode}.")
 
-    # Test files.
-    for path in args.paths:
-        # print(f"Processing path \"{path}\".")
-        # Skip not tested files.
-        if not path.endswith(suffixes):
-            # print(f"Skipping path \"{path}\".")
-            continue
-        try:
-            with open(path, encoding="utf-8") as file:
-                tolerated_tests = get_tolerated_tests(path)
-                content = file.readlines()
-                for test in tests:
-                    test.tolerated = test.name in tolerated_tests
-                    result = test.run(path, content)
-                    if not result:
-                        n_files_bad[test.name] += 1
-                        passed = False
-                    # print(f"File \"{path}\" {'passed' if result else 'failed'} the test {test.name}.")
-        except OSError:
-            print(f'Failed to open file "{path}".')
-            sys.exit(1)
+    # Fix files.
+    if args.fix or args.fix_dry_run:
+        paths_fix = [path for path in paths if path.endswith(suffixes)]
+        fix_files(paths_fix, create_tests(rules, args.dirs_rules), args.fix_dry_run, file_info)
+
+    # Index the repository for cross-file tests or only the tested files for tests of declarations.
+    index = None
+    use_index = not args.no_index and any(test.cross_file or test.entities for test in tests)
+    if use_index and paths and (dir_root := get_repository_root(paths[0])):
+        path_store = ""
+        if not args.no_cache:
+            path_store = os.path.join(args.cache_dir, f"index-{hashlib.sha256(dir_root.encode()).hexdigest()}.index")
+        index = SymbolIndex(dir_root, path_store)
+        index.load(get_linter_hash())
+        n_indexed = index.update(None if any(test.cross_file for test in tests) else paths)
+        print(f"Indexed {n_indexed} new or changed files of {len(index.files)} in {dir_root}.", file=file_info)
+
+    # Load known issues.
+    baseline_known = None
+    if args.baseline and not args.update_baseline:
+        baseline_known = load_baseline(args.baseline)
+        print(f"Reporting only issues not in the baseline {args.baseline} ({len(baseline_known)}).", file=file_info)
 
+    # Test files.
+    if args.watch:
+        dir_cache = "" if args.no_cache else args.cache_dir
+        init_worker(github_mode, dir_cache, None, output_format, False, index, rules, args.dirs_rules, baseline_known)
+        watch(paths, suffixes, args.watch_interval, file_info)
+        return
+    matcher = PathMatcher(tests)
+    paths = [path for path in paths if matcher.get_tests(path)]  # Skip files without applicable tests.
+    n_jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    profile = args.profile or bool(args.profile_output)
+    dir_cache = "" if args.no_cache or profile else args.cache_dir  # Cached results have no profile.
+    records: list[dict] = []  # issue records for the SARIF log
+    profiles: dict[str, FileProfile] = {}  # profiles of files
+    fingerprints_all: list[str] = []  # fingerprints of all issues (if updating the baseline)
+    args_worker = (
+        github_mode,
+        dir_cache,
+        lines_changed,
+        output_format,
+        profile,
+        index,
+        rules,
+        args.dirs_rules,
+        baseline_known,
+        args.update_baseline,
+    )
+    executor = None
+    if n_jobs > 1 and len(paths) > 1:
+        executor = ProcessPoolExecutor(max_workers=n_jobs, initializer=init_worker, initargs=args_worker)
+        chunk_size = max(1, len(paths) // (4 * n_jobs))
+        results = executor.map(lint_file_worker, paths, chunksize=chunk_size)
+    else:
+        init_worker(*args_worker)
+        results = map(lint_file_worker, paths)
+    try:
+        # Results are collected in the order of paths to keep the output stable.
+        for path, result in zip(paths, results):
+            output, names_failed, counters, profile_file, fingerprints_file, records_file = result
+            if output_format == "text":
+                print(output, end="")
+            else:
+                # Keep the standard output for issue records.
+                print(output, end="", file=file_info)
+                if output_format == "json":
+                    for record in records_file:
+                        print(json.dumps(record))
+                else:
+                    records += records_file
+            if names_failed is None:
+                print(f'Failed to open file "{path}".', file=file_info)
+                sys.exit(1)
+            for test, (n_issues, n_disabled, n_tolerated, n_baseline) in zip(tests, counters):
+                test.n_issues += n_issues
+                test.n_disabled += n_disabled
+                test.n_tolerated += n_tolerated
+                test.n_baseline += n_baseline
+            fingerprints_all += fingerprints_file
+            for name in names_failed:
+                n_files_bad[name] += 1
+                passed = False
+            if profile_file:
+                profiles[path] = profile_file
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+    if dir_cache and os.path.isdir(dir_cache):
+        prune_cache(dir_cache, args.cache_size * 1024**2)
+
+    # global counters
+    n_issues = sum(test.n_issues for test in tests)
+    n_disabled = sum(test.n_disabled for test in tests)
+    n_tolerated = sum(test.n_tolerated for test in tests)
+    n_baseline = sum(test.n_baseline for test in tests)
+
+    # Report known issues.
+    if args.update_baseline:
+        save_baseline(args.baseline, fingerprints_all)
+        n_fingerprints = len(set(fingerprints_all))
+        print(f"Saved {n_fingerprints} fingerprints of issues in the baseline {args.baseline}.", file=file_info)
+    elif baseline_known is not None:
+        print(f"Known issues from the baseline: {n_baseline}", file=file_info)
+
+    # Report results in a machine-readable format.
+    if output_format != "text":
+        summary = {
+            "type": "summary",
+            "passed": passed,
+            "n_files": len(paths),
+            "n_issues": n_issues,
+            "n_tolerated": n_tolerated,
+            "n_disabled": n_disabled,
+            "n_baseline": n_baseline,
+            "tests": [
+                {
+                    "test": test.name,
+                    "issues": test.n_issues,
+                    "tolerated": test.n_tolerated,
+                    "disabled": test.n_disabled,
+                    "bad_files": n_files_bad[test.name],
+                }
+                for test in tests
+                if any(n > 0 for n in (test.n_issues, test.n_disabled, test.n_tolerated, n_files_bad[test.name]))
+            ],
+        }
+        if output_format == "json":
+            print(json.dumps(summary))
+        else:
+            print(json.dumps(get_sarif(tests, records, summary), indent=2))
     # Report results for tests that failed or were disabled or were tolerated.
-    n_issues, n_disabled, n_tolerated = 0, 0, 0  # global counters
-    if not passed or any(n > 0 for n in (test.n_disabled + test.n_tolerated for test in tests)):
+    elif not passed or any(n > 0 for n in (test.n_disabled + test.n_tolerated for test in tests)):
         print("\nResults for failed, tolerated and disabled tests")
         len_max = max(len(name) for name in test_names)
         print(f"test{' ' * (len_max - len('test'))}\tissues\ttolerated\tdisabled\tbad files\trationale")
@@ -1736,9 +3511,6 @@ def main():
                     f"{test.name}{' ' * (len_max - len(test.name))}\t{test.n_issues}\t{test.n_tolerated}"
                     f"\t\t{test.n_disabled}\t\t{n_files_bad[test.name]}\t\t{test.rationale} {ref_ids}"
                 )
-            n_issues += test.n_issues
-            n_disabled += test.n_disabled
-            n_tolerated += test.n_tolerated
         print("-" * len_max)
         # Print the totals.
         name_total = "total"
@@ -1750,29 +3522,43 @@ def main():
             if ref_name in ref_names:
                 print(f"[{ref_name.value}]\t{data['title']}. <{data['url']}>.")
 
+    # Report the profile.
+    if profile and profiles:
+        report_profile = get_profile_report(tests, profiles)
+        print_profile(report_profile, file=file_info)
+        if args.profile_output:
+            try:
+                with open(args.profile_output, "w", encoding="utf-8") as file:
+                    json.dump(report_profile, file, indent=2)
+            except OSError as error:
+                print(f'Failed to write the profile in "{args.profile_output}". {error}', file=file_info)
+
     # Report global result.
-    title_result = "O2 linter result"
-    if passed:
-        msg_result = "All tests passed."
-        if github_mode:
-            print(f"\n::notice title={title_result}::{msg_result}")
-        else:
-            print(f"\n{title_result}: {msg_result}")
-    else:
-        msg_result = "Issues have been found."
-        msg_disable = (
-            f'Exceptionally, you can disable a test for a line by adding a comment with "{prefix_disable}"'
-            " followed by the name of the test and parentheses with a reason for the exception."
-        )
-        msg_tolerate = f'To tolerate certain issues in a directory, add a line with the test name in "{file_config}".'
-        if github_mode:
-            print(f"\n::error title={title_result}::{msg_result}")
-            print(f"::notice::{msg_disable}")
-            print(f"::notice::{msg_tolerate}")
+    if output_format == "text":
+        title_result = "O2 linter result"
+        if passed:
+            msg_result = "All tests passed."
+            if github_mode:
+                print(f"\n::notice title={title_result}::{msg_result}")
+            else:
+                print(f"\n{title_result}: {msg_result}")
         else:
-            print(f"\n{title_result}: {msg_result}")
-            print(msg_disable)
-            print(msg_tolerate)
+            msg_result = "Issues have been found."
+            msg_disable = (
+                f'Exceptionally, you can disable a test for a line by adding a comment with "{prefix_disable}"'
+                " followed by the name of the test and parentheses with a reason for the exception."
+            )
+            msg_tolerate = (
+                f'To tolerate certain issues in a directory, add a line with the test name in "{file_config}".'
+            )
+            if github_mode:
+                print(f"\n::error title={title_result}::{msg_result}")
+                print(f"::notice::{msg_disable}")
+                print(f"::notice::{msg_tolerate}")
+            else:
+                print(f"\n{title_result}: {msg_result}")
+                print(msg_disable)
+                print(msg_tolerate)
 
     # Make results available to the GitHub actions.
     if github_mode:
@@ -1782,10 +3568,14 @@ def main():
                 print(f"n_disabled={n_disabled}", file=fh)
                 print(f"n_tolerated={n_tolerated}", file=fh)
         except KeyError:
-            print("Skipping writing in GITHUB_OUTPUT.")
+            print("Skipping writing in GITHUB_OUTPUT.", file=file_info)
 
     # Print tips.
-    print("\nTip: You can run the O2 linter locally from the O2Physics directory with: python3 Scripts/o2_linter.py <files>")
+    if output_format == "text":
+        print(
+            "\nTip: You can run the O2 linter locally from the O2Physics directory with: "
+            "python3 Scripts/o2_linter.py <files>"
+        )
 
     if not passed:
         sys.exit(1)
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+
+# Copyright 2019-2020 CERN and copyright holders of ALICE O2.
+# See https://alice-o2.web.cern.ch/copyright for details of the copyright holders.
+# All rights not expressly granted are reserved.
+#
+# This software is distributed under the terms of the GNU General Public
+# License v3 (GPL Version 3), copied verbatim in the file "COPYING".
+#
+# In applying this license CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""!
+@brief  Benchmark of the O2 linter
+
+Measures the performance of the O2 linter on a corpus of real files (optionally a random sample) and synthetic files.
+- Throughput (files and lines per second) of all tests and of each test, which can be saved as a baseline
+  and compared with it on the same files to detect slowdowns
+- Time per line of test_line with and without the prefilter of required strings (literals)
+- Time per line of regular expression searches with precompiled patterns and with patterns compiled at call time
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import time
+import timeit
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import o2_linter  # noqa: E402 # pylint: disable=wrong-import-position
+
+# snippets of synthetic files (with {i} replaced by a number)
+snippets_synthetic = [
+    '  Configurable<float> ptMin{{"ptMin", 0.{i}f, "Minimum pT"}};\n',
+    '  Configurable<int> nBins{i}{{"nBins{i}", 100, "Number of bins"}};\n',
+    "  Produces<aod::HfCand{i}> rowCand{i};\n",
+    '  HistogramRegistry registry{{"registry"}};\n',
+    "  // Comment about the selection {i}\n",
+    "    double phi{i} = std::atan2(py, px) + o2::constants::math::PI;\n",
+    "    float mass{i} = TMath::Sqrt(e * e - p * p);\n",
+    "    if (std::abs(track.eta()) > 0.8) {{\n      continue;\n    }}\n",
+    '    for (const auto& track : tracks) {{\n      registry.fill(HIST("hPt"), track.pt());\n    }}\n',
+    '    for (auto& candidate : candidates) {{\n      LOGF(info, "Candidate %d", {i});\n    }}\n',
+    "    std::vector<float> values{i} = {{0.{i}, 1.{i}}};\n",
+    "    if (pdg == 211) {{\n      nPions++;\n    }}\n",
+    "    auto massPi = o2::constants::physics::MassPiPlus;\n",
+    '    printf("value %d\\n", {i});\n',
+]
+
+
+def generate_synthetic_files(n_files: int, n_lines: int, seed: int) -> "list[tuple[str, list[str]]]":
+    """Generate task files with random snippets of O2 code (in PWGHF to be tested by all tests)."""
+    rng = random.Random(seed)
+    files = []
+    for i_file in range(n_files):
+        name = f"taskSynthetic{i_file}"
+        lines = [
+            "// Copyright 2019-2020 CERN and copyright holders of ALICE O2.\n",
+            f"/// \\file {name}.cxx\n",
+            "/// \\brief Synthetic task\n",
+            "/// \\author O2 linter benchmark\n",
+            "\n",
+            '#include "Framework/AnalysisTask.h"\n',
+            "\n",
+            "using namespace o2;\n",
+            "using namespace o2::framework;\n",
+            "\n",
+            f"struct HfTaskSynthetic{i_file} {{\n",
+        ]
+        while len(lines) < n_lines:
+            lines += rng.choice(snippets_synthetic).format(i=rng.randrange(100)).splitlines(keepends=True)
+            if rng.random() < 0.05:
+                lines += ["\n", f"  void process{len(lines)}(aod::Tracks const& tracks)\n", "  {\n", "  }\n"]
+        lines += [
+            "};\n",
+            "\n",
+            "WorkflowSpec defineDataProcessing(ConfigContext const& cfgc)\n",
+            "{\n",
+            f"  return WorkflowSpec{{adaptAnalysisTask<HfTaskSynthetic{i_file}>(cfgc)}};\n",
+            "}\n",
+        ]
+        files.append((f"PWGHF/Tasks/{name}.cxx", lines))
+    return files
+
+
+def find_files(paths: "list[str]", suffixes: "tuple[str, ...]") -> "list[str]":
+    """Get file paths. Directories are searched recursively for files with given suffixes."""
+    files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append(path)
+            continue
+        for dir_path, dir_names, file_names in os.walk(path):
+            dir_names[:] = sorted(d for d in dir_names if not d.startswith("."))
+            files += [os.path.join(dir_path, name) for name in sorted(file_names) if name.endswith(suffixes)]
+    return files
+
+
+def load_files(paths: "list[str]") -> "list[tuple[str, list[str]]]":
+    """Load lines of files."""
+    files = []
+    for path in paths:
+        try:
+            with open(path, encoding="utf-8") as file:
+                files.append((path, file.readlines()))
+        except (OSError, UnicodeDecodeError):
+            print(f'Failed to read file "{path}".')
+    return files
+
+
+def get_file_set(files: "list[tuple[str, list[str]]]") -> dict:
+    """Get the identity of a set of files: numbers of files and lines and the hash of sorted paths."""
+    paths = sorted(path for path, _ in files)
+    return {
+        "n_files": len(files),
+        "n_lines": sum(len(lines) for _, lines in files),
+        "hash_paths": hashlib.sha256("\n".join(paths).encode()).hexdigest(),
+    }
+
+
+def measure_throughput(files: "list[tuple[str, list[str]]]", n_repeat: int) -> dict:
+    """Measure the throughput of all tests and of each test (median of repetitions).
+
+    The total throughput is measured without profiling. The throughput of a test is measured on files
+    the test applies to, with the time spent in the test (excluding the shared preprocessing of lines).
+    """
+    tests = o2_linter.create_tests()
+    matcher = o2_linter.PathMatcher(tests)
+    files_tests = [(path, lines, matcher.get_tests(path)) for path, lines in files]
+    n_lines = sum(len(lines) for _, lines, _ in files_tests)
+    times_total = []
+    times_tests: "list[list[float]]" = [[] for _ in tests]
+    for _ in range(n_repeat):
+        for profile in (False, True):
+            tests = o2_linter.create_tests()
+            if profile:
+                for test in tests:
+                    o2_linter.profile_test(test)
+            tests_by_name = {test.name: test for test in tests}
+            time_start = time.perf_counter()
+            with redirect_stdout(io.StringIO()):
+                for path, lines, tests_file in files_tests:
+                    o2_linter.run_tests(path, lines, [tests_by_name[test.name] for test in tests_file], [])
+            if profile:
+                for times, test in zip(times_tests, tests):
+                    times.append(test.time_wall)
+            else:
+                times_total.append(time.perf_counter() - time_start)
+    time_total = statistics.median(times_total)
+    report: dict = {
+        "n_files": len(files),
+        "n_lines": n_lines,
+        "files": get_file_set(files),
+        "total": {"time": time_total, "files_per_s": len(files) / time_total, "lines_per_s": n_lines / time_total},
+        "tests": {},
+    }
+    for test, times in zip(tests, times_tests):
+        files_test = [lines for _, lines, tests_file in files_tests if test.name in (t.name for t in tests_file)]
+        if not files_test or not (time_test := statistics.median(times)):
+            continue
+        report["tests"][test.name] = {
+            "time": time_test,
+            "files_per_s": len(files_test) / time_test,
+            "lines_per_s": sum(len(lines) for lines in files_test) / time_test,
+        }
+    return report
+
+
+def print_throughput(report: dict, baseline: "dict | None" = None):
+    """Print the throughput (and the ratio to the baseline)."""
+    tests = report["tests"]
+    len_max = max([len("total")] + [len(name) for name in tests])
+    print(f"\nThroughput on {report['n_files']} files with {report['n_lines']} lines")
+    print(f"test{' ' * (len_max - len('test'))}\ttime [ms]\tfiles/s\tklines/s\tratio to baseline")
+    print("-" * len_max)
+    rows = [("total", report["total"], baseline["total"] if baseline else None)]
+    rows += [(name, tests[name], (baseline or {}).get("tests", {}).get(name)) for name in tests]
+    for name, values, values_base in rows:
+        ratio = f"{values['lines_per_s'] / values_base['lines_per_s']:.2f}" if values_base else ""
+        print(
+            f"{name}{' ' * (len_max - len(name))}\t{1e3 * values['time']:.1f}\t\t"
+            f"{values['files_per_s']:.0f}\t{values['lines_per_s'] / 1e3:.0f}\t\t{ratio}"
+        )
+
+
+def get_regressions(report: dict, baseline: dict, threshold: float, time_min: float) -> "list[str]":
+    """Get descriptions of throughput drops larger than the threshold (relative) with respect to the baseline.
+
+    The total throughput is always compared. Tests measured for less than the minimum time (in s)
+    in the baseline are not compared because their timing is dominated by noise.
+    """
+    regressions = []
+    rows = [("total", report["total"], baseline["total"])]
+    rows += [(name, values, baseline["tests"].get(name)) for name, values in report["tests"].items()]
+    for name, values, values_base in rows:
+        if not values_base or (name != "total" and values_base["time"] < time_min):
+            continue
+        ratio = values["lines_per_s"] / values_base["lines_per_s"]
+        if ratio < 1 - threshold:
+            regressions.append(f"{name}: {ratio:.2f} of the baseline throughput")
+    return regressions
+
+
+def prepare_lines(lines: "list[str]", test: o2_linter.TestSpec) -> "list[str]":
+    """Prepare lines the way they are passed to the test by the linter."""
+    lines_test = []
+    for line in lines:
+        line_stripped = line.strip()
+        if not line_stripped or line_stripped.startswith(("//", "/*")):
+            continue
+        if test.strip_comments:
+            lines_test.append(o2_linter.remove_comment_cpp(line_stripped))
+        elif test.keep_indentation:
+            lines_test.append(line)
+        else:
+            lines_test.append(line_stripped)
+    return lines_test
+
+
+def get_patterns(test: o2_linter.TestSpec) -> "list[re.Pattern]":
+    """Get all precompiled regular expressions of a test."""
+    patterns = []
+    names = {name for cls in type(test).__mro__ for name in vars(cls)} | set(vars(test))
+    for name in sorted(names):
+        value = getattr(test, name)
+        for item in value if isinstance(value, list) else [value]:
+            if isinstance(item, re.Pattern):
+                patterns.append(item)
+    return patterns
+
+
+def time_per_line(func, n_lines: int, n_repeat: int) -> float:
+    """Get the best time per line in ns."""
+    if not n_lines:
+        return 0.0
+    return min(timeit.repeat(func, number=1, repeat=n_repeat)) / n_lines * 1e9
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Benchmark of the O2 linter")
+    parser.add_argument("paths", type=str, nargs="*", help="File and directory path(s)")
+    parser.add_argument(
+        "-n", dest="repeat", type=int, default=5, help="Number of repetitions of per-line measurements (default = 5)"
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=11,
+        help="Number of runs of the throughput measurement, the median is used (default = 11)",
+    )
+    parser.add_argument("--sample", type=int, help="Number of randomly sampled files from the paths")
+    parser.add_argument("--synthetic", type=int, default=0, help="Number of synthetic files (default = 0)")
+    parser.add_argument(
+        "--synthetic-lines", type=int, default=500, help="Number of lines of synthetic files (default = 500)"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random sampling and generation (default = 0)")
+    parser.add_argument("--save-baseline", dest="path_save", type=str, help="Save the throughput as a baseline")
+    parser.add_argument("--baseline", dest="path_baseline", type=str, help="Compare the throughput with a baseline")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Maximum tolerated relative drop of throughput with respect to the baseline (default = 0.1)",
+    )
+    parser.add_argument(
+        "--min-time",
+        dest="time_min",
+        type=float,
+        default=0.05,
+        help="Minimum time [s] of a test in the baseline to be compared (default = 0.05)",
+    )
+    parser.add_argument("--no-micro", dest="micro", action="store_false", help="Skip the per-line measurements")
+    args = parser.parse_args()
+
+    paths = find_files(args.paths, (".cxx", ".h"))
+    if args.sample is not None and args.sample < len(paths):
+        paths = sorted(random.Random(args.seed).sample(paths, args.sample))
+    files = load_files(paths) + generate_synthetic_files(args.synthetic, args.synthetic_lines, args.seed)
+    if not files:
+        print("No files to benchmark.")
+        sys.exit(1)
+    baseline = None
+    if args.path_baseline:
+        try:
+            with open(args.path_baseline, encoding="utf-8") as file:
+                baseline = json.load(file)
+        except (OSError, json.JSONDecodeError) as exc:
+            print(f'Failed to load the baseline "{args.path_baseline}": {exc}')
+            sys.exit(1)
+        # Throughputs on different files cannot be compared.
+        if (files_base := baseline.get("files")) != (files_set := get_file_set(files)):
+            print(f'The baseline "{args.path_baseline}" was measured on different files.')
+            print(f"Baseline: {files_base}\nCurrent: {files_set}")
+            sys.exit(1)
+    lines = [line for _, lines_file in files for line in lines_file]
+    print(f"Benchmarking with {len(lines)} lines from {len(files)} files ({args.synthetic} synthetic).")
+
+    report = measure_throughput(files, args.runs)
+    print_throughput(report, baseline)
+    if args.path_save:
+        with open(args.path_save, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+        print(f'\nSaved the baseline in "{args.path_save}".')
+    regressions = get_regressions(report, baseline, args.threshold, args.time_min) if baseline else []
+
+    if args.micro:
+        benchmark_lines(lines, args.repeat)
+
+    if regressions:
+        print(f"\nThroughput dropped by more than {100 * args.threshold:.0f} % with respect to the baseline:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+
+
+def benchmark_lines(lines: "list[str]", n_repeat: int):
+    """Print the time per line of the per-line tests with variants of the implementation."""
+    tests = [test for test in o2_linter.create_tests() if test.per_line]
+    len_max = max(len(test.name) for test in tests)
+
+    print("\nTime per line [ns]: test_line without and with the prefilter")
+    print(f"test{' ' * (len_max - len('test'))}\tall\tfiltered\tspeed-up")
+    print("-" * len_max)
+    for test in tests:
+        lines_test = prepare_lines(lines, test)
+        literals = test.literals
+
+        def run_all(test=test, lines_test=lines_test):
+            for line in lines_test:
+                test.test_line(line)
+
+        def run_filtered(test=test, lines_test=lines_test, literals=literals):
+            for line in lines_test:
+                if literals:
+                    for literal in literals:
+                        if literal in line:
+                            break
+                    else:
+                        continue
+                test.test_line(line)
+
+        t_all = time_per_line(run_all, len(lines_test), n_repeat)
+        t_filtered = time_per_line(run_filtered, len(lines_test), n_repeat)
+        speedup = t_all / t_filtered if t_filtered else 0.0
+        print(f"{test.name}{' ' * (len_max - len(test.name))}\t{t_all:.0f}\t{t_filtered:.0f}\t\t{speedup:.1f}")
+
+    print("\nTime per line [ns]: regular expressions compiled at call time and precompiled")
+    print(f"test{' ' * (len_max - len('test'))}\tcall\tprecompiled\tspeed-up")
+    print("-" * len_max)
+    for test in tests:
+        if not (patterns := get_patterns(test)):
+            continue
+        lines_test = prepare_lines(lines, test)
+
+        def run_call(patterns=patterns, lines_test=lines_test):
+            for line in lines_test:
+                for pattern in patterns:
+                    re.search(pattern.pattern, line)
+
+        def run_compiled(patterns=patterns, lines_test=lines_test):
+            for line in lines_test:
+                for pattern in patterns:
+                    pattern.search(line)
+
+        t_call = time_per_line(run_call, len(lines_test), n_repeat)
+        t_compiled = time_per_line(run_compiled, len(lines_test), n_repeat)
+        speedup = t_call / t_compiled if t_compiled else 0.0
+        print(f"{test.name}{' ' * (len_max - len(test.name))}\t{t_call:.0f}\t{t_compiled:.0f}\t\t{speedup:.1f}")
+
+
+if __name__ == "__main__":
+    main()
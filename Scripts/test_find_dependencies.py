@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+# Copyright 2019-2020 CERN and copyright holders of ALICE O2.
+# See https://alice-o2.web.cern.ch/copyright for details of the copyright holders.
+# All rights not expressly granted are reserved.
+#
+# This software is distributed under the terms of the GNU General Public
+# License v3 (GPL Version 3), copied verbatim in the file "COPYING".
+#
+# In applying this license CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""!
+@brief  Tests of find_dependencies
+
+Run with: python3 -m pytest Scripts/test_find_dependencies.py
+"""
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import find_dependencies  # noqa: E402
+
+
+def get_binding(origin: str, description: str, subspec=0) -> dict:
+    """Get an input or output of a device as in the JSON file of a workflow."""
+    metadata = [{"name": "option", "type": "Int", "defaultValue": "0", "help": "help"}]
+    return {
+        "binding": description.lower(),
+        "origin": origin,
+        "description": description,
+        "subspec": subspec,
+        "metadata": metadata,
+    }
+
+
+specs = {
+    "workflow": [
+        {
+            "name": "hf-task",
+            "inputs": [get_binding("AOD", "HFCAND"), get_binding("DPL", "ENUM"), get_binding("AOD", "TRACK", 1)],
+            "outputs": [get_binding("ATSK", "HPT"), get_binding("AOD", "HFSEL")],
+            "options": [{"name": "ptMin", "type": "Float", "defaultValue": "0", "help": "Minimum pT"}],
+            "rank": 0,
+        },
+        {"name": "internal-dpl-aod-writer", "inputs": [get_binding("TFN", "TFNUMBER")], "outputs": []},
+    ],
+    "metadata": [{"name": "hf-task", "executable": "o2-analysis-hf-task", "channels": []}],
+}
+
+
+class TestLoadWorkflows(unittest.TestCase):
+    """Loading of workflows from JSON files"""
+
+    def setUp(self):
+        self.dir_tmp = tempfile.TemporaryDirectory()
+        self.dir_json = os.path.join(self.dir_tmp.name, "share", "dpl")
+        os.makedirs(self.dir_json)
+        self.path_json = os.path.join(self.dir_json, "o2-analysis-hf-task.json")
+        with open(self.path_json, "w", encoding="utf-8") as file:
+            json.dump(specs, file)
+
+    def tearDown(self):
+        self.dir_tmp.cleanup()
+
+    def test_project_spec(self):
+        with open(self.path_json, encoding="utf-8") as file:
+            specs_wf = json.load(file, object_hook=find_dependencies.project_spec)
+        self.assertEqual(list(specs_wf), ["workflow"])
+        self.assertEqual([dev["name"] for dev in specs_wf["workflow"]], ["hf-task", "internal-dpl-aod-writer"])
+        # Only AOD inputs and outputs are kept.
+        for dev in specs_wf["workflow"]:
+            for binding in dev["inputs"] + dev["outputs"]:
+                self.assertEqual(binding["origin"], "AOD")
+        dev = specs_wf["workflow"][0]
+        self.assertEqual(
+            dev["inputs"],
+            [
+                {"origin": "AOD", "description": "HFCAND", "subspec": 0},
+                {"origin": "AOD", "description": "TRACK", "subspec": 1},
+            ],
+        )
+        self.assertEqual(dev["outputs"], [{"origin": "AOD", "description": "HFSEL", "subspec": 0}])
+        self.assertEqual(specs_wf["workflow"][1]["inputs"], [])
+
+    def test_load_workflows(self):
+        workflow = {
+            "hf-task": {"inputs": ["HFCAND", "TRACK_001"], "outputs": ["HFSEL"]},
+            "internal-dpl-aod-writer": {"inputs": [], "outputs": []},
+        }
+        self.assertEqual(find_dependencies.load_workflow_from_json(self.path_json)[1], workflow)
+        with mock.patch.dict(os.environ, {"O2PHYSICS_ROOT": self.dir_tmp.name}):
+            path_cache = os.path.join(self.dir_tmp.name, "cache", "workflows.json")
+            for _ in range(2):  # without and with the cache
+                workflows = find_dependencies.load_workflows_from_json(path_cache)
+                self.assertEqual(workflows, {"o2-analysis-hf-task": workflow})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+
+# Copyright 2019-2020 CERN and copyright holders of ALICE O2.
+# See https://alice-o2.web.cern.ch/copyright for details of the copyright holders.
+# All rights not expressly granted are reserved.
+#
+# This software is distributed under the terms of the GNU General Public
+# License v3 (GPL Version 3), copied verbatim in the file "COPYING".
+#
+# In applying this license CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""!
+@brief  Tests of the O2 linter
+
+Run with: python3 -m pytest Scripts/test_o2_linter.py
+"""
+
+import io
+import os
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import o2_linter  # noqa: E402
+
+header = """namespace o2::aod
+{
+namespace hf_cand
+{
+DECLARE_SOA_COLUMN(Pt, pt, float);
+DECLARE_SOA_COLUMN(bad_eta, badEta, float);
+} // namespace hf_cand
+/*
+DECLARE_SOA_COLUMN(old_phi, oldPhi, float);
+*/
+DECLARE_SOA_TABLE(HfCands, "AOD", "HFCAND", hf_cand::Pt);
+DECLARE_SOA_TABLE(hf_cands_bad, "AOD", "HFCANDBAD", hf_cand::Pt);
+} // namespace o2::aod
+"""
+
+task_a = """struct HfTaskA {
+};
+
+WorkflowSpec defineDataProcessing(ConfigContext const& cfgc)
+{
+  return WorkflowSpec{adaptAnalysisTask<HfTaskA>(cfgc), adaptAnalysisTask<HfTaskShared>(cfgc)};
+}
+"""
+
+task_b = """struct HfTaskShared {
+};
+
+WorkflowSpec defineDataProcessing(ConfigContext const& cfgc)
+{
+  return WorkflowSpec{adaptAnalysisTask<HfTaskShared>(cfgc)};
+}
+"""
+
+task_c = """WorkflowSpec defineDataProcessing(ConfigContext const& cfgc)
+{
+  return WorkflowSpec{adaptAnalysisTask<HfTaskShared>(cfgc, TaskName{"hf-task-other"})};
+}
+"""
+
+cmake = """o2physics_add_dpl_workflow(task-a
+                    SOURCES taskA.cxx
+                    COMPONENT_NAME Analysis)
+"""
+
+
+class TestCreateTests(unittest.TestCase):
+    """Selection of tests"""
+
+    def get_names(self, rules=None) -> "list[str]":
+        return [test.name for test in o2_linter.create_tests(rules)]
+
+    def test_opt_in_disabled_by_default(self):
+        names = self.get_names()
+        self.assertIn("name/o2-table", names)
+        self.assertNotIn("name/o2-device", names)
+
+    def test_opt_in_disabled_by_group_and_prefix(self):
+        self.assertIn("name/o2-table", self.get_names(["naming"]))
+        self.assertNotIn("name/o2-device", self.get_names(["naming"]))
+        self.assertNotIn("name/o2-device", self.get_names(["name"]))
+
+    def test_opt_in_enabled_by_name(self):
+        self.assertEqual(self.get_names(["name/o2-device"]), ["name/o2-device"])
+        self.assertIn("name/o2-device", self.get_names(["all"]))
+
+
+class TestPathMatcher(unittest.TestCase):
+    """Selection of tests applicable to files"""
+
+    class TestTasksOnly(o2_linter.TestSpec):
+        """Test with a custom condition on paths"""
+
+        name = "tasks-only"
+        suffixes = [".cxx"]
+
+        def file_matches(self, path: str) -> bool:
+            return super().file_matches(path) and os.path.basename(path).startswith("task")
+
+    def test_declarative(self):
+        matcher = o2_linter.PathMatcher(o2_linter.create_tests(["name/file-python", "pwghf/name/task-file"]))
+        self.assertEqual([t.name for t in matcher.get_tests("PWGHF/Tasks/taskD0.cxx")], ["pwghf/name/task-file"])
+        self.assertEqual([t.name for t in matcher.get_tests("PWGLF/Tasks/taskD0.cxx")], [])
+        self.assertEqual([t.name for t in matcher.get_tests("Scripts/script.py")], ["name/file-python"])
+
+    def test_custom(self):
+        tests = o2_linter.create_tests(["std-prefix"]) + [self.TestTasksOnly()]
+        matcher = o2_linter.PathMatcher(tests)
+        self.assertEqual([t.name for t in matcher.get_tests("Tasks/taskA.cxx")], ["std-prefix", "tasks-only"])
+        self.assertEqual([t.name for t in matcher.get_tests("Tasks/helper.cxx")], ["std-prefix"])  # same directory
+        self.assertEqual([t.name for t in matcher.get_tests("Tasks/taskA.h")], ["std-prefix"])
+        for path in ("Tasks/taskA.cxx", "Tasks/helper.cxx", "Tasks/taskA.h"):
+            self.assertEqual(matcher.get_tests(path), [test for test in tests if test.file_matches(path)])
+
+
+class RepositoryTestCase(unittest.TestCase):
+    """Temporary repository with a data model, tasks and workflows"""
+
+    def setUp(self):
+        self.dir_tmp = tempfile.TemporaryDirectory()
+        self.dir_root = self.dir_tmp.name
+        os.mkdir(os.path.join(self.dir_root, ".git"))
+        self.write("DataModel/Cands.h", header)
+        self.write("Tasks/taskA.cxx", task_a)
+        self.write("Tasks/taskB.cxx", task_b)
+        self.write("Tasks/taskC.cxx", task_c)
+        self.write("Tasks/CMakeLists.txt", cmake)
+        self.index = o2_linter.SymbolIndex(self.dir_root)
+
+    def tearDown(self):
+        self.dir_tmp.cleanup()
+
+    def path(self, path: str) -> str:
+        return os.path.join(self.dir_root, path)
+
+    def write(self, path: str, text: str):
+        os.makedirs(os.path.dirname(self.path(path)), exist_ok=True)
+        with open(self.path(path), "w", encoding="utf-8") as file:
+            file.write(text)
+
+
+class TestSymbolIndex(RepositoryTestCase):
+    """Extraction and update of the symbol index"""
+
+    def test_extract(self):
+        entities = self.index.extract(header, "Cands.h")
+        self.assertEqual(entities["columns"], [["Pt", 5, "pt"], ["bad_eta", 6, "badEta"]])  # without comments
+        self.assertEqual(entities["tables"], [["HfCands", 11], ["hf_cands_bad", 12]])
+        entities = self.index.extract("DECLARE_SOA_COLUMN(Hf##_type_##Pt, hf##_type_##Pt, float);\n", "Macro.h")
+        self.assertEqual(entities["columns"], [["Hf##_type_##Pt", 1, "hf##_type_##Pt"]])
+        entities = self.index.extract(task_c, "taskC.cxx")
+        self.assertEqual(entities["tasks"], [])  # explicit task name
+        entities = self.index.extract(cmake, "CMakeLists.txt")
+        self.assertEqual(entities["workflows"], [["task-a", 1, "taskA.cxx"]])
+
+    def test_update(self):
+        self.assertEqual(self.index.update([self.path("Tasks/taskA.cxx")]), 1)  # only given files
+        self.assertEqual(list(self.index.files), [os.path.join("Tasks", "taskA.cxx")])
+        self.assertEqual(self.index.update(), 4)  # unchanged files are not indexed again
+        self.assertEqual(len(self.index.files), 5)
+        self.assertEqual(self.index.update(), 0)
+        os.remove(self.path("Tasks/taskC.cxx"))
+        self.assertEqual(self.index.update(), 0)
+        self.assertEqual(len(self.index.files), 4)
+
+    def test_store(self):
+        path_store = self.path("cache/index.index")
+        index = o2_linter.SymbolIndex(self.dir_root, path_store)
+        index.load("1")
+        self.assertEqual(index.update(), 5)
+        index = o2_linter.SymbolIndex(self.dir_root, path_store)
+        index.load("1")
+        self.assertEqual(index.update(), 0)
+        index = o2_linter.SymbolIndex(self.dir_root, path_store)
+        index.load("2")  # different version
+        self.assertEqual(index.update(), 5)
+
+    def test_get_lines(self):
+        path = self.path("DataModel/Cands.h")
+        self.assertIsNone(self.index.get_lines(path, "tables"))  # not indexed
+        self.index.update()
+        self.assertEqual(self.index.get_lines(path, "tables"), {11, 12})
+        self.assertEqual(self.index.get_lines(path, "columns"), {5, 6})
+        self.write("DataModel/Cands.h", header + "\n")
+        self.assertIsNone(self.index.get_lines(path, "tables"))  # changed since indexed
+
+    def test_tasks_same_device(self):
+        self.index.update()
+        tasks = self.index.get_tasks_same_device(self.path("Tasks/taskA.cxx"))
+        others = [(os.path.join("Tasks", "taskB.cxx"), 6, "HfTaskShared")]
+        self.assertEqual(tasks, [(6, "HfTaskShared", "hf-task-shared", others)])
+        self.assertEqual(self.index.get_tasks_same_device(self.path("Tasks/taskC.cxx")), [])
+
+
+class TestIndexedTests(RepositoryTestCase):
+    """Tests using the symbol index"""
+
+    def setUp(self):
+        super().setUp()
+        self.symbol_index = o2_linter.symbol_index
+
+    def tearDown(self):
+        o2_linter.symbol_index = self.symbol_index
+        super().tearDown()
+
+    def run_tests(self, path: str, rules: "list[str]") -> "tuple[list[str], str]":
+        """Run tests on a file and return names of failed tests and the output."""
+        tests = o2_linter.create_tests(rules)
+        with open(self.path(path), encoding="utf-8") as file:
+            content = file.readlines()
+        output = io.StringIO()
+        with redirect_stdout(output):
+            names_failed = o2_linter.run_tests(self.path(path), content, tests, [])
+        return names_failed, output.getvalue()
+
+    def test_declarations(self):
+        o2_linter.symbol_index = None
+        names_failed, output_all = self.run_tests("DataModel/Cands.h", ["name/o2-column", "name/o2-table"])
+        self.assertEqual(names_failed, ["name/o2-column", "name/o2-table"])
+        self.index.update()
+        o2_linter.symbol_index = self.index
+        names_failed, output = self.run_tests("DataModel/Cands.h", ["name/o2-column", "name/o2-table"])
+        self.assertEqual(names_failed, ["name/o2-column", "name/o2-table"])
+        # Only the declaration in the comment block is not tested.
+        lines_missing = [line for line in output_all.splitlines() if line not in output.splitlines()]
+        self.assertEqual(len(lines_missing), 1)
+        self.assertIn("Cands.h:9:", lines_missing[0])
+        self.assertIn("Cands.h:12:", output)
+
+    def test_device(self):
+        o2_linter.symbol_index = None
+        self.assertEqual(self.run_tests("Tasks/taskA.cxx", ["name/o2-device"]), ([], ""))  # index not available
+        self.index.update()
+        o2_linter.symbol_index = self.index
+        names_failed, output = self.run_tests("Tasks/taskA.cxx", ["name/o2-device"])
+        self.assertEqual(names_failed, ["name/o2-device"])
+        self.assertIn("taskA.cxx:6: error: Device name hf-task-shared of struct HfTaskShared", output)
+        self.assertEqual(self.run_tests("Tasks/taskC.cxx", ["name/o2-device"]), ([], ""))
+
+
+class TestBaseline(unittest.TestCase):
+    """Fingerprints of issues for the baseline"""
+
+    copyright = [f"// Copyright notice, line {i + 1}\n" for i in range(11)]
+    code = ["#include <vector>\n", "using namespace std;\n"]
+
+    def setUp(self):
+        self.record_baseline = o2_linter.record_baseline
+        o2_linter.record_baseline = True
+
+    def tearDown(self):
+        o2_linter.record_baseline = self.record_baseline
+
+    def get_fingerprints(self, content: "list[str]") -> "list[str]":
+        """Run tests on a file content and get fingerprints of issues."""
+        tests = o2_linter.create_tests(["doc/file", "using-directive"])
+        o2_linter.fingerprints = []
+        with redirect_stdout(io.StringIO()):
+            names_failed = o2_linter.run_tests("task.cxx", content, tests, [])
+        self.assertEqual(names_failed, ["using-directive", "doc/file"])
+        return o2_linter.fingerprints
+
+    def test_shifted_lines(self):
+        fingerprints = self.get_fingerprints(self.copyright + self.code)
+        self.assertEqual(len(fingerprints), 5)  # 1 per-line issue, 3 missing items and 1 file-level issue
+        # File-level issues are reported at fixed lines with a different content after shifting lines.
+        self.assertEqual(self.get_fingerprints(["\n", *self.copyright, *self.code]), fingerprints)
+        self.assertEqual(self.get_fingerprints(self.copyright + ["\n"] + self.code), fingerprints)
+
+
+if __name__ == "__main__":
+    unittest.main()